@@ -0,0 +1,167 @@
+from history_store import HistoryStore
+from market_values import fee_adjusted_profit
+from typing import *
+import numpy as np
+import pandas as pd
+
+
+HISTORY_FIELDS = ["sell_offer", "buy_offer", "sold", "bought", "active_traders"]
+
+# Scans run twice a day, so histories are aligned into 12 hour periods by default.
+DEFAULT_PERIOD = 12 * 60 * 60
+
+# The offer fields, which are -1 when an item had no offers.
+OFFER_FIELDS = ["sell_offer", "buy_offer"]
+
+SUMMARY_COLUMNS = ["Name", "SellPrice", "BuyPrice", "AvgSellPrice", "AvgBuyPrice", "Sold", "Bought", "Profit", "RelProfit", "PotProfit", "ActiveTraders"]
+
+
+class MarketPanel:
+    def __init__(self, times: np.ndarray, items: List[str], values: Dict[str, np.ndarray]):
+        """The histories of all items, aligned into a single time x item panel per field.
+        Periods in which an item wasn't scanned are NaN, and so are the offers of scans in which the item had none.
+
+        Args:
+            times (np.ndarray): The start of each period, as unix timestamps.
+            items (List[str]): The item names, one per column.
+            values (Dict[str, np.ndarray]): A (len(times), len(items)) float array per field of HISTORY_FIELDS.
+        """
+        self.times = times
+        self.items = items
+        self.values = values
+
+    @staticmethod
+    def from_store(store: HistoryStore, period: float = DEFAULT_PERIOD, start: Optional[float] = None, end: Optional[float] = None) -> "MarketPanel":
+        """Loads the histories of all items in the store into a panel.
+        If an item was scanned multiple times in a period, the last scan is used.
+
+        Args:
+            store (HistoryStore): The store to load from.
+            period (float, optional): The length of a period in seconds. Defaults to 12 hours.
+            start (float, optional): The first unix timestamp to load. Defaults to None.
+            end (float, optional): The unix timestamp to load up to, exclusive. Defaults to None.
+        """
+        items = sorted(store.item_names())
+        histories = [store.query(name, start, end) for name in items]
+
+        rows = np.concatenate(histories) if histories else np.empty(0)
+        columns = np.repeat(np.arange(len(items)), [len(history) for history in histories])
+
+        if len(rows) == 0:
+            return MarketPanel(np.empty(0), items, {field: np.empty((0, len(items))) for field in HISTORY_FIELDS})
+
+        periods = np.floor(rows["time"] / period).astype(np.int64)
+        first_period = periods.min()
+        times = np.arange(first_period, periods.max() + 1) * period
+
+        # Keep only the last row of each (period, item) cell. Rows are sorted by time within each item, so np.unique
+        # on the reversed cell indices finds the last one. Assigning duplicate indices wouldn't guarantee an order.
+        cells = (periods - first_period) * len(items) + columns
+        _, last = np.unique(cells[::-1], return_index=True)
+        last = len(cells) - 1 - last
+
+        values = {}
+        for field in HISTORY_FIELDS:
+            panel = np.full((len(times), len(items)), np.nan)
+            panel[periods[last] - first_period, columns[last]] = rows[field][last]
+            if field in OFFER_FIELDS:
+                # Scans store -1 if there was no offer, which mustn't be averaged like a price.
+                panel[panel <= 0] = np.nan
+            values[field] = panel
+
+        return MarketPanel(times, items, values)
+
+    def frame(self, field: str) -> pd.DataFrame:
+        """Returns a field of the panel as a DataFrame, indexed by period and with a column per item.
+        """
+        return pd.DataFrame(self.values[field], index=pd.to_datetime(self.times, unit="s"), columns=self.items)
+
+    def rolling_mean(self, field: str, window: int) -> pd.DataFrame:
+        """The average of the field over the last window periods, ignoring periods without scans or offers.
+        """
+        return self.frame(field).rolling(window, min_periods=1).mean()
+
+    def volatility(self, window: int, field: str = "sell_offer") -> pd.DataFrame:
+        """The standard deviation of the relative change of the field between scans, over the last window periods.
+        """
+        changes = self.frame(field).ffill().pct_change(fill_method=None)
+        return changes.replace([np.inf, -np.inf], np.nan).rolling(window, min_periods=2).std()
+
+    def volume_trend(self, short_window: int, long_window: int) -> pd.DataFrame:
+        """The relative difference between the short and long term average of traded items (sold + bought).
+        Positive values mean trading picked up recently.
+        """
+        volume = self.frame("sold") + self.frame("bought")
+        short = volume.rolling(short_window, min_periods=1).mean()
+        long = volume.rolling(long_window, min_periods=1).mean()
+        return short / long.where(long > 0) - 1
+
+    def profit(self) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """The fee adjusted profit, relative profit and potential profit of every item in every period.
+        NaN in periods without a scan or without both a sell and a buy offer.
+        """
+        sell_offer = np.nan_to_num(self.values["sell_offer"], nan=0)
+        buy_offer = np.nan_to_num(self.values["buy_offer"], nan=0)
+        sold = np.nan_to_num(self.values["sold"], nan=0)
+        bought = np.nan_to_num(self.values["bought"], nan=0)
+
+        offered = ~np.isnan(self.values["sell_offer"]) & ~np.isnan(self.values["buy_offer"])
+        index = pd.to_datetime(self.times, unit="s")
+
+        return tuple(pd.DataFrame(np.where(offered, values, np.nan), index=index, columns=self.items)
+                     for values in fee_adjusted_profit(sell_offer, buy_offer, sold, bought))
+
+    def summary(self, average_window: int = 60) -> pd.DataFrame:
+        """Builds a fullscan.csv-like summary from the latest scan of every item.
+        The history doesn't contain the monthly transaction averages, so AvgSellPrice and AvgBuyPrice are
+        the averages of the offers over the last average_window periods instead (60 periods are a month by default).
+        Missing offers are written as -1 like in fullscan.csv, and items without both offers have no profit.
+        """
+        # Sold is never masked, so it tells which periods an item was scanned in.
+        scanned = ~np.isnan(self.values["sold"])
+        items = np.flatnonzero(scanned.any(axis=0))
+        if len(items) == 0:
+            return pd.DataFrame({column: [] for column in SUMMARY_COLUMNS})
+
+        # The latest scan of each item, without carrying offers over from scans before it.
+        last = len(self.times) - 1 - np.argmax(scanned[::-1, items], axis=0)
+        latest = {field: self.values[field][last, items] for field in HISTORY_FIELDS}
+
+        offered = ~np.isnan(latest["sell_offer"]) & ~np.isnan(latest["buy_offer"])
+        profit, rel_profit, potential_profit = (np.where(offered, values, 0) for values in
+                                                fee_adjusted_profit(np.nan_to_num(latest["sell_offer"], nan=0), np.nan_to_num(latest["buy_offer"], nan=0),
+                                                                    latest["sold"], latest["bought"]))
+
+        averages = {field: np.nan_to_num(self.rolling_mean(field, average_window).iloc[-1].values[items].round(), nan=-1) for field in OFFER_FIELDS}
+
+        summary = pd.DataFrame({
+            "Name": [self.items[i] for i in items],
+            "SellPrice": np.nan_to_num(latest["sell_offer"], nan=-1),
+            "BuyPrice": np.nan_to_num(latest["buy_offer"], nan=-1),
+            "AvgSellPrice": averages["sell_offer"],
+            "AvgBuyPrice": averages["buy_offer"],
+            "Sold": latest["sold"],
+            "Bought": latest["bought"],
+            "Profit": profit,
+            "RelProfit": rel_profit,
+            "PotProfit": potential_profit,
+            "ActiveTraders": latest["active_traders"],
+        })
+
+        return summary.astype({column: np.int64 for column in SUMMARY_COLUMNS if column not in ("Name", "RelProfit")})
+
+    def write_summary(self, location: str, average_window: int = 60):
+        """Writes the summary in the format of fullscan.csv.
+        """
+        self.summary(average_window).to_csv(location, index=False)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python analytics.py <history store directory> <summary csv>")
+        exit(1)
+
+    with HistoryStore(sys.argv[1]) as store:
+        MarketPanel.from_store(store).write_summary(sys.argv[2])
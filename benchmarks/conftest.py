@@ -0,0 +1,55 @@
+# Benchmarks of the memory path against a stand-in of the client process. Run with: python -m pytest benchmarks
+
+from typing import *
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not sys.platform.startswith("linux"):
+    pytest.skip("The memory benchmarks read /proc/<pid>/mem and only run on Linux.", allow_module_level=True)
+
+pytest.importorskip("pytest_benchmark")
+
+from memory_standin import MarketStandIn, StandInItem
+from market_memory import MarketMemoryReader
+
+
+@pytest.fixture(scope="module")
+def items() -> List[StandInItem]:
+    return [StandInItem.random(3000 + i) for i in range(8)]
+
+
+@pytest.fixture(scope="module")
+def standin(items: List[StandInItem]) -> Generator[MarketStandIn, None, None]:
+    with MarketStandIn() as standin:
+        standin.set_item(items[0])
+        yield standin
+
+
+def locate(reader: MarketMemoryReader, standin: MarketStandIn, items: List[StandInItem]):
+    """Filters the reader with the items until all addresses were found, like Client._find_memory_addresses.
+    The item id is matched by value only, so the reader is pointed at the true item id copies
+    instead of relying on the other uint16 copies of the id which the stand-in process has on its heap.
+    """
+    for item in items:
+        standin.set_item(item)
+        reader.find_current_memory(*item.find_memory_arguments())
+        if reader.has_finished_filtering:
+            break
+
+    assert reader.has_finished_filtering
+    assert reader.buy_offer_reader.addresses[0] == standin.addresses()["buy_offer_reader"]
+    reader.item_id_reader.addresses = standin.addresses()["item_id_reader"]
+
+
+@pytest.fixture
+def located_reader(standin: MarketStandIn, items: List[StandInItem]) -> Generator[MarketMemoryReader, None, None]:
+    reader = MarketMemoryReader(p_id=standin.pid)
+    try:
+        locate(reader, standin, items)
+        yield reader
+    finally:
+        # Only one tracer can be attached to the stand-in at a time.
+        reader.buy_details_reader.process.close()
@@ -0,0 +1,86 @@
+from conftest import locate
+from memory_standin import MarketStandIn, StandInItem
+from market_memory import MarketMemoryReader
+from memory_reader import MemoryReader
+from typing import *
+import memory_scan
+import itertools
+import ctypes
+import pytest
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_full_scan(benchmark, standin: MarketStandIn, items: List[StandInItem], parallel: bool):
+    standin.set_item(items[0])
+    buy_offer = items[0].buy_offers[0][0]
+
+    addresses = benchmark(memory_scan.search_all_memory, standin.pid, ctypes.c_long(buy_offer), parallel=parallel)
+
+    assert standin.addresses()["buy_offer_reader"] in addresses
+
+
+def test_snapshot_bootstrap(benchmark, standin: MarketStandIn, items: List[StandInItem]):
+    standin.set_item(items[0])
+    buy_offer, sell_offer, max_buy_offer, max_sell_offer, _, statistics = items[0].find_memory_arguments()
+    patterns = {
+        "buy_offer_reader": MarketMemoryReader._offer_pattern(buy_offer),
+        "sell_offer_reader": MarketMemoryReader._offer_pattern(sell_offer),
+        "buy_details_reader": MarketMemoryReader._details_pattern(max_buy_offer, statistics[0], statistics[3]),
+        "sell_details_reader": MarketMemoryReader._details_pattern(max_sell_offer, statistics[4], statistics[7]),
+    }
+
+    found = benchmark(memory_scan.find_patterns, standin.pid, patterns)
+
+    addresses = standin.addresses()
+    assert all(found[name] == [addresses[name]] for name in patterns)
+
+
+def test_refinement_pass(benchmark, standin: MarketStandIn, items: List[StandInItem]):
+    standin.set_item(items[0])
+    buy_offer = items[0].buy_offers[0][0]
+    reader = MemoryReader(p_id=standin.pid)
+
+    try:
+        candidates = reader.filter_value(buy_offer, ctypes.c_long(buy_offer))
+
+        def setup():
+            reader.addresses = candidates[:]
+            return (buy_offer, ctypes.c_long(buy_offer)), {}
+
+        addresses = benchmark.pedantic(reader.filter_value, setup=setup, rounds=50)
+    finally:
+        reader.process.close()
+
+    assert standin.addresses()["buy_offer_reader"] in addresses
+
+
+def test_item_read_latency(benchmark, standin: MarketStandIn, items: List[StandInItem], located_reader: MarketMemoryReader):
+    # Consecutive reads of the same item are rejected, so every round opens the next item.
+    next_items = itertools.cycle(items)
+
+    def setup():
+        standin.set_item(next(next_items))
+        return ("item",), {}
+
+    values, item_id, _ = benchmark.pedantic(located_reader.get_current_market_values, setup=setup, rounds=50)
+
+    assert item_id in [item.item_id for item in items]
+
+
+def test_fingerprint_read(benchmark, located_reader: MarketMemoryReader):
+    benchmark(located_reader.read_fingerprint)
+
+
+def test_drift_recovery(benchmark, standin: MarketStandIn, items: List[StandInItem], located_reader: MarketMemoryReader):
+    """Measures detecting that the structs moved, and finding them again."""
+    def setup():
+        standin.shift(4096 * 7 + 8)
+        standin.set_item(items[1])
+        return (), {}
+
+    def recover():
+        if not located_reader.verify_layout(items[1].item_id):
+            located_reader.reset_filters()
+            locate(located_reader, standin, items[1:])
+
+    benchmark.pedantic(recover, setup=setup, rounds=10)
@@ -0,0 +1,326 @@
+from metrics import metrics
+from typing import *
+import multiprocessing
+import subprocess
+import threading
+import queue
+import json
+import time
+import os
+
+
+# Measured crawl durations of the categories, used to hand out the biggest categories first.
+CATEGORY_SIZES_LOCATION = "category_sizes.json"
+
+# Messages from the workers to the orchestrator.
+WORKER_READY = "ready"
+WORKER_ITEM = "item"
+WORKER_DONE = "done"
+WORKER_FAILED = "failed"
+WORKER_EXIT = "exit"
+WORKER_METRICS = "metrics"
+
+
+def launch_client(display: str, email: str, password: str, tibia_location: str):
+    """Starts a Client on the X display and opens the market. Used as client factory for process workers.
+    pyautogui connects to the display when it is imported, which a spawned worker already does while it
+    re-imports the main module. So the display has to be set in the environment the worker is started with,
+    see the displays of CrawlOrchestrator. Setting it here only covers workers whose main module doesn't import tibia.
+    """
+    os.environ["DISPLAY"] = display
+    from tibia import Client
+
+    client = Client()
+    client.start_game(tibia_location)
+    client.login_to_game(email, password)
+    if not client.open_market():
+        client.exit_tibia()
+        raise RuntimeError(f"Opening the market on display {display} failed.")
+
+    return client
+
+
+class VirtualDisplay:
+    def __init__(self, display: str, resolution: str = "1920x1080x24"):
+        """An Xvfb display for a client to run on.
+
+        Args:
+            display (str): The display name, e.g. ":1".
+            resolution (str, optional): The screen size and depth. Has to match the resolution the images were taken at. Defaults to "1920x1080x24".
+        """
+        self.display = display
+        self.resolution = resolution
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(["Xvfb", self.display, "-screen", "0", self.resolution, "-nolisten", "tcp"])
+        time.sleep(1)
+        return self
+
+    def __exit__(self, *args):
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+
+
+def _crawl_worker(worker: int, client_factory: Callable[[], Any], tasks, results, report_metrics: bool = False):
+    """The loop of a worker. Crawls the categories it is given, until it gets None.
+    Runs in a thread or in a process of its own, depending on the orchestrator.
+    A process has metrics of its own, with report_metrics they are sent to the orchestrator after every category.
+    """
+    def send_metrics():
+        if report_metrics and metrics.enabled:
+            results.put((WORKER_METRICS, worker, metrics.drain()))
+
+    try:
+        client = client_factory()
+    except Exception as e:
+        send_metrics()
+        results.put((WORKER_EXIT, worker, f"Starting the client failed: {e}"))
+        return
+
+    send_metrics()
+    results.put((WORKER_READY, worker, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        category, starting_index = task
+        start = time.time()
+        items = 0
+        try:
+            for item in client.crawl_market(category, starting_index):
+                # The order book of the item, if the client reads them.
+                book = client.market_reader.last_order_book if getattr(client, "market_reader", None) else None
+                results.put((WORKER_ITEM, worker, (category, client.crawl_position[2], item, book)))
+                items += 1
+            send_metrics()
+            results.put((WORKER_DONE, worker, (category, items, time.time() - start)))
+        except Exception as e:
+            # Continue after the last item that was read, if it belongs to this category.
+            position = client.crawl_position
+            resume_index = position[1] if position[0] == category and items > 0 else starting_index
+            send_metrics()
+            results.put((WORKER_FAILED, worker, (category, resume_index, str(e))))
+
+    try:
+        client.exit_tibia()
+    except Exception as e:
+        print(f"Worker {worker} failed to exit Tibia: {e}")
+
+    results.put((WORKER_EXIT, worker, None))
+
+
+class CrawlOrchestrator:
+    def __init__(self, client_factories: List[Callable[[], Any]], categories: Iterable[int] = range(1, 25), use_processes: bool = True,
+                 sizes_location: str = CATEGORY_SIZES_LOCATION, max_retries: int = 2, start_timeout: float = 600,
+                 displays: Optional[List[str]] = None):
+        """Crawls the categories with several clients in parallel, and merges their items into one stream.
+
+        Categories are handed out one at a time, biggest first according to the durations measured in previous scans,
+        so the workers finish at about the same time no matter how the category sizes change.
+
+        Args:
+            client_factories (List[Callable[[], Any]]): One factory per worker, returning a ready client with crawl_market and crawl_position.
+                With processes, they have to be picklable, e.g. functools.partial(launch_client, ...).
+            categories (Iterable[int], optional): The categories to crawl. Defaults to range(1, 25).
+            use_processes (bool, optional): Whether each worker runs in its own process, which real clients need for their own display.
+                Threads are enough for fake clients. Defaults to True.
+            sizes_location (str, optional): Where the measured category durations are kept. Defaults to CATEGORY_SIZES_LOCATION.
+            max_retries (int, optional): How often a failed category is handed out again. Defaults to 2.
+            start_timeout (float, optional): How long a worker may take to start its client, in seconds. Defaults to 600.
+            displays (List[str], optional): The X display of each worker process. The DISPLAY environment variable is set to it
+                while the process is started, so it is in place before the process imports anything. Defaults to None.
+        """
+        self.client_factories = client_factories
+        self.categories = list(categories)
+        self.use_processes = use_processes
+        self.sizes_location = sizes_location
+        self.max_retries = max_retries
+        self.start_timeout = start_timeout
+        self.displays = displays
+
+        self.sizes: Dict[int, float] = self._load_sizes()
+        self.failed_categories: List[int] = []
+
+    def _load_sizes(self) -> Dict[int, float]:
+        if self.sizes_location and os.path.exists(self.sizes_location):
+            with open(self.sizes_location, "r") as f:
+                return {int(category): size for category, size in json.loads(f.read()).items()}
+
+        return {}
+
+    def _save_sizes(self):
+        if self.sizes_location:
+            with open(self.sizes_location, "w") as f:
+                f.write(json.dumps({str(category): size for category, size in sorted(self.sizes.items())}))
+
+    def _start_worker(self, worker: int, results) -> Tuple[Any, Any]:
+        if self.use_processes:
+            # Spawn instead of fork, so the worker imports pyautogui with its own display.
+            context = multiprocessing.get_context("spawn")
+            tasks = context.Queue()
+            runner = context.Process(target=_crawl_worker, args=(worker, self.client_factories[worker], tasks, results, True), daemon=True)
+        else:
+            tasks = queue.Queue()
+            runner = threading.Thread(target=_crawl_worker, args=(worker, self.client_factories[worker], tasks, results), daemon=True)
+
+        if not (self.use_processes and self.displays):
+            runner.start()
+            return runner, tasks
+
+        # The spawned process inherits the environment at start, and imports the main module of the
+        # parent, and with it pyautogui, before the client factory runs.
+        previous_display = os.environ.get("DISPLAY")
+        os.environ["DISPLAY"] = self.displays[worker]
+        try:
+            runner.start()
+        finally:
+            if previous_display is None:
+                del os.environ["DISPLAY"]
+            else:
+                os.environ["DISPLAY"] = previous_display
+
+        return runner, tasks
+
+    def run(self) -> Generator[Tuple[int, Any, Any], None, None]:
+        """Crawls all categories.
+
+        Returns:
+            Generator[Tuple[int, Any, Any], None, None]: (category, MarketValues, order book) tuples, in the order the workers read them.
+                The order book is None for clients which don't read them.
+        """
+        results = multiprocessing.get_context("spawn").Queue() if self.use_processes else queue.Queue()
+
+        # Biggest first. Unmeasured categories are assumed to be big, so they don't end up last.
+        default_size = max(self.sizes.values(), default=1)
+        self.pending: List[Tuple[int, int]] = [(category, 0) for category in sorted(self.categories, key=lambda category: -self.sizes.get(category, default_size))]
+        self.assigned: Dict[int, Tuple[int, int]] = {}
+        self.idle: List[int] = []
+        self.runners: Dict[int, Tuple[Any, Any]] = {}
+        self.retries: Dict[int, int] = {}
+        self.seen: Set[Tuple[int, int]] = set()
+        # Workers which were sent home, and may exit before their exit message arrives.
+        self.finishing: Set[int] = set()
+        self.failed_categories = []
+
+        # Start the clients one after another, as Tibia removes shared files on start which another starting client may use.
+        for worker in range(len(self.client_factories)):
+            self.runners[worker] = self._start_worker(worker, results)
+            start = time.time()
+            started = False
+            while not started:
+                if time.time() - start > self.start_timeout:
+                    print(f"Worker {worker} didn't start in time.")
+                    self._remove_worker(worker)
+                    self._dispatch()
+                    break
+
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    message = None
+
+                if message:
+                    started = message[1] == worker and message[0] in (WORKER_READY, WORKER_EXIT)
+                    # Items of the already running workers are passed on right away.
+                    yield from self._handle(*message)
+
+                self._check_workers()
+                started = started or worker not in self.runners
+
+        while self.runners:
+            try:
+                message = results.get(timeout=1)
+            except queue.Empty:
+                message = None
+
+            if message:
+                yield from self._handle(*message)
+
+            # Checked on every iteration, so the category of a crashed worker is handed out again
+            # while the other workers keep streaming items.
+            self._check_workers()
+
+        # Categories left over when all workers are gone.
+        self.failed_categories.extend(category for category, _ in self.pending)
+        self._save_sizes()
+
+    def _check_workers(self):
+        """Removes the workers whose thread or process ended without an exit message, and hands out their categories again.
+        """
+        for worker, (runner, _) in list(self.runners.items()):
+            if not runner.is_alive():
+                if worker not in self.finishing:
+                    print(f"Worker {worker} died.")
+                self._remove_worker(worker)
+                self._dispatch()
+
+    def _handle(self, kind: str, worker: int, payload: Any) -> Generator[Tuple[int, Any, Any], None, None]:
+        # Items read by a worker before it died are still valid, but its other messages are outdated,
+        # as its category was already handed out again.
+        if kind in (WORKER_READY, WORKER_DONE, WORKER_FAILED) and worker not in self.runners:
+            return
+
+        if kind == WORKER_METRICS:
+            metrics.merge(payload)
+        elif kind == WORKER_ITEM:
+            category, item_id, item, book = payload
+            # A retried category starts at the last item read before the failure.
+            if (category, item_id) not in self.seen:
+                self.seen.add((category, item_id))
+                yield category, item, book
+        elif kind == WORKER_READY:
+            self.idle.append(worker)
+        elif kind == WORKER_DONE:
+            category, items, duration = payload
+            print(f"Worker {worker} finished category {category}: {items} items in {duration:.0f}s.")
+            # A resumed category only took part of its duration.
+            if self.assigned.pop(worker)[1] == 0:
+                self.sizes[category] = duration
+            self.idle.append(worker)
+        elif kind == WORKER_FAILED:
+            category, resume_index, error = payload
+            print(f"Worker {worker} failed in category {category}: {error}")
+            self.assigned.pop(worker)
+            self._retry((category, resume_index))
+            self.idle.append(worker)
+        elif kind == WORKER_EXIT:
+            if payload:
+                print(f"Worker {worker} exited: {payload}")
+            self._remove_worker(worker)
+
+        self._dispatch()
+
+    def _remove_worker(self, worker: int):
+        self.runners.pop(worker, None)
+        if worker in self.idle:
+            self.idle.remove(worker)
+        if worker in self.assigned:
+            self._retry(self.assigned.pop(worker))
+
+    def _retry(self, task: Tuple[int, int]):
+        category = task[0]
+        self.retries[category] = self.retries.get(category, 0) + 1
+        if self.retries[category] > self.max_retries:
+            print(f"Giving up on category {category}.")
+            self.failed_categories.append(category)
+        else:
+            # Partially crawled categories go first.
+            self.pending.insert(0, task)
+
+    def _dispatch(self):
+        """Hands the pending categories to the idle workers. Once nothing is left to do, the workers are sent home.
+        """
+        while self.idle and self.pending:
+            worker = self.idle.pop(0)
+            self.assigned[worker] = self.pending.pop(0)
+            self.runners[worker][1].put(self.assigned[worker])
+
+        if not self.pending and not self.assigned:
+            for worker in self.idle:
+                self.runners[worker][1].put(None)
+                self.finishing.add(worker)
+            self.idle = []
@@ -0,0 +1,186 @@
+from html.parser import HTMLParser
+from datetime import datetime
+from typing import *
+import numpy as np
+import os
+
+
+class EventData:
+    def __init__(self, date: datetime, events: List[str]):
+        self.date = date
+        self.events = events
+
+    def __str__(self) -> str:
+        return f"{self.date.strftime('%Y.%m.%d')},{','.join(self.events)}"
+
+
+# One index record per line of the events file: the date as proleptic ordinal, and the offset of the line.
+INDEX_DTYPE = np.dtype([("date", "<i4"), ("offset", "<i8")])
+
+# The index starts with the size and modification time of the events file it was built from.
+INDEX_HEADER_DTYPE = np.dtype([("size", "<i8"), ("mtime", "<i8")])
+
+
+class EventCalendarParser(HTMLParser):
+    def __init__(self):
+        """Parses the event calendar of tibia.com in a single pass.
+        After feeding the page, days contains a (day of month, event names) tuple per calendar cell.
+        """
+        super().__init__()
+        self.days: List[Tuple[int, List[str]]] = []
+        self.in_table = False
+        self.in_cell = False
+        self.text = ""
+        self.day = None
+        self.events = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if any(value == "eventscheduletable" for _, value in attrs):
+            self.in_table = True
+        elif self.in_table and tag == "td" and any(name == "style" for name, _ in attrs):
+            self.in_cell = True
+            self.day = None
+            self.events = []
+
+        self.text = ""
+
+    def handle_endtag(self, tag: str):
+        if self.in_cell:
+            if tag == "span" and self.day is None and self.text.strip().isdigit():
+                self.day = int(self.text.strip())
+            elif tag == "div" and len(self.text) > 0:
+                self.events.append(self.text)
+            elif tag == "td":
+                self.in_cell = False
+                if self.day is not None:
+                    self.days.append((self.day, self.events))
+                else:
+                    print(f"Parsing event info failed for a cell without a day: {self.events}")
+
+        if tag == "table":
+            self.in_table = False
+
+        self.text = ""
+
+    def handle_data(self, data: str):
+        self.text += data
+
+
+def read_last_line(location: str, block_size: int = 4096) -> Optional[str]:
+    """Returns the last non-empty line of the file, by reading backwards from its end.
+    """
+    with open(location, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            tail = f.read(read_size) + tail
+
+            lines = [line for line in tail.split(b"\n") if line.strip()]
+            # The first line may be cut off, unless the beginning of the file was reached.
+            if len(lines) > 1 or (lines and position == 0):
+                return lines[-1].decode("utf-8")
+
+    return None
+
+
+class EventStore:
+    def __init__(self, location: str, index_location: Optional[str] = None):
+        """The events.csv of the results, with a date index for range lookups.
+        Finding the last event only reads the end of the file, so it costs the same no matter how big the file grows.
+
+        Args:
+            location (str): The events CSV, one date,event,event... line per day.
+            index_location (str, optional): The index file. Defaults to location + ".idx", next to the events file.
+        """
+        self.location = location
+        self.index_location = index_location or location + ".idx"
+
+    def last_date(self) -> datetime:
+        """Returns the date of the last event, or datetime.min if there are none.
+        """
+        if not os.path.exists(self.location):
+            return datetime.min
+
+        last_line = read_last_line(self.location)
+        return datetime.strptime(last_line.split(",")[0], "%Y.%m.%d") if last_line else datetime.min
+
+    def _file_header(self) -> np.ndarray:
+        """The header matching the current events file.
+        """
+        stat = os.stat(self.location) if os.path.exists(self.location) else None
+        return np.array([(stat.st_size, stat.st_mtime_ns) if stat else (0, 0)], dtype=INDEX_HEADER_DTYPE)
+
+    def _load_index(self) -> np.ndarray:
+        """Loads the index, and rebuilds it if the events file changed since it was written, e.g. by editing it.
+        """
+        if os.path.exists(self.index_location):
+            with open(self.index_location, "rb") as f:
+                header = np.frombuffer(f.read(INDEX_HEADER_DTYPE.itemsize), dtype=INDEX_HEADER_DTYPE)
+                if len(header) == 1 and header[0] == self._file_header()[0]:
+                    return np.fromfile(f, dtype=INDEX_DTYPE)
+
+        return self.rebuild_index()
+
+    def rebuild_index(self) -> np.ndarray:
+        """Indexes every line of the events file.
+        """
+        records = []
+        if os.path.exists(self.location):
+            with open(self.location, "rb") as f:
+                offset = 0
+                for line in f:
+                    if line.strip():
+                        date = datetime.strptime(line.split(b",")[0].decode("utf-8"), "%Y.%m.%d")
+                        records.append((date.toordinal(), offset))
+                    offset += len(line)
+
+        index = np.array(records, dtype=INDEX_DTYPE)
+        with open(self.index_location, "wb") as f:
+            f.write(self._file_header().tobytes())
+            f.write(index.tobytes())
+        return index
+
+    def append(self, events: List[EventData]):
+        """Appends the events to the file and the index.
+        """
+        if not events:
+            return
+
+        # Make sure the existing lines are indexed, before appending the new ones.
+        self._load_index()
+
+        with open(self.location, "ab") as f:
+            records = []
+            for event in events:
+                records.append((event.date.toordinal(), f.tell()))
+                f.write((str(event) + "\n").encode("utf-8"))
+
+        with open(self.index_location, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(np.array(records, dtype=INDEX_DTYPE).tobytes())
+            # The header is updated last, an interrupted append leaves an index which gets rebuilt.
+            f.seek(0)
+            f.write(self._file_header().tobytes())
+
+    def range(self, start: datetime, end: datetime) -> List[EventData]:
+        """Returns the events from start to end, both inclusive.
+        """
+        index = self._load_index()
+        low = np.searchsorted(index["date"], start.toordinal(), side="left")
+        high = np.searchsorted(index["date"], end.toordinal(), side="right")
+        if low >= high:
+            return []
+
+        events = []
+        with open(self.location, "rb") as f:
+            for offset in index["offset"][low:high]:
+                f.seek(int(offset))
+                values = f.readline().decode("utf-8").rstrip("\n").split(",")
+                events.append(EventData(datetime.strptime(values[0], "%Y.%m.%d"), values[1:]))
+
+        return events
@@ -0,0 +1,340 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import *
+import os
+
+
+# The integer columns of a history row, in the order of MarketValues.history_string.
+SEGMENT_COLUMNS = ["sell_offer", "buy_offer", "sold", "bought", "active_traders"]
+
+# Each record starts with a varint header of item index * 4 + record kind.
+RECORD_UNCHANGED = 0
+RECORD_CHANGED = 1
+RECORD_NAME = 2
+
+
+def encode_varint(value: int, out: bytearray):
+    """Appends the unsigned integer as LEB128 varint.
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """Decodes the varint at position.
+
+    Returns:
+        Tuple[int, int]: The value and the position after it.
+
+    Raises:
+        IndexError: If the data ends within the varint.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    """Maps signed to unsigned integers, so small negative deltas stay small varints.
+    """
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def segment_period(time: float) -> str:
+    """The period of a timestamp. Every calendar month (UTC) gets its own segment file.
+    """
+    return datetime.fromtimestamp(time, timezone.utc).strftime("%Y-%m")
+
+
+def segment_row(time: float, sell_offer: int, buy_offer: int, sold: int, bought: int, active_traders: int) -> Tuple[int, ...]:
+    """The (time, *SEGMENT_COLUMNS) row as the segments store it, with the time rounded to seconds.
+    """
+    return (round(time), sell_offer, buy_offer, sold, bought, active_traders)
+
+
+class Segment:
+    def __init__(self, location: str):
+        """The history rows of all items within one period, as an append-only binary file.
+
+        Every row is encoded as the difference to the previous row of the same item, as zigzag varints.
+        Timestamps are rounded to seconds. A row with the same values as the previous one
+        only stores its time, and a new item stores its name once before its first row.
+
+        Args:
+            location (str): The segment file.
+        """
+        self.location = location
+        self.names: List[str] = []
+        self.indices: Dict[str, int] = {}
+        # The last (time, *SEGMENT_COLUMNS) row of each item, by item index.
+        self.last_rows: List[Tuple[int, ...]] = []
+        self.valid_size = 0
+
+    def read(self) -> Dict[str, List[Tuple[int, ...]]]:
+        """Decodes the segment file, and remembers its state for appending.
+        A record cut off by a crash while writing it is ignored.
+
+        Returns:
+            Dict[str, List[Tuple[int, ...]]]: The (time, *SEGMENT_COLUMNS) rows of each item.
+        """
+        self.names, self.indices, self.last_rows, self.valid_size = [], {}, [], 0
+        rows: Dict[str, List[Tuple[int, ...]]] = {}
+
+        if not os.path.exists(self.location):
+            return rows
+
+        with open(self.location, "rb") as f:
+            data = f.read()
+
+        position = 0
+        while position < len(data):
+            try:
+                header, position = decode_varint(data, position)
+                index, kind = header >> 2, header & 3
+
+                if kind == RECORD_NAME:
+                    length, position = decode_varint(data, position)
+                    if position + length > len(data):
+                        break
+                    name = data[position:position + length].decode("utf-8")
+                    position += length
+
+                    self.indices[name] = len(self.names)
+                    self.names.append(name)
+                    self.last_rows.append((0,) * (len(SEGMENT_COLUMNS) + 1))
+                    rows[name] = []
+                else:
+                    previous = self.last_rows[index]
+                    delta, position = decode_varint(data, position)
+                    row = [previous[0] + unzigzag(delta)] + list(previous[1:])
+                    if kind == RECORD_CHANGED:
+                        for column in range(1, len(row)):
+                            delta, position = decode_varint(data, position)
+                            row[column] += unzigzag(delta)
+
+                    self.last_rows[index] = tuple(row)
+                    rows[self.names[index]].append(self.last_rows[index])
+            except IndexError:
+                break
+
+            self.valid_size = position
+
+        return rows
+
+    def encode(self, name: str, row: Tuple[int, ...]) -> bytes:
+        """Encodes a (time, *SEGMENT_COLUMNS) row of the item, and updates the state as if it was appended.
+        """
+        out = bytearray()
+
+        if name not in self.indices:
+            encoded_name = name.encode("utf-8")
+            encode_varint(len(self.names) * 4 + RECORD_NAME, out)
+            encode_varint(len(encoded_name), out)
+            out += encoded_name
+
+            self.indices[name] = len(self.names)
+            self.names.append(name)
+            self.last_rows.append((0,) * (len(SEGMENT_COLUMNS) + 1))
+
+        index = self.indices[name]
+        previous = self.last_rows[index]
+        changed = row[1:] != previous[1:]
+
+        encode_varint(index * 4 + (RECORD_CHANGED if changed else RECORD_UNCHANGED), out)
+        encode_varint(zigzag(row[0] - previous[0]), out)
+        if changed:
+            for value, previous_value in zip(row[1:], previous[1:]):
+                encode_varint(zigzag(value - previous_value), out)
+
+        self.last_rows[index] = row
+        return bytes(out)
+
+
+class HistorySegmentWriter:
+    def __init__(self, location: str, max_open_files: int = 4, flush_each_row: bool = True):
+        """Appends history rows to the segment files in the directory, one file per period.
+
+        Args:
+            location (str): The directory of the segment files. Created if it doesn't exist.
+            max_open_files (int, optional): How many segment files are kept open. The least recently used one is closed first. Defaults to 4.
+            flush_each_row (bool, optional): Whether every row is flushed right away, instead of on flush. Defaults to True.
+        """
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+        self.max_open_files = max_open_files
+        self.flush_each_row = flush_each_row
+
+        # The decoded state of every segment appended to, and the open files in least recently used order.
+        self.segments: Dict[str, Segment] = {}
+        self.files: "OrderedDict[str, BinaryIO]" = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def segment_location(self, period: str) -> str:
+        return os.path.join(self.location, f"{period}.seg")
+
+    def _open(self, period: str) -> Tuple[Segment, BinaryIO]:
+        if period not in self.segments:
+            segment = Segment(self.segment_location(period))
+            segment.read()
+
+            with open(segment.location, "ab") as f:
+                # Drop a record cut off by a crash, so the next one starts at a record boundary.
+                f.truncate(segment.valid_size)
+
+            self.segments[period] = segment
+
+        if period in self.files:
+            self.files.move_to_end(period)
+        else:
+            if len(self.files) >= self.max_open_files:
+                _, evicted = self.files.popitem(last=False)
+                # flush(sync=True) only reaches the open files, so an evicted one is made durable now.
+                evicted.flush()
+                os.fsync(evicted.fileno())
+                evicted.close()
+            self.files[period] = open(self.segments[period].location, "ab")
+
+        return self.segments[period], self.files[period]
+
+    def append(self, name: str, time: float, sell_offer: int, buy_offer: int, sold: int, bought: int, active_traders: int) -> str:
+        """Appends a history row of the item.
+
+        Returns:
+            str: The segment file the row was written to.
+        """
+        period = segment_period(time)
+        segment, f = self._open(period)
+
+        f.write(segment.encode(name.lower(), segment_row(time, sell_offer, buy_offer, sold, bought, active_traders)))
+        if self.flush_each_row:
+            f.flush()
+        return segment.location
+
+    def append_values(self, values) -> str:
+        """Appends the history values of a MarketValues object.
+
+        Returns:
+            str: The segment file the row was written to.
+        """
+        return self.append(values.name, values.time, values.sell_offer, values.buy_offer, values.sold, values.bought, values.active_traders)
+
+    def flush(self, sync: bool = False):
+        """Flushes the open segment files.
+
+        Args:
+            sync (bool, optional): Whether to also fsync them, so they survive a power loss. Defaults to False.
+        """
+        for f in self.files.values():
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+        self.segments = {}
+        self.files = OrderedDict()
+
+
+def read_segments(location: str) -> Dict[str, List[Tuple[int, ...]]]:
+    """Decodes all segment files of the directory, in order of their periods.
+
+    Returns:
+        Dict[str, List[Tuple[int, ...]]]: The (time, *SEGMENT_COLUMNS) rows of each item.
+    """
+    rows: Dict[str, List[Tuple[int, ...]]] = {}
+
+    for file in sorted(os.listdir(location)):
+        if file.endswith(".seg"):
+            for name, item_rows in Segment(os.path.join(location, file)).read().items():
+                rows.setdefault(name, []).extend(item_rows)
+
+    return rows
+
+
+def csv_view_line(row: Tuple[int, ...]) -> str:
+    """Formats a (time, *SEGMENT_COLUMNS) row like MarketValues.history_string, with the time in seconds like the segments store it.
+    """
+    time, sell_offer, buy_offer, sold, bought, active_traders = row
+    return f"{sell_offer},{buy_offer},{sold},{bought},{active_traders},{time}\n"
+
+
+def write_csv_view(segments_location: str, histories_location: str) -> int:
+    """Rebuilds the <item>.csv history files the website reads, in the format of MarketValues.history_string.
+    Only the segments are published, the view is built where the website is built and isn't committed.
+
+    Returns:
+        int: The amount of written rows.
+    """
+    os.makedirs(histories_location, exist_ok=True)
+    written = 0
+
+    for name, rows in read_segments(segments_location).items():
+        with open(os.path.join(histories_location, f"{name}.csv"), "w") as f:
+            f.write("".join(csv_view_line(row) for row in rows))
+        written += len(rows)
+
+    return written
+
+
+def import_csv_view(histories_location: str, segments_location: str) -> int:
+    """Encodes all <item>.csv history files into segments. Only meant to be run once, on an empty directory.
+
+    Returns:
+        int: The amount of imported rows.
+    """
+    rows = []
+    for file in sorted(os.listdir(histories_location)):
+        if not file.endswith(".csv"):
+            continue
+
+        with open(os.path.join(histories_location, file), "r") as f:
+            for line in f:
+                values = line.strip().split(",")
+                if len(values) != 6:
+                    continue
+
+                try:
+                    rows.append((float(values[5]), file[:-len(".csv")], *[int(value) for value in values[:5]]))
+                except ValueError:
+                    print(f"Skipping malformed history line in {file}: {line.strip()}")
+
+    # Write in time order, like the scans would have.
+    rows.sort(key=lambda row: row[0])
+    with HistorySegmentWriter(segments_location) as writer:
+        for time, name, *values in rows:
+            writer.append(name, time, *values)
+
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ("encode", "decode"):
+        print("Usage: python history_segments.py encode <histories directory> <segments directory>")
+        print("       python history_segments.py decode <segments directory> <histories directory>")
+        exit(1)
+
+    if sys.argv[1] == "encode":
+        print(f"Encoded {import_csv_view(sys.argv[2], sys.argv[3])} history rows.")
+    else:
+        print(f"Decoded {write_csv_view(sys.argv[2], sys.argv[3])} history rows.")
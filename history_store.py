@@ -0,0 +1,276 @@
+from collections import OrderedDict
+import numpy as np
+import json
+import os
+from typing import *
+
+
+# One fixed-width record per observed market state of an item.
+HISTORY_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("sell_offer", "<i8"),
+    ("buy_offer", "<i8"),
+    ("sold", "<i8"),
+    ("bought", "<i8"),
+    ("active_traders", "<i8"),
+])
+
+# Records are stored in chunks of CHUNK_ROWS rows, each chunk belonging to a single item.
+# This keeps the rows of an item contiguous, so queries can return views into the memory map.
+CHUNK_ROWS = 64
+CHUNK_BYTES = CHUNK_ROWS * HISTORY_DTYPE.itemsize
+CHUNKS_PER_SEGMENT = 256
+
+
+class HistoryStore:
+    def __init__(self, location: str, max_open_files: int = 32):
+        """Initialises a HistoryStore, a memory mapped store of the price histories of all items.
+
+        The store consists of segment files containing fixed-width records, and an index.json mapping
+        each item to the chunks of the segments holding its history.
+
+        Args:
+            location (str): The directory of the store. Created if it doesn't exist.
+            max_open_files (int, optional): How many segment files are kept open for writing. The least recently used one is closed first. Defaults to 32.
+        """
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+        self.max_open_files = max_open_files
+
+        # Maps item names to a list of [chunk number, rows used] pairs.
+        self.items: Dict[str, List[List[int]]] = {}
+        self.next_chunk = 0
+        self.segments: Dict[int, np.memmap] = {}
+        # Unbuffered, so written rows are visible to the memory maps right away.
+        self.files: "OrderedDict[int, BinaryIO]" = OrderedDict()
+        # The open segments written since the last fsync.
+        self.unsynced: Set[int] = set()
+        self.dirty = False
+
+        index_path = os.path.join(location, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.loads(f.read())
+            self.items = index["items"]
+            self.next_chunk = index["next_chunk"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.location, f"segment_{segment:05d}.bin")
+
+    def _file(self, segment: int) -> BinaryIO:
+        """The open segment file, opened or created if needed.
+        """
+        if segment in self.files:
+            self.files.move_to_end(segment)
+            return self.files[segment]
+
+        if len(self.files) >= self.max_open_files:
+            evicted_segment, evicted = self.files.popitem(last=False)
+            # flush(sync=True) only reaches the open files, so an evicted one is made durable now.
+            if evicted_segment in self.unsynced:
+                os.fsync(evicted.fileno())
+                self.unsynced.discard(evicted_segment)
+            evicted.close()
+
+        path = self._segment_path(segment)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self.files[segment] = open(path, "r+b", buffering=0)
+        return self.files[segment]
+
+    def _allocate_chunk(self, name: str) -> List[int]:
+        """Reserves a new chunk for the item and grows the segment file to contain it.
+        """
+        chunk = self.next_chunk
+        self.next_chunk += 1
+
+        segment, local_chunk = divmod(chunk, CHUNKS_PER_SEGMENT)
+        self._file(segment).truncate((local_chunk + 1) * CHUNK_BYTES)
+        self.unsynced.add(segment)
+
+        # The memory map was created for the smaller file, remap on next access.
+        self.segments.pop(segment, None)
+
+        entry = [chunk, 0]
+        self.items.setdefault(name, []).append(entry)
+        return entry
+
+    def _segment(self, segment: int) -> np.memmap:
+        if segment not in self.segments:
+            self.segments[segment] = np.memmap(self._segment_path(segment), dtype=HISTORY_DTYPE, mode="r")
+
+        return self.segments[segment]
+
+    def _chunk_view(self, chunk: int, count: int) -> np.ndarray:
+        segment, local_chunk = divmod(chunk, CHUNKS_PER_SEGMENT)
+        start = local_chunk * CHUNK_ROWS
+        return self._segment(segment)[start:start + count]
+
+    def extend(self, name: str, rows: np.ndarray):
+        """Appends multiple history rows to the item. The rows are expected to be sorted by time,
+        and newer than the rows already in the store.
+
+        Args:
+            name (str): The name of the item.
+            rows (np.ndarray): An array of HISTORY_DTYPE records.
+        """
+        name = name.lower()
+        rows = np.asarray(rows, dtype=HISTORY_DTYPE)
+
+        while len(rows) > 0:
+            chunks = self.items.get(name)
+            entry = chunks[-1] if chunks and chunks[-1][1] < CHUNK_ROWS else self._allocate_chunk(name)
+            chunk, count = entry
+
+            batch = rows[:CHUNK_ROWS - count]
+            rows = rows[len(batch):]
+
+            segment, local_chunk = divmod(chunk, CHUNKS_PER_SEGMENT)
+            f = self._file(segment)
+            f.seek(local_chunk * CHUNK_BYTES + count * HISTORY_DTYPE.itemsize)
+            f.write(batch.tobytes())
+            self.unsynced.add(segment)
+
+            entry[1] += len(batch)
+            self.dirty = True
+
+    def append(self, name: str, time: float, sell_offer: int, buy_offer: int, sold: int, bought: int, active_traders: int):
+        """Appends a single history row to the item.
+        """
+        self.extend(name, np.array([(time, sell_offer, buy_offer, sold, bought, active_traders)], dtype=HISTORY_DTYPE))
+
+    def append_values(self, values):
+        """Appends the history values of a MarketValues object.
+
+        Args:
+            values (MarketValues): The values to append, keyed by values.name.
+        """
+        self.append(values.name, values.time, values.sell_offer, values.buy_offer, values.sold, values.bought, values.active_traders)
+
+    def query(self, name: str, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Returns the history of the item within the given time range.
+        If the range lies within a single chunk, the result is a read-only view into the memory map.
+
+        Args:
+            name (str): The name of the item.
+            start (float, optional): The inclusive start unix timestamp. Defaults to None.
+            end (float, optional): The exclusive end unix timestamp. Defaults to None.
+
+        Returns:
+            np.ndarray: An array of HISTORY_DTYPE records, sorted by time.
+        """
+        parts = []
+
+        for chunk, count in self.items.get(name.lower(), []):
+            view = self._chunk_view(chunk, count)
+            if count == 0:
+                continue
+
+            times = view["time"]
+            if start is not None and times[-1] < start:
+                continue
+            if end is not None and times[0] >= end:
+                break
+
+            low = np.searchsorted(times, start, side="left") if start is not None else 0
+            high = np.searchsorted(times, end, side="left") if end is not None else count
+            parts.append(view[low:high])
+
+        if not parts:
+            return np.empty(0, dtype=HISTORY_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+
+        return np.concatenate(parts)
+
+    def item_names(self) -> List[str]:
+        """Returns the names of all items with a history in the store.
+        """
+        return list(self.items.keys())
+
+    def flush(self, sync: bool = False):
+        """Writes the index to disk. Rows appended since the last flush are not visible to other readers before this.
+
+        Args:
+            sync (bool, optional): Whether to also fsync the written segments and the index, so they survive a power loss. Defaults to False.
+        """
+        if sync:
+            for segment in self.unsynced:
+                os.fsync(self.files[segment].fileno())
+            self.unsynced = set()
+
+        if not self.dirty and not sync:
+            return
+
+        index_path = os.path.join(self.location, "index.json")
+        with open(index_path + ".tmp", "w") as f:
+            f.write(json.dumps({"next_chunk": self.next_chunk, "items": self.items}))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(index_path + ".tmp", index_path)
+        self.dirty = False
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+        self.files = OrderedDict()
+        self.segments = {}
+
+
+def import_csv_histories(histories_location: str, store: HistoryStore) -> int:
+    """Imports all <item>.csv history files, as written by MarketValues.history_string, into the store.
+    Only meant to be run once, on an empty store.
+
+    Args:
+        histories_location (str): The directory containing the history CSVs.
+        store (HistoryStore): The store to import into.
+
+    Returns:
+        int: The amount of imported rows.
+    """
+    imported = 0
+
+    for file in sorted(os.listdir(histories_location)):
+        if not file.endswith(".csv"):
+            continue
+
+        rows = []
+        with open(os.path.join(histories_location, file), "r") as f:
+            for line in f:
+                values = line.strip().split(",")
+                if len(values) != 6:
+                    continue
+
+                try:
+                    sell_offer, buy_offer, sold, bought, active_traders = [int(value) for value in values[:5]]
+                    rows.append((float(values[5]), sell_offer, buy_offer, sold, bought, active_traders))
+                except ValueError:
+                    print(f"Skipping malformed history line in {file}: {line.strip()}")
+
+        rows = np.array(rows, dtype=HISTORY_DTYPE)
+        rows.sort(order="time", kind="stable")
+        store.extend(file[:-len(".csv")], rows)
+        imported += len(rows)
+
+    store.flush()
+    return imported
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python history_store.py <histories directory> <store directory>")
+        exit(1)
+
+    with HistoryStore(sys.argv[2]) as store:
+        print(f"Imported {import_csv_histories(sys.argv[1], store)} history rows.")
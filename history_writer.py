@@ -0,0 +1,120 @@
+from history_segments import HistorySegmentWriter, segment_period
+from history_store import HistoryStore
+from metrics import metrics
+from typing import *
+import threading
+import queue
+
+
+class HistoryWriter:
+    def __init__(self, segments_location: str, store_location: str, max_queued: int = 1024, flush_rows: int = 64):
+        """Writes the history of scanned items in a background thread, so slow disks don't stall the crawl.
+        Rows go to the history segments of the results and to the local HistoryStore.
+
+        Args:
+            segments_location (str): The directory of the history segments.
+            store_location (str): The directory of the HistoryStore.
+            max_queued (int, optional): How many rows can be queued before submit blocks. Defaults to 1024.
+            flush_rows (int, optional): The segment files are flushed after this many rows, or when the queue runs empty. Defaults to 64.
+        """
+        self.segment_writer = HistorySegmentWriter(segments_location, flush_each_row=False)
+        self.history_store = HistoryStore(store_location)
+        self.flush_rows = flush_rows
+
+        self.queue: "queue.Queue[Optional[Tuple[Any, Optional[Callable[[], None]]]]]" = queue.Queue(max_queued)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.finish()
+
+    def _raise_error(self):
+        if self.error:
+            raise RuntimeError(f"Writing the history failed: {self.error}") from self.error
+
+    def submit(self, values, on_written: Optional[Callable[[], None]] = None) -> str:
+        """Queues the history values of a MarketValues object. Blocks while the queue is full.
+
+        Args:
+            values (MarketValues): The values to write.
+            on_written (Callable[[], None], optional): Called from the writer thread once the row was flushed, in queue order.
+
+        Returns:
+            str: The segment file the row will be written to.
+        """
+        self._raise_error()
+        self.queue.put((values, on_written))
+        return self.segment_writer.segment_location(segment_period(values.time))
+
+    def call(self, callback: Callable[[], None]):
+        """Calls the callback from the writer thread, once all rows queued before were flushed.
+        """
+        self._raise_error()
+        self.queue.put((None, callback))
+
+    def checkpoint(self):
+        """Makes the rows queued so far visible to other readers of the HistoryStore, like the query API, once they are written.
+        The index of the store is rewritten for that, so this is meant for category boundaries rather than single rows.
+        """
+        self.call(self.history_store.flush)
+
+    def _work(self):
+        unflushed = 0
+        # Callbacks run after the rows queued before them were flushed. Anything that depends on the rows,
+        # like the scan journal, must not claim them before they are on disk.
+        callbacks: List[Callable[[], None]] = []
+
+        while True:
+            task = self.queue.get()
+
+            # Skip everything after an error, finish reports it.
+            if self.error and task is not None:
+                continue
+
+            try:
+                if task is not None:
+                    values, callback = task
+                    if values is not None:
+                        with metrics.stage("history_write"):
+                            self.segment_writer.append_values(values)
+                            self.history_store.append_values(values)
+                        unflushed += 1
+                    if callback:
+                        callbacks.append(callback)
+
+                if task is None or unflushed >= self.flush_rows or self.queue.empty():
+                    if unflushed > 0:
+                        self.segment_writer.flush()
+                        unflushed = 0
+                    for callback in callbacks:
+                        callback()
+                    callbacks = []
+            except BaseException as e:
+                print(f"Writing the history failed: {e}")
+                self.error = e
+
+            if task is None:
+                return
+
+    def finish(self):
+        """Waits until all queued rows are written, and makes the segments and the HistoryStore durable with fsync.
+        Has to be called before the scan results are swapped into place.
+
+        Raises:
+            RuntimeError: If writing a row failed.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        try:
+            self._raise_error()
+            self.segment_writer.flush(sync=True)
+            self.history_store.flush(sync=True)
+        finally:
+            self.segment_writer.close()
+            self.history_store.close()
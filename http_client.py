@@ -0,0 +1,150 @@
+from requests.adapters import HTTPAdapter
+from typing import *
+import requests
+import hashlib
+import json
+import time
+import os
+
+
+class CachedResponse:
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes):
+        """A response served from the network or from the on-disk cache. Header names are lowercase.
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class HttpClient:
+    def __init__(self, cache_location: str = "http_cache", fixtures_location: str = "http_fixtures", mode: Optional[str] = None):
+        """A HTTP client with keep-alive connection pooling and an on-disk response cache.
+
+        Modes:
+            live: Serves fresh cached responses, revalidates stale ones with conditional GETs,
+                and falls back to stale responses if the network is down, times out or the server fails.
+            record: Always fetches, and saves every response to fixtures_location.
+            replay: Never uses the network, and only serves responses from fixtures_location.
+
+        Args:
+            cache_location (str, optional): The directory of the response cache. Defaults to "http_cache".
+            fixtures_location (str, optional): The directory of recorded responses. Defaults to "http_fixtures".
+            mode (str, optional): live, record or replay. Defaults to the TIBIA_HTTP_MODE environment variable, or live.
+        """
+        self.cache_location = cache_location
+        self.fixtures_location = fixtures_location
+        self.mode = mode or os.environ.get("TIBIA_HTTP_MODE", "live")
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        self.session.headers["User-Agent"] = "tibia-market-tracker"
+
+    def _paths(self, location: str, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(location, key + ".json"), os.path.join(location, key + ".body")
+
+    def _load(self, location: str, url: str) -> Optional[Tuple[dict, CachedResponse]]:
+        meta_path, body_path = self._paths(location, url)
+        if not os.path.exists(meta_path) or not os.path.exists(body_path):
+            return None
+
+        with open(meta_path, "r") as f:
+            meta = json.loads(f.read())
+        with open(body_path, "rb") as f:
+            content = f.read()
+
+        return meta, CachedResponse(url, meta["status_code"], meta["headers"], content)
+
+    def _save(self, location: str, response: CachedResponse):
+        os.makedirs(location, exist_ok=True)
+        meta_path, body_path = self._paths(location, response.url)
+
+        # Write the body first, so a saved meta file always has its body.
+        with open(body_path + ".tmp", "wb") as f:
+            f.write(response.content)
+        os.replace(body_path + ".tmp", body_path)
+
+        with open(meta_path + ".tmp", "w") as f:
+            f.write(json.dumps({"url": response.url, "time": time.time(), "status_code": response.status_code, "headers": response.headers}))
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _fetch(self, url: str, headers: Dict[str, str] = None, timeout: float = 30) -> requests.Response:
+        return self.session.get(url, headers=headers or {}, timeout=timeout)
+
+    def get(self, url: str, ttl: float = 3600) -> CachedResponse:
+        """Gets the url, from the cache if possible.
+
+        Args:
+            url (str): The url to get.
+            ttl (float, optional): How long a cached response is used without revalidating it, in seconds. Defaults to 3600.
+
+        Returns:
+            CachedResponse: The response.
+        """
+        if self.mode == "replay":
+            recorded = self._load(self.fixtures_location, url)
+            if recorded is None:
+                raise FileNotFoundError(f"No recorded response for {url}.")
+            return recorded[1]
+
+        if self.mode == "record":
+            raw = self._fetch(url)
+            response = CachedResponse(url, raw.status_code, {key.lower(): value for key, value in raw.headers.items()}, raw.content)
+            self._save(self.fixtures_location, response)
+            return response
+
+        cached = self._load(self.cache_location, url)
+        if cached and time.time() - cached[0]["time"] < ttl:
+            return cached[1]
+
+        # Revalidate the cached response instead of downloading it again, if the server supports it.
+        headers = {}
+        if cached:
+            if "etag" in cached[1].headers:
+                headers["If-None-Match"] = cached[1].headers["etag"]
+            if "last-modified" in cached[1].headers:
+                headers["If-Modified-Since"] = cached[1].headers["last-modified"]
+
+        try:
+            raw = self._fetch(url, headers)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if cached:
+                print(f"Network unavailable, using stale response for {url}: {e}")
+                return cached[1]
+            raise
+
+        if raw.status_code >= 500 and cached:
+            print(f"Server error {raw.status_code}, using stale response for {url}.")
+            return cached[1]
+
+        if raw.status_code == 304 and cached:
+            response = cached[1]
+        else:
+            response = CachedResponse(url, raw.status_code, {key.lower(): value for key, value in raw.headers.items()}, raw.content)
+
+        if response.status_code == 200:
+            self._save(self.cache_location, response)
+
+        return response
+
+
+_default_client: Optional[HttpClient] = None
+
+
+def default_client() -> HttpClient:
+    """Returns the HttpClient shared by everything that doesn't pass its own.
+    """
+    global _default_client
+
+    if _default_client is None:
+        _default_client = HttpClient()
+
+    return _default_client
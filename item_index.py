@@ -0,0 +1,112 @@
+from collections.abc import Mapping
+from typing import *
+import sqlite3
+import time
+import os
+
+
+class ItemIndex(Mapping):
+    def __init__(self, location: str = "items.sqlite"):
+        """A persistent index of the item ids, mapping each id to its item name. An item can have multiple ids.
+        Lookups are answered from the memory mapped database, nothing is loaded up front.
+
+        Args:
+            location (str, optional): The SQLite database of the index. Defaults to "items.sqlite".
+        """
+        self.connection = sqlite3.connect(location)
+        self.connection.execute("PRAGMA mmap_size = 67108864")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS items_name ON items (name)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    @property
+    def revision(self) -> Optional[str]:
+        """The revision of the Item_IDs wiki page the index was built from. None if it wasn't built from the wiki.
+        """
+        return self._get_meta("revision")
+
+    def __getitem__(self, id: int) -> str:
+        row = self.connection.execute("SELECT name FROM items WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            raise KeyError(id)
+
+        return row[0]
+
+    def __contains__(self, id: object) -> bool:
+        return self.connection.execute("SELECT 1 FROM items WHERE id = ?", (id,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return (row[0] for row in self.connection.execute("SELECT id FROM items ORDER BY id"))
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def ids(self, name: str) -> List[int]:
+        """Returns all ids of the item.
+        """
+        return [row[0] for row in self.connection.execute("SELECT id FROM items WHERE name = ? ORDER BY id", (name,))]
+
+    def replace(self, id_to_name: Dict[int, str], revision: Optional[str]):
+        """Replaces the whole index in a single transaction.
+
+        Args:
+            id_to_name (Dict[int, str]): The ids of all items, mapped to their names.
+            revision (Optional[str]): The wiki revision the ids are from.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM items")
+            self.connection.executemany("INSERT INTO items (id, name) VALUES (?, ?)", id_to_name.items())
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (revision,))
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, wiki, csv_location: str = "items.csv", max_age: float = 12 * 60 * 60):
+        """Updates the index from the wiki if the Item_IDs page changed since the last refresh.
+        The revision is checked at most once every max_age seconds.
+        If the wiki can't be reached and the index is empty, it is filled from csv_location instead.
+
+        Args:
+            wiki (Wiki): The wiki to fetch the ids from.
+            csv_location (str, optional): The CSV the ids are exported to, and imported from as fallback. Defaults to "items.csv".
+            max_age (float, optional): How long a checked revision is trusted, in seconds. Defaults to 12 hours.
+        """
+        checked = self._get_meta("checked")
+        if len(self) > 0 and checked and time.time() - float(checked) < max_age:
+            return
+
+        try:
+            revision = str(wiki.get_item_ids_revision())
+            if revision != self.revision:
+                id_to_name, _ = wiki.get_item_ids()
+                self.replace(id_to_name, revision)
+                self.export_csv(csv_location)
+
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('checked', ?)", (str(time.time()),))
+        except Exception as e:
+            print(f"Failed to get item ids from wiki. {e}")
+
+            if len(self) == 0 and os.path.exists(csv_location):
+                self.import_csv(csv_location)
+
+    def export_csv(self, location: str):
+        """Writes the index as name,id lines, one line per id.
+        """
+        with open(location, "w+") as f:
+            for id, name in self.connection.execute("SELECT id, name FROM items ORDER BY name, id"):
+                f.write(f"{name},{id}\n")
+
+    def import_csv(self, location: str):
+        """Fills the index from name,id lines, as written by export_csv.
+        """
+        id_to_name = {}
+        with open(location, "r") as f:
+            for line in f:
+                if len(line) >= 3:
+                    values = line.strip().split(",")
+                    id_to_name[int(values[-1])] = ",".join(values[:-1])
+
+        self.replace(id_to_name, None)
@@ -0,0 +1,160 @@
+from PIL import ImageGrab
+from collections import namedtuple
+from typing import *
+import cv2
+import numpy as np
+import os
+
+
+Box = namedtuple("Box", "left top width height")
+
+# How far around the last known position of a template to look first, in pixels.
+REGION_PADDING = 64
+
+
+class Capture:
+    def __init__(self, rgb: np.ndarray):
+        """A single screenshot, shared between all templates matched in the same tick.
+
+        Args:
+            rgb (np.ndarray): The screenshot as a (height, width, 3) RGB array.
+        """
+        self.rgb = rgb
+        self._gray = None
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+
+        return self._gray
+
+
+class Locator:
+    def __init__(self, images_location: str = "images"):
+        """Finds the template images on the screen. All templates are loaded and preprocessed once,
+        and the last known position of each template is used to search a small region first.
+
+        Args:
+            images_location (str, optional): The directory containing the template PNGs. Defaults to "images".
+        """
+        self.templates: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.last_boxes: Dict[str, Box] = {}
+
+        for file in sorted(os.listdir(images_location)):
+            if file.endswith(".png"):
+                self._load(os.path.join(images_location, file))
+
+    def _load(self, image: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Loads a template as RGB and grayscale arrays.
+        """
+        if image not in self.templates:
+            bgr = cv2.imread(image, cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise FileNotFoundError(f"Template {image} does not exist.")
+
+            self.templates[image] = (cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))
+
+        return self.templates[image]
+
+    def capture(self) -> Capture:
+        """Takes a screenshot of the whole screen.
+        """
+        return Capture(np.asarray(ImageGrab.grab().convert("RGB")))
+
+    def _match(self, image: str, capture: Capture, grayscale: bool, exact: bool, region: Optional[Box] = None) -> Tuple[np.ndarray, int, int]:
+        """Matches the template against the capture, or a region of it.
+
+        Returns:
+            Tuple[np.ndarray, int, int]: The normalized match scores, and the offset of the searched region.
+        """
+        rgb_template, gray_template = self._load(image)
+
+        # Exact matches are compared in color, like pyautogui does without a confidence.
+        use_gray = grayscale and not exact
+        haystack = capture.gray if use_gray else capture.rgb
+        template = gray_template if use_gray else rgb_template
+
+        left, top = 0, 0
+        if region:
+            left, top = max(region.left, 0), max(region.top, 0)
+            haystack = haystack[top:region.top + region.height, left:region.left + region.width]
+
+        if haystack.shape[0] < template.shape[0] or haystack.shape[1] < template.shape[1]:
+            return np.zeros((0, 0), dtype=np.float32), left, top
+
+        return cv2.matchTemplate(haystack, template, cv2.TM_CCOEFF_NORMED), left, top
+
+    def locate_all(self, image: str, capture: Capture, grayscale: bool = True, confidence: float = 0.9, exact: bool = False,
+                   region: Optional[Box] = None) -> List[Box]:
+        """Finds all occurences of the template in the capture.
+
+        Args:
+            image (str): The path of the template.
+            capture (Capture): The screenshot to search.
+            grayscale (bool, optional): Whether to compare in grayscale. Defaults to True.
+            confidence (float, optional): The minimum match score. Defaults to 0.9.
+            exact (bool, optional): Only accept pixel perfect matches, in color. Defaults to False.
+            region (Box, optional): Only search this region of the capture. Defaults to None.
+
+        Returns:
+            List[Box]: The boxes of the occurences, from top to bottom and left to right.
+        """
+        scores, left, top = self._match(image, capture, grayscale, exact, region)
+        height, width = self.templates[image][1].shape
+
+        ys, xs = np.nonzero(scores >= (0.999 if exact else confidence))
+        order = np.lexsort((xs, ys))
+
+        # Neighbouring positions of the same occurence match as well, keep only the first one.
+        boxes = []
+        for y, x in zip(ys[order] + top, xs[order] + left):
+            if all(abs(x - box.left) >= width or abs(y - box.top) >= height for box in boxes):
+                boxes.append(Box(int(x), int(y), width, height))
+
+        return boxes
+
+    def locate(self, image: str, capture: Capture, grayscale: bool = True, confidence: float = 0.9, exact: bool = False) -> Optional[Box]:
+        """Finds the best occurence of the template in the capture.
+        The region around the last known position of the template is searched first, then the whole capture.
+
+        Returns:
+            Optional[Box]: The box of the occurence, or None if it wasn't found.
+        """
+        regions = [None]
+        if image in self.last_boxes:
+            box = self.last_boxes[image]
+            regions.insert(0, Box(box.left - REGION_PADDING, box.top - REGION_PADDING, box.width + 2 * REGION_PADDING, box.height + 2 * REGION_PADDING))
+
+        for region in regions:
+            scores, left, top = self._match(image, capture, grayscale, exact, region)
+            if scores.size == 0:
+                continue
+
+            _, best_score, _, (x, y) = cv2.minMaxLoc(scores)
+            if best_score >= (0.999 if exact else confidence):
+                height, width = self.templates[image][1].shape
+                self.last_boxes[image] = Box(x + left, y + top, width, height)
+                return self.last_boxes[image]
+
+        return None
+
+    def locate_center(self, image: str, capture: Capture, grayscale: bool = True, confidence: float = 0.9, exact: bool = False) -> Optional[Tuple[int, int]]:
+        """Like locate, but returns the center of the occurence.
+        """
+        box = self.locate(image, capture, grayscale, confidence, exact)
+        return (box.left + box.width // 2, box.top + box.height // 2) if box else None
+
+    def locate_any(self, images: List[str], capture: Capture, grayscale: bool = True, confidence: float = 0.9) -> Dict[str, Tuple[int, int]]:
+        """Matches several templates against the same capture.
+
+        Returns:
+            Dict[str, Tuple[int, int]]: The centers of the templates which were found.
+        """
+        found = {}
+        for image in images:
+            position = self.locate_center(image, capture, grayscale, confidence)
+            if position:
+                found[image] = position
+
+        return found
@@ -1,11 +1,28 @@
 from tibia import Client, MarketValues, Wiki
+from market_values import MarketBatch
+from history_writer import HistoryWriter
+from history_segments import segment_period
+from scan_journal import ScanJournal
+from event_store import EventStore
+from publisher import get_publisher
+from metrics import metrics
+from crawl_orchestrator import CrawlOrchestrator, VirtualDisplay, launch_client
+from contextlib import ExitStack
+from rescan_scheduler import RescanScheduler
+from history_store import HistoryStore
+from orderbook import OrderBookRecorder
+from typing import *
 import time
 import os
 import json
-import schedule
 import subprocess
 from datetime import datetime
-from git.repo import Repo
+from functools import partial
+import numpy as np
+
+
+# Scan rows are written and journaled in chunks of this many items. A resumed scan repeats at most one chunk.
+SCAN_CHUNK_ROWS = 32
 
 
 def write_marketable_items():
@@ -19,27 +36,60 @@ def write_events(results_location: str):
     Writes all currently known events into the events.csv in the results_location.
     """
     try:
-        last_date = datetime.min
-
-        if os.path.exists(os.path.join(results_location, "events.csv")):
-            with open(os.path.join(results_location, "events.csv"), "r") as event_file:
-                previous_events = [event for event in event_file.readlines() if event and not str.isspace(event)]
-                if previous_events:
-                    last_date = datetime.strptime(previous_events[-1].split(",")[0], "%Y.%m.%d")
-
-        with open(os.path.join(results_location, "events.csv"), "a+") as event_file:
-            events = Wiki().get_events(last_date)
-            if events:
-                event_file.write("\n".join([event.__str__() for event in events]) + "\n")
+        event_store = EventStore(os.path.join(results_location, "events.csv"))
+        event_store.append(Wiki().get_events(event_store.last_date()))
+        get_publisher(results_location).stage(event_store.location)
     except Exception as e:
         print(f"Writing events failed: {e}")
 
 
+def write_scan_chunk(f: TextIO, chunk: MarketBatch, position: Tuple[int, int, int], history_writer: HistoryWriter, journal: ScanJournal):
+    """Writes the rows of the chunk to the scan output in one call, and empties it.
+    The last item of the chunk is journaled once the history rows are on disk as well.
+
+    Args:
+        f (TextIO): The scan output.
+        chunk (MarketBatch): The rows read since the last chunk.
+        position (Tuple[int, int, int]): The crawl position of the last item of the chunk.
+        history_writer (HistoryWriter): The writer the history rows of the chunk were submitted to.
+        journal (ScanJournal): The journal of the scan.
+    """
+    if len(chunk) == 0:
+        return
+
+    with metrics.stage("file_write"):
+        chunk.to_csv(f, header=False)
+        f.flush()
+    history_writer.call(partial(journal.record, *position, f.tell()))
+    chunk.clear()
+
+
 def do_market_search(email: str, password: str, tibia_location: str, results_location: str):
+    publisher = get_publisher(results_location)
+    metrics.reset()
     write_events(results_location)
 
-    with open(os.path.join(results_location, "fullscan_tmp.csv"), "w+") as f:
-        f.write("Name,SellPrice,BuyPrice,AvgSellPrice,AvgBuyPrice,Sold,Bought,Profit,RelProfit,PotProfit,ActiveTraders\n")
+    # Continue an unfinished scan of a previous run, if there is one.
+    journal = ScanJournal(os.path.join(results_location, "fullscan_journal.jsonl"))
+    progress = journal.load() if os.path.exists(os.path.join(results_location, "fullscan_tmp.csv")) else None
+
+    with open(os.path.join(results_location, "fullscan_tmp.csv"), "r+" if progress else "w+") as f:
+        if progress:
+            print(f"Resuming scan at category {progress.category}, index {progress.index}.")
+            # Drop rows written after the last journal entry.
+            f.truncate(progress.output_offset)
+            f.seek(progress.output_offset)
+            journal.resume()
+            # The histories written before the interruption weren't staged by this process.
+            # Only the segments of the periods since the scan started can contain them.
+            segments_location = os.path.join(results_location, "history_segments")
+            if os.path.isdir(segments_location):
+                publisher.stage(*[os.path.join(segments_location, file) for file in os.listdir(segments_location)
+                                  if file.endswith(".seg") and file[:-len(".seg")] >= segment_period(progress.started)])
+        else:
+            f.write("Name,SellPrice,BuyPrice,AvgSellPrice,AvgBuyPrice,Sold,Bought,Profit,RelProfit,PotProfit,ActiveTraders\n")
+            f.flush()
+            journal.start(f.tell())
         
         client = Client()
         client.start_game(tibia_location)
@@ -48,32 +98,190 @@ def do_market_search(email: str, password: str, tibia_location: str, results_loc
         if not client.open_market():
             client.exit_tibia()
             return
+
+        first_category = 1
+        if progress:
+            first_category = progress.category + 1 if progress.category_done else progress.category
         
-        for category in range(1, 25):
-            for item in client.crawl_market(category):
-                with open(os.path.join(results_location, "histories", f"{item.name.lower()}.csv"), "a+") as h:
-                    h.write(item.history_string() + "\n")
-                f.write(f"{item}\n")
+        history_writer = HistoryWriter(os.path.join(results_location, "history_segments"), "history_store")
+        # Books read before an interruption are lost, a resumed scan only keeps the books it read itself.
+        order_books = OrderBookRecorder(time.time())
+        chunk = MarketBatch(SCAN_CHUNK_ROWS)
+        position = None
+        try:
+            for category in range(first_category, 25):
+                resuming = progress and not progress.category_done and category == progress.category
+
+                for item in client.crawl_market(category, progress.index if resuming else 0):
+                    # The first item after resuming may be the last one written before.
+                    if resuming and client.crawl_position[2] == progress.item_id:
+                        continue
+                    resuming = False
+
+                    chunk.append(item)
+                    position = tuple(client.crawl_position)
+                    publisher.stage(history_writer.submit(item))
+                    order_books.append(item.name, client.market_reader.last_order_book)
+
+                    if len(chunk) >= SCAN_CHUNK_ROWS:
+                        write_scan_chunk(f, chunk, position, history_writer, journal)
+
+                write_scan_chunk(f, chunk, position, history_writer, journal)
+                history_writer.call(partial(journal.record_category_done, category, f.tell()))
+                history_writer.checkpoint()
+                metrics.write()
+        finally:
+            try:
+                # The items read before a failure are kept, the resumed scan continues after them.
+                write_scan_chunk(f, chunk, position, history_writer, journal)
+            finally:
+                # Everything queued has to be durable before the results are swapped into place.
+                history_writer.finish()
+
+        os.fsync(f.fileno())
         
     client.exit_tibia()
+    order_books.save()
+
+    os.replace(os.path.join(results_location, "fullscan_tmp.csv"), os.path.join(results_location, "fullscan.csv"))
+    journal.finish()
+    publisher.stage(os.path.join(results_location, "fullscan.csv"))
+    publisher.publish()
+    metrics.write(summary=True)
+
+    turn_off_display()
+
+def do_sharded_market_search(shards: List[dict], tibia_location: str, results_location: str):
+    """Scans the market with one client per shard, each on its own display with its own character.
+    Sharded scans aren't journaled, an interrupted scan starts over. The scan is kept in memory until every category
+    was scanned, if a category fails the whole scan is discarded.
+
+    Args:
+        shards (List[dict]): The "display", "email" and "password" of each client. Displays with "virtual": true are started with Xvfb.
+        tibia_location (str): The location of the Tibia executable.
+        results_location (str): The results repo.
+    """
+    publisher = get_publisher(results_location)
+    metrics.reset()
+    write_events(results_location)
+
+    factories = [partial(launch_client, shard["display"], shard["email"], shard["password"], tibia_location) for shard in shards]
+    orchestrator = CrawlOrchestrator(factories, displays=[shard["display"] for shard in shards])
+    scan = MarketBatch()
+    order_books = OrderBookRecorder(time.time())
 
+    with ExitStack() as displays:
+        for shard in shards:
+            if shard.get("virtual"):
+                displays.enter_context(VirtualDisplay(shard["display"]))
+
+        # The items are counted by the clients, metrics of worker processes are merged by the orchestrator.
+        for category, item, book in orchestrator.run():
+            scan.append(item)
+            order_books.append(item.name, book)
+
+    if orchestrator.failed_categories:
+        print(f"Categories {orchestrator.failed_categories} couldn't be scanned, keeping the previous results.")
+        turn_off_display()
+        return
+
+    # The histories are only written once every category was scanned, so a discarded scan leaves nothing to publish.
+    with HistoryWriter(os.path.join(results_location, "history_segments"), "history_store") as history_writer:
+        for item in scan:
+            publisher.stage(history_writer.submit(item))
+
+    with metrics.stage("file_write"), open(os.path.join(results_location, "fullscan_tmp.csv"), "w") as f:
+        scan.to_csv(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    order_books.save()
     os.replace(os.path.join(results_location, "fullscan_tmp.csv"), os.path.join(results_location, "fullscan.csv"))
-    push_to_github(results_location)
+    publisher.stage(os.path.join(results_location, "fullscan.csv"))
+    publisher.publish()
+    metrics.write(summary=True)
 
     turn_off_display()
 
-def push_to_github(results_repo_location: str):
+def update_fullscan(results_location: str, refreshed: Dict[str, MarketValues]):
+    """Replaces the rows of the refreshed items in fullscan.csv.
     """
-    Pushes the new market data from the results repo to GitHub.
+    location = os.path.join(results_location, "fullscan.csv")
+    if not os.path.exists(location):
+        return
+
+    with open(location, "r") as f:
+        scan = MarketBatch.read_csv(f)
+
+    updates = MarketBatch(len(refreshed))
+    for values in refreshed.values():
+        updates.append(values)
+
+    # Known items are replaced in place, new ones are added at the end.
+    indices = {name: i for i, name in enumerate(scan.rows["name"].tolist())}
+    positions = np.array([indices.get(name, -1) for name in refreshed.keys()], dtype=np.int64)
+    scan.rows[positions[positions >= 0]] = updates.rows[positions >= 0]
+    scan.extend_rows(updates.rows[positions < 0])
+
+    with open(location + ".tmp", "w") as f:
+        scan.to_csv(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(location + ".tmp", location)
+
+
+def do_priority_refresh(email: str, password: str, tibia_location: str, results_location: str, scheduler: RescanScheduler):
+    """Refreshes the items with the highest priority one by one, until the next full sweep is due.
     """
+    with HistoryStore("history_store") as store:
+        ranking = scheduler.rank(store, time.time())
+
+    # Starting the client takes a while, it isn't worth it shortly before a sweep.
+    deadline = scheduler.refresh_deadline(datetime.now())
+    if not ranking or deadline - time.time() < 15 * 60:
+        return
+
+    client = Client()
+    client.start_game(tibia_location)
+    client.login_to_game(email, password)
+
+    if not client.open_market():
+        client.exit_tibia()
+        return
+
+    publisher = get_publisher(results_location)
+    refreshed = {}
+    attempted = []
+
+    def due_items():
+        for name in ranking:
+            if time.time() >= deadline:
+                return
+            attempted.append((name, time.time()))
+            yield name
+
     try:
-        repo = Repo(os.path.join(results_repo_location, ".git"))
-        repo.git.add(all=True)
-        repo.index.commit("Update market data")
-        origin = repo.remote("origin")
-        origin.push()
-    except Exception as e:
-        print(f"Error while pushing to git: {e}")
+        with HistoryWriter(os.path.join(results_location, "history_segments"), "history_store") as history_writer:
+            for values in client.refresh_items(due_items()):
+                name = values.name.lower()
+                scheduler.refreshed(name, values.time)
+                refreshed[name] = values
+                publisher.stage(history_writer.submit(values))
+    finally:
+        # Failed items back off, so a ranking of only broken items doesn't start the client every minute.
+        for name, attempt_time in attempted:
+            if name not in refreshed:
+                scheduler.refreshed(name, attempt_time, succeeded=False)
+
+    client.exit_tibia()
+
+    print(f"Refreshed {len(refreshed)} items.")
+    if refreshed:
+        update_fullscan(results_location, refreshed)
+        publisher.stage(os.path.join(results_location, "fullscan.csv"))
+        publisher.publish("Refresh market data")
+
+    turn_off_display()
 
 def turn_off_display():
     """Turns off the display by using xset.
@@ -90,11 +298,18 @@ if __name__ == "__main__":
     
     #schedule.every().day.at("10:15:00").do(lambda: observe_items(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"]))
     #observe_items(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"])
-    do_market_search(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"])
+    if config.get("shards"):
+        search = lambda: do_sharded_market_search(config["shards"], config["tibiaLocation"], config["resultsLocation"])
+    else:
+        search = lambda: do_market_search(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"])
 
-    schedule.every().day.at("18:00:00").do(lambda: do_market_search(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"]))
-    schedule.every().day.at("06:00:00").do(lambda: do_market_search(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"]))
+    # Full sweeps run at fixed times. In between, the client refreshes the items which need it the most.
+    scheduler = RescanScheduler(["06:00", "18:00"])
     
     while True:
-        schedule.run_pending()
-        time.sleep(60)
+        if scheduler.sweep_due(datetime.now()):
+            search()
+            scheduler.sweep_done(datetime.now())
+        else:
+            do_priority_refresh(config["email"], config["password"], config["tibiaLocation"], config["resultsLocation"], scheduler)
+            time.sleep(60)
@@ -0,0 +1,313 @@
+from market_values import MarketBatch, MARKET_DTYPE
+from history_store import HistoryStore, HISTORY_DTYPE
+from item_index import ItemIndex
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+from typing import *
+import numpy as np
+import asyncio
+import hashlib
+import json
+import gzip
+import os
+
+
+# Responses smaller than this aren't worth compressing.
+GZIP_MIN_SIZE = 1024
+
+# The columns top-N queries can be ranked by.
+RANK_FIELDS = ["profit", "rel_profit", "potential_profit", "sold", "bought", "active_traders"]
+MAX_TOP = 1000
+
+STATUS_TEXTS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _file_version(location: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(location)
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class MarketData:
+    def __init__(self, results_location: str, store_location: str = "history_store", index_location: str = "items.sqlite"):
+        """The latest scan, the item histories and the item ids, kept in memory for the query API.
+
+        Args:
+            results_location (str): The results repo containing fullscan.csv.
+            store_location (str, optional): The HistoryStore directory. Defaults to "history_store".
+            index_location (str, optional): The ItemIndex database. Defaults to "items.sqlite".
+        """
+        self.fullscan_location = os.path.join(results_location, "fullscan.csv")
+        self.store_location = store_location
+        self.index_location = index_location
+
+        self.scan = MarketBatch(1)
+        self.scan_rows: Dict[str, int] = {}
+        self.store: Optional[HistoryStore] = None
+        self.item_ids: Dict[str, List[int]] = {}
+        self.item_names: Dict[int, str] = {}
+
+        self.scan_version: Optional[Tuple[int, int]] = None
+        self.store_version: Optional[Tuple[int, int]] = None
+        self.index_version: Optional[Tuple[int, int]] = None
+
+    def reload(self) -> bool:
+        """Reloads the sources which changed since the last reload. The bot replaces fullscan.csv and the store index
+        atomically when a scan finishes, so a changed modification time means a complete new version.
+
+        Returns:
+            bool: Whether anything changed.
+        """
+        changed = False
+
+        version = _file_version(self.fullscan_location)
+        if version != self.scan_version:
+            if version:
+                with open(self.fullscan_location, "r") as f:
+                    scan = MarketBatch.read_csv(f, version[0] / 1e9)
+            else:
+                scan = MarketBatch(1)
+            self.scan = scan
+            self.scan_rows = {name: i for i, name in enumerate(scan.rows["name"].tolist())}
+            self.scan_version = version
+            changed = True
+            print(f"Loaded {len(scan)} items of the latest scan.")
+
+        # Only the index of the store is read, the histories stay memory mapped until queried.
+        version = _file_version(os.path.join(self.store_location, "index.json"))
+        if version != self.store_version:
+            self.store = HistoryStore(self.store_location) if version else None
+            self.store_version = version
+            changed = True
+
+        version = _file_version(self.index_location)
+        if version != self.index_version:
+            self.item_ids, self.item_names = {}, {}
+            if version:
+                index = ItemIndex(self.index_location)
+                for id, name in index.items():
+                    self.item_ids.setdefault(name.lower(), []).append(id)
+                    self.item_names[id] = name.lower()
+                index.connection.close()
+            self.index_version = version
+            changed = True
+
+        return changed
+
+    def _scan_item(self, row: np.void) -> dict:
+        return {field: row[field].item() for field in MARKET_DTYPE.names}
+
+    def top(self, n: int, by: str) -> dict:
+        """The n items of the latest scan with the highest value of the field.
+        """
+        if by not in RANK_FIELDS:
+            raise ApiError(400, f"Can only rank by {', '.join(RANK_FIELDS)}.")
+        if not 0 < n <= MAX_TOP:
+            raise ApiError(400, f"n has to be between 1 and {MAX_TOP}.")
+
+        rows = self.scan.rows
+        n = min(n, len(rows))
+        # Partition first, only the top n are sorted.
+        top = np.argpartition(-rows[by], n - 1)[:n] if n > 0 else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-rows[by][top], kind="stable")]
+        return {"by": by, "items": [self._scan_item(rows[i]) for i in top]}
+
+    def item(self, key: str) -> dict:
+        """Looks up an item by id or name.
+        """
+        if key.isdigit():
+            if int(key) not in self.item_names:
+                raise ApiError(404, f"Unknown item id {key}.")
+            name = self.item_names[int(key)]
+        else:
+            name = key.lower()
+
+        if name not in self.item_ids and name not in self.scan_rows:
+            raise ApiError(404, f"Unknown item {key}.")
+
+        latest = self.scan_rows.get(name)
+        return {
+            "name": name,
+            "ids": self.item_ids.get(name, []),
+            "latest": self._scan_item(self.scan.rows[latest]) if latest is not None else None,
+        }
+
+    def history(self, name: str, start: Optional[float], end: Optional[float]) -> dict:
+        """The history of an item within the time range, as rows of HISTORY_DTYPE columns.
+        """
+        name = name.lower()
+        if self.store is None or name not in self.store.items:
+            raise ApiError(404, f"No history of {name}.")
+
+        rows = self.store.query(name, start, end)
+        return {"name": name, "columns": list(HISTORY_DTYPE.names), "rows": rows.tolist()}
+
+
+class Response:
+    def __init__(self, status: int, body: bytes):
+        """An encoded JSON response, with its ETag and lazily compressed body.
+        """
+        self.status = status
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, 6)
+        return self._gzipped
+
+
+class MarketApi:
+    def __init__(self, data: MarketData, host: str = "127.0.0.1", port: int = 8080, reload_interval: float = 5, cache_size: int = 1024):
+        """A local HTTP API answering queries on the market data.
+
+        GET /top?n=20&by=potential_profit: The top items of the latest scan.
+        GET /items/<id or name>: The ids and latest values of an item.
+        GET /history/<name>?start=<unix time>&end=<unix time>: The history of an item.
+
+        Responses are cached until the data changes, and carry ETags for conditional requests.
+
+        Args:
+            data (MarketData): The data to serve.
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on. Defaults to 8080.
+            reload_interval (float, optional): How often the data is checked for changes, in seconds. Defaults to 5.
+            cache_size (int, optional): How many responses are cached. Defaults to 1024.
+        """
+        self.data = data
+        self.host = host
+        self.port = port
+        self.reload_interval = reload_interval
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, Response]" = OrderedDict()
+
+    def _route(self, target: str) -> dict:
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+
+        try:
+            if parts == ["top"]:
+                return self.data.top(int(query.get("n", 20)), query.get("by", "potential_profit"))
+            if len(parts) == 2 and parts[0] == "items":
+                return self.data.item(parts[1])
+            if len(parts) == 2 and parts[0] == "history":
+                start, end = query.get("start"), query.get("end")
+                return self.data.history(parts[1], float(start) if start else None, float(end) if end else None)
+        except ValueError as e:
+            raise ApiError(400, f"Invalid parameter: {e}")
+
+        raise ApiError(404, f"Unknown path {url.path}.")
+
+    def respond(self, target: str) -> Response:
+        """The response to a GET of the target, from the cache if possible.
+        """
+        if target in self.cache:
+            self.cache.move_to_end(target)
+            return self.cache[target]
+
+        try:
+            response = Response(200, json.dumps(self._route(target), separators=(",", ":")).encode("utf-8"))
+        except ApiError as e:
+            response = Response(e.status, json.dumps({"error": str(e)}).encode("utf-8"))
+
+        self.cache[target] = response
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return response
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                if int(headers.get("content-length", 0)) > 0:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                method, target, version = request_line.decode("latin-1").split()
+                keep_alive = headers.get("connection", "").lower() != "close" if version == "HTTP/1.1" else headers.get("connection", "").lower() == "keep-alive"
+
+                if method not in ("GET", "HEAD"):
+                    response = Response(405, b'{"error":"Only GET is supported."}')
+                else:
+                    response = self.respond(target)
+
+                status, body = response.status, response.body
+                response_headers = {"Content-Type": "application/json", "ETag": response.etag, "Vary": "Accept-Encoding"}
+                if status == 200 and response.etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+                    status, body = 304, b""
+                elif len(body) >= GZIP_MIN_SIZE and "gzip" in headers.get("accept-encoding", ""):
+                    body = response.gzipped
+                    response_headers["Content-Encoding"] = "gzip"
+
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head = f"HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\n" + "".join(f"{key}: {value}\r\n" for key, value in response_headers.items()) + "\r\n"
+
+                writer.write(head.encode("latin-1") + (body if method == "GET" else b""))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            print(f"Dropping malformed or broken request: {e}")
+        finally:
+            writer.close()
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                # Reloads run on the event loop, so no request sees half of the new data. Parsing a scan only takes milliseconds.
+                if self.data.reload():
+                    self.cache.clear()
+            except Exception as e:
+                print(f"Reloading the market data failed: {e}")
+
+    async def serve(self):
+        """Loads the data and serves requests until cancelled.
+        """
+        self.data.reload()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        reloader = asyncio.create_task(self._reload_loop())
+        print(f"Serving the market API on http://{self.host}:{self.port}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reloader.cancel()
+
+
+if __name__ == "__main__":
+    import sys
+
+    with open("config.json", "r") as c:
+        config = json.loads(c.read())
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    try:
+        asyncio.run(MarketApi(MarketData(config["resultsLocation"]), port=port).serve())
+    except KeyboardInterrupt:
+        pass
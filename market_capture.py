@@ -0,0 +1,149 @@
+from typing import *
+import ctypes
+import struct
+import json
+import zlib
+
+
+# A capture file is a sequence of records: kind byte, payload length, zlib compressed payload.
+RECORD_HEADER = struct.Struct("<cI")
+# The addresses and buffer types of the readers, written whenever they change.
+LAYOUT_RECORD = b"L"
+# All reads made while reading the values of one item.
+FRAME_RECORD = b"F"
+
+FRAME_HEADER = struct.Struct("<dI")
+READ_HEADER = struct.Struct("<QI")
+
+
+class CaptureFrame:
+    def __init__(self, time: float, reads: Dict[Tuple[int, int], bytes]):
+        """The raw memory reads made while reading the values of one item.
+
+        Args:
+            time (float): The unix timestamp the item was read at.
+            reads (Dict[Tuple[int, int], bytes]): The read bytes, by address and size.
+        """
+        self.time = time
+        self.reads = reads
+
+    def encode(self) -> bytes:
+        parts = [FRAME_HEADER.pack(self.time, len(self.reads))]
+        for (address, size), data in self.reads.items():
+            parts.append(READ_HEADER.pack(address, size))
+            parts.append(data)
+
+        return b"".join(parts)
+
+    @staticmethod
+    def decode(payload: bytes) -> "CaptureFrame":
+        time, count = FRAME_HEADER.unpack_from(payload, 0)
+        position = FRAME_HEADER.size
+        reads = {}
+        for _ in range(count):
+            address, size = READ_HEADER.unpack_from(payload, position)
+            position += READ_HEADER.size
+            reads[(address, size)] = payload[position:position + size]
+            position += size
+
+        return CaptureFrame(time, reads)
+
+
+class CaptureWriter:
+    def __init__(self, location: str):
+        """Appends layouts and frames to a capture file.
+
+        Args:
+            location (str): The capture file. Captures of later runs are appended to it.
+        """
+        self.file = open(location, "ab")
+        self.frame: Optional[CaptureFrame] = None
+        self.last_layout = None
+
+    def _write(self, kind: bytes, payload: bytes):
+        compressed = zlib.compress(payload)
+        self.file.write(RECORD_HEADER.pack(kind, len(compressed)) + compressed)
+
+    def begin_frame(self, time: float, layout: Dict[str, dict]):
+        """Starts recording the reads of an item. The layout is written first if it changed.
+        """
+        if layout != self.last_layout:
+            self._write(LAYOUT_RECORD, json.dumps(layout).encode("utf-8"))
+            self.last_layout = layout
+
+        self.frame = CaptureFrame(time, {})
+
+    def record(self, address: int, data: bytes):
+        if self.frame is not None:
+            self.frame.reads[(address, len(data))] = data
+
+    def end_frame(self):
+        if self.frame is not None:
+            self._write(FRAME_RECORD, self.frame.encode())
+            self.file.flush()
+            self.frame = None
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture(location: str) -> Generator[Tuple[bytes, Union[dict, CaptureFrame]], None, None]:
+    """Reads the records of a capture file. A record cut off at the end of the file is ignored.
+
+    Returns:
+        Generator[Tuple[bytes, Union[dict, CaptureFrame]], None, None]: (LAYOUT_RECORD, layout) and (FRAME_RECORD, frame) tuples.
+    """
+    with open(location, "rb") as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            kind, length = RECORD_HEADER.unpack(header)
+            compressed = f.read(length)
+            if len(compressed) < length:
+                return
+
+            payload = zlib.decompress(compressed)
+            if kind == LAYOUT_RECORD:
+                yield kind, json.loads(payload)
+            elif kind == FRAME_RECORD:
+                yield kind, CaptureFrame.decode(payload)
+
+
+class RecordingProcess:
+    def __init__(self, process, writer: CaptureWriter):
+        """Wraps a mem_edit Process, and records the bytes of every read into the current frame of the writer.
+        """
+        self.process = process
+        self.writer = writer
+
+    def __getattr__(self, name: str):
+        return getattr(self.process, name)
+
+    def read_memory(self, address: int, buffer):
+        result = self.process.read_memory(address, buffer)
+        self.writer.record(address, ctypes.string_at(ctypes.addressof(buffer), ctypes.sizeof(buffer)))
+        return result
+
+
+class ReplayProcess:
+    def __init__(self):
+        """Stands in for a mem_edit Process, and answers reads from the current frame of a capture.
+        """
+        self.pid = None
+        self.frame: Optional[CaptureFrame] = None
+
+    def read_memory(self, address: int, buffer):
+        data = self.frame.reads.get((address, ctypes.sizeof(buffer))) if self.frame else None
+        if data is None:
+            raise OSError(f"The capture has no read of {ctypes.sizeof(buffer)} bytes at {address:#x}.")
+
+        ctypes.memmove(ctypes.addressof(buffer), data, len(data))
+        return buffer
+
+    def search_addresses(self, addresses: List[int], buffer) -> List[int]:
+        raise OSError("Memory can't be searched in a replayed capture.")
+
+    def search_all_memory(self, buffer) -> List[int]:
+        raise OSError("Memory can't be searched in a replayed capture.")
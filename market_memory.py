@@ -0,0 +1,549 @@
+from memory_reader import MemoryReader
+from market_values import MarketValues
+from datetime import datetime, timedelta
+from typing import *
+from metrics import metrics
+from market_capture import CaptureWriter, CaptureFrame, RecordingProcess, ReplayProcess, read_capture, LAYOUT_RECORD
+from orderbook import BOOK_DTYPE, BUY, SELL
+import numpy as np
+import memory_scan
+import ctypes
+import hashlib
+import time
+import json
+import sys
+import os
+
+
+# The results of MarketMemoryReader.read_crawled_item.
+ITEM_READ = "read"
+ITEM_DUPLICATE = "duplicate"
+CATEGORY_END = "end"
+ITEM_FAILED = "failed"
+
+
+class MarketMemoryReader:
+    def __init__(self, p_id: Optional[int] = None, process=None):
+        """Reads the market values of the opened item from the memory of the client.
+
+        Args:
+            p_id (int, optional): The process id of the client. Defaults to the process named "client".
+            process (optional): A Process, or a stand-in like ReplayProcess, to read from instead. Defaults to None.
+        """
+        self.buy_details_reader: MemoryReader = MemoryReader(p_id=p_id, p_name="client", process=process)
+        self.sell_details_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
+        self.buy_offer_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
+        self.sell_offer_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
+        self.item_id_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
+        self.past_offers = 32
+        
+        # Values to determine if current memory belongs to the current item.
+        self.last_sell_times = [(0, 0) for i in range(self.past_offers)]
+        self.last_buy_times = [(0, 0) for i in range(self.past_offers)]
+        # The visible offers of the last read item, as BOOK_DTYPE rows. None if the last read failed.
+        self.last_order_book: Optional[np.ndarray] = None
+        self.last_expression = ""
+        self.last_id = 0
+        
+        self.has_finished_filtering = False
+
+        # Match all values against a single memory snapshot, using the known struct layouts.
+        self.snapshot_bootstrap = sys.platform.startswith("linux")
+
+        # The time the values are read at. Replays use the time of the capture instead.
+        self.clock: Callable[[], float] = time.time
+        self.capture: Optional[CaptureWriter] = None
+
+    def find_current_memory(self, buy_offer: int, sell_offer: int, max_buy_offer: int, max_sell_offer: int, item_id: int, statistics: Optional[List[int]] = None):
+        """Filters the readers with the current values. If all readers only have 1 value left, returns True.
+
+        Args:
+            buy_offer (int): The current 1st buy offer.
+            sell_offer (int): The current 1st sell offer.
+            avg_buy_offer (int): The current maximum buy offer.
+            avg_sell_offer (int): The current maximum sell offer.
+            item_id (int): The current item id.
+            statistics (List[int], optional): The values of the details tab, in the order they are displayed.
+                Used to constrain the details structs when bootstrapping from a snapshot. Defaults to None.
+        """
+        if self.snapshot_bootstrap:
+            self._filter_snapshot(buy_offer, sell_offer, max_buy_offer, max_sell_offer, item_id, statistics)
+        else:
+            self._filter_scalar(buy_offer, sell_offer, max_buy_offer, max_sell_offer, item_id)
+
+        if len(self.buy_offer_reader.addresses) == 1 and len(self.sell_offer_reader.addresses) == 1 and\
+            len(self.buy_details_reader.addresses) == 1 and len(self.sell_details_reader.addresses) == 1:
+            self._calculate_memory_locations()
+            self.has_finished_filtering = True
+
+    def _filter_scalar(self, buy_offer: int, sell_offer: int, max_buy_offer: int, max_sell_offer: int, item_id: int):
+        """Filters each reader on its own with a full memory search, followed by refinements on the found addresses.
+        """
+        if len(self.buy_offer_reader.addresses) != 1 and buy_offer >= 100:
+            self.buy_offer_reader.filter_value(0, ctypes.c_long(buy_offer))
+        if len(self.sell_offer_reader.addresses) != 1 and sell_offer >= 100:
+            self.sell_offer_reader.filter_value(0, ctypes.c_long(sell_offer))
+        if len(self.buy_details_reader.addresses) != 1 and max_buy_offer >= 100:
+            self.buy_details_reader.filter_value(0, ctypes.c_long(max_buy_offer))
+        if len(self.sell_details_reader.addresses) != 1 and max_sell_offer >= 100:
+            self.sell_details_reader.filter_value(0, ctypes.c_long(max_sell_offer))
+        if len(self.item_id_reader.addresses) != 1 and item_id >= 100:
+            self.item_id_reader.filter_value(0, ctypes.c_uint16(item_id))
+
+    @staticmethod
+    def _offer_pattern(offer: int) -> tuple:
+        """The memory_scan pattern of the 1st offer of an offer list. See _calculate_memory_locations for the layout.
+        """
+        now = int(time.time())
+        return (offer, 8, [
+            (-8, 1, 64000, 0), # Amount.
+            (-24, now - 86400, now + 31 * 86400, 0xFFFFFFFF), # Timestamp, only the lower 32 bits are used.
+        ])
+
+    @staticmethod
+    def _details_pattern(max_offer: int, transactions: Optional[int], min_offer: Optional[int]) -> tuple:
+        """The memory_scan pattern of the details of one side of the market. See _calculate_memory_locations for the layout.
+        The transactions and minimum offer are only constrained exactly if they are known.
+        """
+        return (max_offer, 8, [
+            (8, min_offer, min_offer, 0) if min_offer is not None else (8, 0, max_offer, 0), # Min offer.
+            (-16, transactions, transactions, 0) if transactions is not None else (-16, 0, 2 ** 62, 0), # Transactions.
+            (-8, 0, 2 ** 62, 0), # Total money.
+        ])
+
+    def _filter_snapshot(self, buy_offer: int, sell_offer: int, max_buy_offer: int, max_sell_offer: int, item_id: int, statistics: Optional[List[int]]):
+        """Filters all readers in a single pass over one memory snapshot.
+        Candidates have to match the whole struct around the value, which leaves far fewer of them than matching the value alone.
+        """
+        def statistic(index: int) -> Optional[int]:
+            return statistics[index] if statistics and len(statistics) > index else None
+
+        readers = {
+            "buy_offer_reader": (buy_offer, ctypes.c_long, lambda: self._offer_pattern(buy_offer)),
+            "sell_offer_reader": (sell_offer, ctypes.c_long, lambda: self._offer_pattern(sell_offer)),
+            "buy_details_reader": (max_buy_offer, ctypes.c_long, lambda: self._details_pattern(max_buy_offer, statistic(0), statistic(3))),
+            "sell_details_reader": (max_sell_offer, ctypes.c_long, lambda: self._details_pattern(max_sell_offer, statistic(4), statistic(7))),
+            "item_id_reader": (item_id, ctypes.c_uint16, lambda: (item_id, 2, [])),
+        }
+
+        patterns = {}
+        for name, (value, c_type, pattern) in readers.items():
+            if len(getattr(self, name).addresses) != 1 and value is not None and value >= 100:
+                patterns[name] = pattern()
+
+        if not patterns:
+            return
+
+        found = memory_scan.find_patterns(self.buy_details_reader.process.pid, patterns)
+
+        for name, addresses in found.items():
+            reader: MemoryReader = getattr(self, name)
+            reader.buffer = readers[name][1](readers[name][0])
+
+            # Keep the candidates of the previous reference items which still match.
+            # If none do, the struct moved or the previous values were misread, so start over with this snapshot.
+            remaining = sorted(set(reader.addresses) & set(addresses))
+            reader.addresses = remaining if remaining else addresses
+
+    def _calculate_memory_locations(self):
+        """Calculates the rest of the memory locations which depend on the already found ones.
+        
+        Memory addresses are predictable, but the bases need to be found first. Example:
+
+        Base: 0x155064b0 buy transactions (same arithmetic for sell)
+        +8 between transaction and total
+        0x155064b8 total money this month (divide by transactions for average)
+        +8 between total and max
+        0x155064c0 max buy
+        +8 between max and min
+        0x155064c8 min buy
+
+        It seems sell offers are NOT always on the same address!
+        At some point they switch to someplace else.
+        
+        Base: 0x19d88868 buy offer 1 (same arithmetic for sell)
+        -8 between offer and amount
+        0x19d88860 amount 1
+        -24 between offer and unix timestamp
+        0x19d88850 unix timestamp 1
+        +48 between offer 1 and 2
+        0x19d88898 buy offer 2
+        """
+        buy_offer_base = self.buy_offer_reader.addresses[0]
+        self.buy_offer_reader.addresses.append(buy_offer_base - 8) # Amount bought.
+        self.buy_offer_reader.addresses.append(buy_offer_base - 24) # Timestamp.
+        
+        sell_offer_base = self.sell_offer_reader.addresses[0]
+        self.sell_offer_reader.addresses.append(sell_offer_base - 8) # Amount sold.
+        self.sell_offer_reader.addresses.append(sell_offer_base - 24) # Timestamp.
+        
+        # Add more than 1st offers to memory reader.
+        for i in range(1, self.past_offers):
+            ith_buy_offer = [x + 48 * i for x in self.buy_offer_reader.addresses[:3]]
+            ith_sell_offer = [x + 48 * i for x in self.sell_offer_reader.addresses[:3]]
+            self.buy_offer_reader.addresses.extend(ith_buy_offer)
+            self.sell_offer_reader.addresses.extend(ith_sell_offer)
+            
+        buy_details_base = self.buy_details_reader.addresses[0] # Max buy offer.
+        self.buy_details_reader.addresses.append(buy_details_base + 8) # Min buy offer.
+        self.buy_details_reader.addresses.append(buy_details_base - 8) # Total money.
+        self.buy_details_reader.addresses.append(buy_details_base - 16) # Total bought.
+        
+        sell_details_base = self.sell_details_reader.addresses[0] # Max sell offer.
+        self.sell_details_reader.addresses.append(sell_details_base + 8) # Min sell offer.
+        self.sell_details_reader.addresses.append(sell_details_base - 8) # Total money.
+        self.sell_details_reader.addresses.append(sell_details_base - 16) # Total sold.
+        
+    def _client_fingerprint(self) -> str:
+        """Hashes the client binary, so cached memory layouts are discarded when the client is updated.
+        """
+        sha = hashlib.sha256()
+        with open(f"/proc/{self.buy_details_reader.process.pid}/exe", "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+
+        return sha.hexdigest()
+
+    def save_layout(self, location: str):
+        """Saves the found base addresses, relative to the memory region they were found in, together with a fingerprint of the client.
+
+        Args:
+            location (str): The file to save the layout to.
+        """
+        if not self.has_finished_filtering or not sys.platform.startswith("linux"):
+            return
+
+        try:
+            regions = memory_scan.list_scan_regions(self.buy_details_reader.process.pid)
+            bases = {
+                "buy_offer_reader": [self.buy_offer_reader.addresses[0]],
+                "sell_offer_reader": [self.sell_offer_reader.addresses[0]],
+                "buy_details_reader": [self.buy_details_reader.addresses[0]],
+                "sell_details_reader": [self.sell_details_reader.addresses[0]],
+                "item_id_reader": self.item_id_reader.addresses,
+            }
+
+            layout = {name: [memory_scan.locate_address(regions, address) for address in addresses] for name, addresses in bases.items()}
+            with open(location, "w") as f:
+                f.write(json.dumps({"fingerprint": self._client_fingerprint(), "layout": layout}))
+        except Exception as e:
+            print(f"Saving the memory layout failed: {e}")
+
+    def load_layout(self, location: str) -> bool:
+        """Restores the base addresses saved by save_layout, if they were saved for the same client binary.
+        The addresses still need to be verified with verify_layout.
+
+        Args:
+            location (str): The file the layout was saved to.
+
+        Returns:
+            bool: Whether a layout could be restored.
+        """
+        if not os.path.exists(location) or not sys.platform.startswith("linux"):
+            return False
+
+        try:
+            with open(location, "r") as f:
+                cache = json.loads(f.read())
+
+            if cache["fingerprint"] != self._client_fingerprint():
+                print("The client changed, discarding the cached memory layout.")
+                return False
+
+            # Every address is resolved before any reader is changed. A partly restored layout would survive the search,
+            # as readers with a single address are skipped by the snapshot bootstrap.
+            regions = memory_scan.list_scan_regions(self.buy_details_reader.process.pid)
+            resolved = {}
+            for name, locations in cache["layout"].items():
+                addresses = [memory_scan.resolve_address(regions, *location) if location else None for location in locations]
+                if not addresses or None in addresses:
+                    return False
+                resolved[name] = addresses
+
+            for name, addresses in resolved.items():
+                reader: MemoryReader = getattr(self, name)
+                reader.addresses = addresses
+                reader.buffer = ctypes.c_uint16(0) if name == "item_id_reader" else ctypes.c_long(0)
+        except Exception as e:
+            print(f"Loading the memory layout failed: {e}")
+            self.reset_filters()
+            return False
+
+        self._calculate_memory_locations()
+        self.has_finished_filtering = True
+        return True
+
+    def verify_layout(self, item_id: int) -> bool:
+        """Checks with a single read whether the current addresses hold the values of the item currently opened in the market.
+
+        Args:
+            item_id (int): The id of the item currently opened in the market.
+
+        Returns:
+            bool: Whether the addresses seem to be correct.
+        """
+        try:
+            item_ids = self.item_id_reader.read_values()[-3:]
+            max_bought, min_bought, _, amount_bought = self.buy_details_reader.read_values()
+            buy_offer = self.buy_offer_reader.read_values()[0]
+            sell_offer = self.sell_offer_reader.read_values()[0]
+        except Exception:
+            return False
+
+        return item_id in item_ids and 0 <= min_bought <= max_bought and amount_bought >= 0 and buy_offer > 0 and sell_offer > 0
+
+    def reset_filters(self):
+        """Resets all readers, so the memory addresses have to be found anew.
+        """
+        metrics.increment("address_resets")
+        self.sell_offer_reader.reset_filter()
+        self.buy_offer_reader.reset_filter()
+        self.sell_details_reader.reset_filter()
+        self.buy_details_reader.reset_filter()
+        self.item_id_reader.reset_filter()
+        self.has_finished_filtering = False
+        self.last_id = 0
+        self.last_expression = ""
+
+    def read_fingerprint(self) -> Tuple[tuple, tuple, tuple]:
+        """Reads the item id, details and offer blocks, which change whenever a new item is loaded.
+        Cheap enough to be polled, as every block is read with a single coalesced read.
+
+        Returns:
+            Tuple[tuple, tuple, tuple]: The item id, details and offer values. The id changes as soon as an item is selected,
+                the details and offers only once the server sent them.
+        """
+        return tuple(self.item_id_reader.read_values()),\
+            tuple(self.buy_details_reader.read_values()) + tuple(self.sell_details_reader.read_values()),\
+            tuple(self.buy_offer_reader.read_values()) + tuple(self.sell_offer_reader.read_values())
+
+    def _readers(self) -> Dict[str, MemoryReader]:
+        return {"buy_offer_reader": self.buy_offer_reader, "sell_offer_reader": self.sell_offer_reader, "buy_details_reader": self.buy_details_reader,
+                "sell_details_reader": self.sell_details_reader, "item_id_reader": self.item_id_reader}
+
+    def _layout(self) -> Dict[str, dict]:
+        """The addresses and buffer types of all readers, as written to captures.
+        """
+        return {name: {"addresses": reader.addresses, "type": type(reader.buffer)._type_ if reader.buffer is not None else None}
+                for name, reader in self._readers().items()}
+
+    def _apply_layout(self, layout: Dict[str, dict]):
+        for name, reader in self._readers().items():
+            reader.addresses = list(layout[name]["addresses"])
+            reader.buffer = ctypes.c_uint16(0) if layout[name]["type"] == ctypes.c_uint16._type_ else ctypes.c_long(0)
+
+        self.has_finished_filtering = True
+
+    def start_recording(self, location: str):
+        """Records the raw reads of every item read with get_current_market_values into a capture file, to be replayed with ReplayMarketReader.
+        """
+        self.capture = CaptureWriter(location)
+        process = RecordingProcess(self.buy_details_reader.process, self.capture)
+        for reader in self._readers().values():
+            reader.process = process
+
+    def stop_recording(self):
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+
+            process = self.buy_details_reader.process.process
+            for reader in self._readers().values():
+                reader.process = process
+
+    def get_current_market_values(self, name: str, throw_on_duplicate: bool = False) -> MarketValues:
+        """Reads the current market data from memory and creates a MarketValues object with it.
+
+        Args:
+            name (str): The name of the current item. Used to fill MarketValues name.
+
+        Returns:
+            MarketValues: The MarketValues for the current item.
+        """
+        if not self.capture:
+            return self._read_market_values(name, throw_on_duplicate)
+
+        self.capture.begin_frame(self.clock(), self._layout())
+        try:
+            return self._read_market_values(name, throw_on_duplicate)
+        finally:
+            self.capture.end_frame()
+
+    def read_crawled_item(self, last_item_id: int) -> Tuple[MarketValues, int, str]:
+        """Reads the item the crawler just selected, and decides what to do with it.
+
+        Args:
+            last_item_id (int): The id of the last accepted item of the category.
+
+        Returns:
+            Tuple[MarketValues, int, str]: The values, the item id, and ITEM_READ if the item should be kept,
+                ITEM_DUPLICATE if the memory still held the previous item, or CATEGORY_END if the category ended.
+
+        Raises:
+            Exception: If the values couldn't be read, e.g. because the memory addresses changed.
+        """
+        values, id, was_duplicate = self.get_current_market_values("Unknown")
+
+        # If the id is the same as the last one, we have reached the end of the category.
+        if id == last_item_id:
+            return values, id, CATEGORY_END
+
+        # Items without transactions often have the same values as the previous item. Tibia coins always look the same.
+        if was_duplicate and (values.month_sell_offer + values.month_buy_offer != 0) and id != 22118:
+            return values, id, ITEM_DUPLICATE
+
+        return values, id, ITEM_READ
+
+    def _read_market_values(self, name: str, throw_on_duplicate: bool) -> MarketValues:
+        self.last_order_book = None
+        max_bought, min_bought, total_bought_gold, amount_bought = self.buy_details_reader.read_values()
+        average_bought = (total_bought_gold // amount_bought) if amount_bought > 0 else 0
+        max_sold, min_sold, total_sold_gold, amount_sold = self.sell_details_reader.read_values()
+        average_sold = (total_sold_gold // amount_sold) if amount_sold > 0 else 0
+        item_ids = self.item_id_reader.read_values()[-3:]
+        print(item_ids)
+
+        # Get the most commonly occuring id in item_ids.
+        item_id = max(set(item_ids), key=item_ids.count)
+
+        # Each offer block is read once, with coalesced reads, and reused for both the duplicate check and the values.
+        buy_offer_values = self.buy_offer_reader.read_values()
+        sell_offer_values = self.sell_offer_reader.read_values()
+
+        was_duplicate = False
+        
+        current_expression = f"{max_bought},{min_bought},{total_bought_gold},{amount_bought},{average_bought}" +\
+                             f"{max_sold},{min_sold},{total_sold_gold},{amount_sold},{average_sold}" +\
+                             ",".join([str(x) for x in buy_offer_values]) +\
+                             ",".join([str(x) for x in sell_offer_values])
+        
+        # Check if this memory is a duplicate of the last item. If so, probably nonexistent item.
+        if current_expression == self.last_expression:
+            metrics.increment("duplicate_reads")
+            if throw_on_duplicate:
+                raise Exception("The current memory is a duplicate of the previous item.")
+            else:
+                print("The current memory is a duplicate of the previous item.")
+                was_duplicate = True
+        
+        self.last_expression = current_expression
+        
+        now_timestamp = (datetime.fromtimestamp(self.clock()) + timedelta(30)).timestamp()
+        
+        buy_offer, buy_amount, buy_timestamp = buy_offer_values[:3]
+        sell_offer, sell_amount, sell_timestamp = sell_offer_values[:3]
+
+        # Timestamps are read as 64 bit, but only the last 32 bits are used.
+        sell_timestamp = sell_timestamp & 0xFFFFFFFF
+        buy_timestamp = buy_timestamp & 0xFFFFFFFF
+        
+        if not name.lower() == "golden helmet" and\
+             sell_offer <= 0 or sell_offer > 8000000000 or \
+             buy_offer <= 0 or buy_offer > 8000000000 or \
+                (not was_duplicate and self.last_id == item_id) or \
+            len(set(item_ids)) > 2:
+            #buy_timestamp > now_timestamp or sell_timestamp > now_timestamp or \
+            #buy_timestamp < current_timestamp or sell_timestamp < current_timestamp:
+            # Probably the address changed.
+            self.reset_filters()
+            raise Exception(f"The memory address might have changed: {item_id=},{buy_offer=},{sell_offer=},{buy_timestamp=},{sell_timestamp=}")
+
+        # If the item id is not the same as the last one, but the timestamp is the same as the last one, then the values aren't theirs.
+        if buy_timestamp == self.last_buy_times[0][0] and item_id != self.last_buy_times[0][1]:
+            buy_offer = buy_amount = buy_timestamp = -1
+        if sell_timestamp == self.last_sell_times[0][0] and item_id != self.last_sell_times[0][1]:
+            sell_offer = sell_amount = sell_timestamp = -1
+            
+        offers_within_24h = [0, 0]
+        book = []
+        
+        for i in range(self.past_offers):
+            b_, b__, buy_timestamp = buy_offer_values[i * 3 : (i + 1) * 3]
+            s_, s__, sell_timestamp = sell_offer_values[i * 3 : (i + 1) * 3]
+
+            # timestamp is read as a long, but it is a 32 bit int. So we need to trim it.
+            sell_timestamp = sell_timestamp & 0xFFFFFFFF
+            buy_timestamp = buy_timestamp & 0xFFFFFFFF
+            
+            if buy_timestamp != self.last_buy_times[i][0] or item_id == self.last_buy_times[i][1]:
+                self.last_buy_times[i] = (buy_timestamp, item_id)
+                if now_timestamp > buy_timestamp and (now_timestamp - buy_timestamp) < 86400:
+                    offers_within_24h[0] += 1
+                if 0 < b_ <= 8000000000:
+                    book.append((BUY, b_, b__ & 0xFFFFFFFF, buy_timestamp))
+
+            if sell_timestamp != self.last_sell_times[i][0] or item_id == self.last_sell_times[i][1]:
+                self.last_sell_times[i] = (sell_timestamp, item_id)
+                if now_timestamp > sell_timestamp and (now_timestamp - sell_timestamp) < 86400:
+                    offers_within_24h[1] += 1
+                if 0 < s_ <= 8000000000:
+                    book.append((SELL, s_, s__ & 0xFFFFFFFF, sell_timestamp))
+
+        self.last_id = item_id
+        self.last_order_book = np.array(book, dtype=BOOK_DTYPE)
+
+        print(f"Finished reading memory: {item_id=}, {buy_offer=}, {sell_offer=}, {average_bought=}, {average_sold=}, {amount_bought=}, {amount_sold=}, {max_bought=}, {min_sold=}, {offers_within_24h=}")
+        return MarketValues(name, self.clock(), sell_offer, buy_offer, average_sold, average_bought, amount_sold, amount_bought, max_sold, min_bought, max(offers_within_24h)), item_id, was_duplicate
+
+
+class ReplayMarketReader(MarketMemoryReader):
+    def __init__(self, location: str):
+        """A MarketMemoryReader which reads from a capture recorded with start_recording instead of a client.
+        Every frame of the capture is one call to get_current_market_values, in the recorded order.
+
+        Args:
+            location (str): The capture file.
+        """
+        self.replay_process = ReplayProcess()
+        super().__init__(process=self.replay_process)
+        self.location = location
+        self.layout = None
+
+    def frames(self) -> Generator[CaptureFrame, None, None]:
+        """Loads the frames one after another. Read the item of each frame before advancing.
+        """
+        for kind, record in read_capture(self.location):
+            if kind == LAYOUT_RECORD:
+                self.layout = record
+                self._apply_layout(record)
+                continue
+
+            # The addresses were reset after a failed read, and found again by the client.
+            if not self.has_finished_filtering and self.layout:
+                self._apply_layout(self.layout)
+
+            self.replay_process.frame = record
+            self.clock = lambda: record.time
+            yield record
+
+    def crawl(self) -> Generator[Tuple[Optional[MarketValues], int, str], None, None]:
+        """Replays the frames through read_crawled_item, keeping track of the last item like crawl_market does.
+
+        Returns:
+            Generator[Tuple[Optional[MarketValues], int, str], None, None]: The result of read_crawled_item for every frame,
+                or (None, -1, ITEM_FAILED) if the read raised.
+        """
+        last_item_id = -1
+        fail_count = 0
+
+        for _ in self.frames():
+            try:
+                values, id, status = self.read_crawled_item(last_item_id)
+            except Exception as e:
+                print(f"Replayed read failed: {e}")
+                fail_count += 1
+                # crawl_market reopens the market after 10 failures in a row, which starts the category over.
+                if fail_count >= 10:
+                    last_item_id, fail_count = -1, 0
+                yield None, -1, ITEM_FAILED
+                continue
+
+            if status == ITEM_READ:
+                fail_count = 0
+                last_item_id = id
+            elif status == CATEGORY_END:
+                last_item_id = -1
+            else:
+                fail_count += 1
+
+            yield values, id, status
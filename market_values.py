@@ -0,0 +1,238 @@
+from history_store import HISTORY_DTYPE
+from typing import *
+import numpy as np
+
+
+# One row of a fullscan. The derived values are computed by MarketBatch.compute_profits.
+MARKET_DTYPE = np.dtype([
+    ("name", "U64"),
+    ("time", "<f8"),
+    ("sell_offer", "<i8"),
+    ("buy_offer", "<i8"),
+    ("month_sell_offer", "<i8"),
+    ("month_buy_offer", "<i8"),
+    ("sold", "<i8"),
+    ("bought", "<i8"),
+    ("profit", "<i8"),
+    ("rel_profit", "<f8"),
+    ("potential_profit", "<i8"),
+    ("active_traders", "<i8"),
+])
+
+FULLSCAN_HEADER = "Name,SellPrice,BuyPrice,AvgSellPrice,AvgBuyPrice,Sold,Bought,Profit,RelProfit,PotProfit,ActiveTraders"
+
+
+def market_fee(offer: np.ndarray) -> np.ndarray:
+    """The market fee of offers: 2% of the offer value, at most 250000gp.
+    """
+    return np.minimum((np.asarray(offer) * 0.02).astype(np.int64), 250000)
+
+
+def fee_adjusted_profit(sell_offer: np.ndarray, buy_offer: np.ndarray, sold: np.ndarray, bought: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Computes profit, relative profit and potential profit like MarketValues, for whole arrays at once.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The profit, relative profit and potential profit.
+    """
+    sell_offer, buy_offer = np.asarray(sell_offer, dtype=np.int64), np.asarray(buy_offer, dtype=np.int64)
+
+    profit = sell_offer - buy_offer - (market_fee(buy_offer) + market_fee(sell_offer))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel_profit = np.where(buy_offer > 0, np.round(profit / np.where(buy_offer > 0, buy_offer, 1), 2), 0)
+    potential_profit = profit * np.minimum(sold, bought)
+
+    return profit, rel_profit, potential_profit
+
+
+class MarketValues:
+    __slots__ = ("buy_offer", "sell_offer", "month_sell_offer", "month_buy_offer", "sold", "bought", "time",
+                 "profit", "rel_profit", "potential_profit", "active_traders", "name")
+
+    def __init__(self, name: str, time: float, sell_offer: int, buy_offer: int, month_sell_offer: int, month_buy_offer: int, sold: int, bought: int, highest_sell: int, lowest_buy: int, approx_offers: int):
+        self.buy_offer: int = max(buy_offer, lowest_buy)
+        self.sell_offer: int = max(min(sell_offer, highest_sell), self.buy_offer) if sold > 0 else sell_offer
+        self.month_sell_offer: int = month_sell_offer
+        self.month_buy_offer: int = month_buy_offer
+        self.sold: int = sold
+        self.bought: int = bought
+        self.time: float = time
+
+        self.profit: int = self.sell_offer - self.buy_offer
+        # Subtract 2% of the offer values, or a maximum of 250000gp, from the profit due to market fees.
+        self.profit -= (min(int(self.buy_offer * 0.02), 250000) + min(int(self.sell_offer * 0.02), 250000))
+        self.rel_profit: float = round(self.profit / self.buy_offer, 2) if self.buy_offer > 0 else 0
+        self.potential_profit: int = self.profit * min(sold, bought)
+        self.active_traders: int = approx_offers
+        self.name = name
+
+    def __str__(self) -> str:
+        return f"{self.name.lower()},{self.sell_offer},{self.buy_offer},{self.month_sell_offer},{self.month_buy_offer},{self.sold},{self.bought},{self.profit},{self.rel_profit},{self.potential_profit},{self.active_traders}"
+
+    def history_string(self) -> str:
+        """Returns the relevant historic values of the object as a string, separated by commas.
+        This includes the sell offer, buy offer, sold, bought and approx offers values, followed by the time of the data.
+
+        Returns:
+            str: A string containing all the values of the object, separated by commas.
+        """
+        return f"{self.sell_offer},{self.buy_offer},{self.sold},{self.bought},{self.active_traders},{self.time}"
+
+    @staticmethod
+    def from_row(row: np.void) -> "MarketValues":
+        """Creates MarketValues from a row of a MarketBatch, without recomputing the derived values.
+        """
+        values = MarketValues.__new__(MarketValues)
+        for field in MARKET_DTYPE.names:
+            setattr(values, field, row[field].item())
+
+        return values
+
+
+class MarketBatch:
+    def __init__(self, capacity: int = 1024):
+        """Many MarketValues, stored in a single structured array instead of one Python object each.
+
+        Args:
+            capacity (int, optional): The initial amount of rows to allocate. Defaults to 1024.
+        """
+        self._rows = np.zeros(capacity, dtype=MARKET_DTYPE)
+        self._size = 0
+
+    @property
+    def rows(self) -> np.ndarray:
+        """The filled rows, as a view of the structured array.
+        """
+        return self._rows[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> MarketValues:
+        return MarketValues.from_row(self.rows[index])
+
+    def __iter__(self) -> Iterator[MarketValues]:
+        return (self[i] for i in range(self._size))
+
+    def _reserve(self, size: int):
+        if size > len(self._rows):
+            grown = np.zeros(max(size, 2 * len(self._rows)), dtype=MARKET_DTYPE)
+            grown[:self._size] = self.rows
+            self._rows = grown
+
+    def extend_rows(self, rows: np.ndarray):
+        """Appends rows of MARKET_DTYPE.
+        """
+        self._reserve(self._size + len(rows))
+        self._rows[self._size:self._size + len(rows)] = rows
+        self._size += len(rows)
+
+    def clear(self):
+        """Removes all rows, keeping the allocated capacity.
+        """
+        self._size = 0
+
+    def append(self, values: MarketValues):
+        """Appends the values of a single item.
+        """
+        self._reserve(self._size + 1)
+        self._rows[self._size] = tuple(getattr(values, field) for field in MARKET_DTYPE.names)
+        self._size += 1
+
+    @staticmethod
+    def from_raw(name: np.ndarray, time: np.ndarray, sell_offer: np.ndarray, buy_offer: np.ndarray, month_sell_offer: np.ndarray,
+                 month_buy_offer: np.ndarray, sold: np.ndarray, bought: np.ndarray, highest_sell: np.ndarray, lowest_buy: np.ndarray,
+                 approx_offers: np.ndarray) -> "MarketBatch":
+        """Creates a batch from raw market values, with the same adjustments as MarketValues.__init__, for all rows at once.
+        """
+        batch = MarketBatch(len(name))
+        rows = np.zeros(len(name), dtype=MARKET_DTYPE)
+
+        rows["name"] = name
+        rows["time"] = time
+        rows["buy_offer"] = np.maximum(buy_offer, lowest_buy)
+        rows["sell_offer"] = np.where(np.asarray(sold) > 0, np.maximum(np.minimum(sell_offer, highest_sell), rows["buy_offer"]), sell_offer)
+        rows["month_sell_offer"] = month_sell_offer
+        rows["month_buy_offer"] = month_buy_offer
+        rows["sold"] = sold
+        rows["bought"] = bought
+        rows["active_traders"] = approx_offers
+
+        batch.extend_rows(rows)
+        batch.compute_profits()
+        return batch
+
+    def compute_profits(self):
+        """Computes profit, rel_profit and potential_profit of all rows in one vectorized pass.
+        """
+        rows = self.rows
+        rows["profit"], rows["rel_profit"], rows["potential_profit"] = fee_adjusted_profit(rows["sell_offer"], rows["buy_offer"], rows["sold"], rows["bought"])
+
+    def to_csv(self, f: TextIO, header: bool = True):
+        """Writes the rows in the format of fullscan.csv.
+        """
+        rows = self.rows
+        if header:
+            f.write(FULLSCAN_HEADER + "\n")
+
+        columns = [np.char.lower(rows["name"])] + [rows[field].astype(str) for field in MARKET_DTYPE.names[2:]]
+        # rel_profit is written like MarketValues writes it, 0 for items without a buy offer.
+        columns[MARKET_DTYPE.names.index("rel_profit") - 1] = np.where(rows["buy_offer"] > 0, rows["rel_profit"].astype(str), "0")
+
+        lines = columns[0]
+        for column in columns[1:]:
+            lines = np.char.add(np.char.add(lines, ","), column)
+
+        if len(lines) > 0:
+            f.write("\n".join(lines.tolist()) + "\n")
+
+    @staticmethod
+    def read_csv(f: TextIO, time: float = 0) -> "MarketBatch":
+        """Reads rows in the format of fullscan.csv. The file has no scan times, all rows get the given time.
+        Malformed lines are skipped.
+        """
+        fields = [field for field in MARKET_DTYPE.names if field != "time"]
+        rows = []
+        for line in f:
+            values = line.strip().split(",")
+            if len(values) != len(fields) or values[0] == "Name":
+                continue
+
+            try:
+                rows.append((values[0], time, *[float(value) if field == "rel_profit" else int(value) for field, value in zip(fields[1:], values[1:])]))
+            except ValueError:
+                print(f"Skipping malformed fullscan line: {line.strip()}")
+
+        batch = MarketBatch(max(len(rows), 1))
+        batch.extend_rows(np.array(rows, dtype=MARKET_DTYPE))
+        return batch
+
+    def history_rows(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """Yields the history rows of every item in the batch, ready for HistoryStore.extend.
+        """
+        rows = self.rows
+        names = np.char.lower(rows["name"])
+        # Sort once by name, stable so the rows of an item stay in order, and slice the groups.
+        order = np.argsort(names, kind="stable")
+        unique_names, starts = np.unique(names[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        history = np.zeros(len(rows), dtype=HISTORY_DTYPE)
+        for field in HISTORY_DTYPE.names:
+            history[field] = rows[field][order]
+
+        for name, start, end in zip(unique_names.tolist(), starts, ends):
+            yield name, history[start:end]
+
+    def save(self, location: str):
+        """Saves the rows in NumPy's binary format.
+        """
+        np.save(location, self.rows)
+
+    @staticmethod
+    def load(location: str) -> "MarketBatch":
+        """Loads rows saved with save.
+        """
+        rows = np.load(location)
+        batch = MarketBatch(len(rows))
+        batch.extend_rows(rows)
+        return batch
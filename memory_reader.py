@@ -1,8 +1,17 @@
 from mem_edit import Process
+import memory_scan
 import ctypes
+import struct
+import sys
 from typing import *
 
 
+# Addresses closer than this are read together with a single read, even if the bytes in between are unused.
+MAX_SPAN_GAP = 4096
+# Upper bound on the size of a single coalesced read.
+MAX_SPAN_SIZE = 65536
+
+
 class MemoryReader:
     def __init__(self, p_id: int = None, p_name: str = None, process: Process = None) -> None:
         """Initialises a MemoryReader, used to find the memory address of a specific value, and read it henceforth.
@@ -24,6 +33,10 @@ class MemoryReader:
             self.process = process
         self.addresses = []
         self.buffer = None
+
+        # Cached read plan of the coalesced reads, rebuilt when the addresses or buffer type change.
+        self._span_key = None
+        self._spans = []
     
     @staticmethod
     def _value_to_ctype(value: Union[int, str, float]):
@@ -62,6 +75,8 @@ class MemoryReader:
         
         if self.addresses:
             self.addresses = self.process.search_addresses(self.addresses, self.buffer)
+        elif sys.platform.startswith("linux"):
+            self.addresses = memory_scan.search_all_memory(self.process.pid, self.buffer)
         else:
             self.addresses = self.process.search_all_memory(self.buffer)
         
@@ -82,6 +97,9 @@ class MemoryReader:
         Returns:
             List[Union[int, str, float]]: A list with the address values.
         """
+        if not type(self.buffer).__name__.startswith("c_char_Array"):
+            return self._read_coalesced_values()
+
         values = []
         
         for address in self.addresses:
@@ -115,6 +133,57 @@ class MemoryReader:
             values.append(self.buffer.value)
         
         return values
+
+    def _plan_spans(self):
+        """Groups the addresses into contiguous spans which can each be read with a single read_memory call.
+        Every span gets its own reusable buffer, and remembers which values it holds at which offset.
+        """
+        value_size = ctypes.sizeof(self.buffer)
+        self._value_struct = struct.Struct("@" + type(self.buffer)._type_)
+        self._spans = []
+
+        # (start, end, buffer, [(value index, offset in span), ...])
+        span_start, span_end, members = None, None, []
+        for index, address in sorted(enumerate(self.addresses), key=lambda x: x[1]):
+            if span_start is not None and address - span_end <= MAX_SPAN_GAP and address + value_size - span_start <= MAX_SPAN_SIZE:
+                span_end = max(span_end, address + value_size)
+            else:
+                if span_start is not None:
+                    self._spans.append((span_start, span_end, (ctypes.c_char * (span_end - span_start))(), members))
+                span_start, span_end, members = address, address + value_size, []
+
+            members.append((index, address - span_start))
+
+        if span_start is not None:
+            self._spans.append((span_start, span_end, (ctypes.c_char * (span_end - span_start))(), members))
+
+        self._span_key = (tuple(self.addresses), type(self.buffer))
+
+    def _read_coalesced_values(self) -> List[Union[int, float]]:
+        """Reads the values at self.addresses with as few read_memory calls as possible.
+
+        Returns:
+            List[Union[int, float]]: A list with the address values, in the order of self.addresses.
+        """
+        if self._span_key != (tuple(self.addresses), type(self.buffer)):
+            self._plan_spans()
+
+        values = [None] * len(self.addresses)
+
+        for start, end, span_buffer, members in self._spans:
+            try:
+                self.process.read_memory(start, span_buffer)
+            except OSError:
+                # Part of the span is not mapped, read the values one by one instead.
+                for index, offset in members:
+                    self.process.read_memory(start + offset, self.buffer)
+                    values[index] = self.buffer.value
+                continue
+
+            for index, offset in members:
+                values[index] = self._value_struct.unpack_from(span_buffer, offset)[0]
+
+        return values
     
     def write_values(self, value: Union[int, str, float]) -> Dict[int, Union[int, str, float]]:
         """Writes the value to all currently saved addresses.
@@ -0,0 +1,269 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import ctypes
+import os
+from typing import *
+
+
+# Regions are split into work items of at most this size, so big heaps are spread over all workers.
+SCAN_CHUNK_SIZE = 16 * 1024 * 1024
+
+_pool: ProcessPoolExecutor = None
+
+
+def list_scan_regions(pid: int) -> List[Tuple[int, int]]:
+    """Lists the memory regions of the process which are worth scanning for market values.
+    Only readable and writable regions that aren't backed by a file are returned, i.e. the heap and anonymous mappings.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        List[Tuple[int, int]]: The (start, stop) addresses of the regions.
+    """
+    regions = []
+    with open(f"/proc/{pid}/maps", "r") as maps:
+        for line in maps:
+            fields = line.split()
+            bounds, privileges = fields[0:2]
+            path = fields[5] if len(fields) > 5 else ""
+
+            if "r" not in privileges or "w" not in privileges:
+                continue
+
+            # Skip file-backed mappings and special kernel regions, but keep the heap.
+            if path and path != "[heap]":
+                continue
+
+            start, stop = (int(bound, 16) for bound in bounds.split("-"))
+            regions.append((start, stop))
+
+    return regions
+
+
+def _split_regions(regions: List[Tuple[int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Splits the regions into work items of at most SCAN_CHUNK_SIZE bytes.
+
+    Returns:
+        List[Tuple[int, int, int, int]]: (region start, region stop, chunk start, chunk stop) per work item.
+    """
+    work = []
+    for start, stop in regions:
+        for chunk_start in range(start, stop, SCAN_CHUNK_SIZE):
+            work.append((start, stop, chunk_start, min(chunk_start + SCAN_CHUNK_SIZE, stop)))
+
+    return work
+
+
+def _read_chunk(pid: int, region_start: int, region_stop: int, chunk_start: int, chunk_stop: int, margin: int) -> Tuple[int, np.ndarray]:
+    """Reads a work item plus margin bytes on both sides, as far as the region allows.
+    The margin allows matches close to the chunk borders to be compared against their surroundings.
+
+    Returns:
+        Tuple[int, np.ndarray]: The address of the first byte read, and the bytes as a uint8 array.
+    """
+    start = max(region_start, chunk_start - margin)
+    stop = min(region_stop, chunk_stop + margin)
+
+    data = bytearray(stop - start)
+    with open(f"/proc/{pid}/mem", "rb") as mem:
+        mem.seek(start)
+        mem.readinto(data)
+
+    return start, np.frombuffer(data, dtype=np.uint8)
+
+
+def find_needle(data: np.ndarray, needle: bytes, alignment: int) -> np.ndarray:
+    """Finds all aligned occurences of needle in data with vectorized comparisons.
+
+    Args:
+        data (np.ndarray): The memory to search, as a uint8 array.
+        needle (bytes): The bytes to search for.
+        alignment (int): Only offsets which are a multiple of this are considered.
+
+    Returns:
+        np.ndarray: The offsets of the matches in data.
+    """
+    size = len(needle)
+
+    # Fast path for naturally aligned integers: compare the whole region as an array of that integer type.
+    if size in (1, 2, 4, 8) and alignment == size:
+        dtype = np.dtype(f"<u{size}")
+        usable = len(data) - len(data) % size
+        values = data[:usable].view(dtype)
+        return np.flatnonzero(values == np.frombuffer(needle, dtype=dtype)[0]) * size
+
+    # Otherwise narrow down the candidate offsets byte by byte.
+    needle = np.frombuffer(needle, dtype=np.uint8)
+    candidates = np.arange(0, len(data) - size + 1, alignment)
+    for i in range(size):
+        candidates = candidates[data[candidates + i] == needle[i]]
+        if len(candidates) == 0:
+            break
+
+    return candidates
+
+
+def match_pattern(data: np.ndarray, pattern: Tuple[int, int, List[Tuple[int, int, int, int]]]) -> np.ndarray:
+    """Finds all aligned occurences of a value whose surroundings match the given constraints, with vectorized comparisons.
+
+    A pattern is (value, size, constraints), where value is searched as a little endian integer of size bytes.
+    Each constraint is (offset, low, high, mask). The integer of the same size at offset bytes from the match,
+    ANDed with mask if mask isn't 0, has to lie within [low, high]. Offsets have to be multiples of size.
+
+    Args:
+        data (np.ndarray): The memory to search, as a uint8 array starting at an address aligned to size.
+        pattern (Tuple[int, int, List[Tuple[int, int, int, int]]]): The pattern to search for.
+
+    Returns:
+        np.ndarray: The offsets of the matches in data.
+    """
+    value, size, constraints = pattern
+    dtype = np.dtype(f"<i{size}") if size == 8 else np.dtype(f"<u{size}")
+
+    words = data[:len(data) - len(data) % size].view(dtype)
+    indices = np.flatnonzero(words == value)
+
+    for offset, low, high, mask in constraints:
+        neighbours = indices + offset // size
+        inside = (neighbours >= 0) & (neighbours < len(words))
+        indices, neighbours = indices[inside], neighbours[inside]
+
+        neighbour_values = words[neighbours]
+        if mask:
+            neighbour_values = neighbour_values & mask
+        indices = indices[(neighbour_values >= low) & (neighbour_values <= high)]
+
+    return indices * size
+
+
+def _scan_chunk(pid: int, region_start: int, region_stop: int, chunk_start: int, chunk_stop: int, needle: bytes, alignment: int) -> List[int]:
+    """Reads a work item of the process memory and returns the addresses of all matches. Runs in a worker process.
+    """
+    try:
+        # Read a few extra bytes, so matches crossing the end of the chunk are found.
+        start, data = _read_chunk(pid, region_start, region_stop, chunk_start, chunk_stop + len(needle) - 1, 0)
+    except OSError:
+        # The region may have been unmapped since listing it.
+        return []
+
+    return (find_needle(data, needle, alignment) + start).tolist()
+
+
+def _scan_chunk_patterns(pid: int, region_start: int, region_stop: int, chunk_start: int, chunk_stop: int, patterns: Dict[str, tuple], margin: int) -> Dict[str, List[int]]:
+    """Reads a work item of the process memory once, and matches all patterns against it. Runs in a worker process.
+    """
+    try:
+        start, data = _read_chunk(pid, region_start, region_stop, chunk_start, chunk_stop, margin)
+    except OSError:
+        return {name: [] for name in patterns}
+
+    found = {}
+    for name, pattern in patterns.items():
+        addresses = match_pattern(data, pattern) + start
+        found[name] = addresses[(addresses >= chunk_start) & (addresses < chunk_stop)].tolist()
+
+    return found
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+    return _pool
+
+
+def search_all_memory(pid: int, needle_buffer, alignment: Optional[int] = None, parallel: bool = True) -> List[int]:
+    """Searches the heap and anonymous regions of the process for the value, spread over a pool of worker processes.
+    Reading another process' memory needs ptrace permissions, which the workers have when running as root.
+
+    Args:
+        pid (int): The process id.
+        needle_buffer (_type_): The ctypes object to search for.
+        alignment (int, optional): The alignment of matches. Defaults to the natural alignment of the ctypes type.
+        parallel (bool, optional): Whether to use the worker pool, or scan in this process. Defaults to True.
+
+    Returns:
+        List[int]: The sorted addresses where the value was found.
+    """
+    needle = bytes(needle_buffer)
+    if alignment is None:
+        alignment = ctypes.alignment(needle_buffer)
+
+    work = _split_regions(list_scan_regions(pid))
+    arguments = [(pid, *item, needle, alignment) for item in work]
+
+    if parallel and len(work) > 1:
+        results = _get_pool().map(_scan_chunk, *zip(*arguments))
+    else:
+        results = [_scan_chunk(*item) for item in arguments]
+
+    return sorted(address for addresses in results for address in addresses)
+
+
+def find_patterns(pid: int, patterns: Dict[str, tuple], parallel: bool = True) -> Dict[str, List[int]]:
+    """Takes a single snapshot of the heap and anonymous regions of the process, and matches all patterns against it.
+    See match_pattern for the format of the patterns.
+
+    Args:
+        pid (int): The process id.
+        patterns (Dict[str, tuple]): The patterns to search for, by name.
+        parallel (bool, optional): Whether to use the worker pool, or scan in this process. Defaults to True.
+
+    Returns:
+        Dict[str, List[int]]: The sorted addresses where each pattern was found, by name.
+    """
+    # Keep the reads 8 byte aligned, so patterns of all sizes can view the data as integers.
+    margin = max([abs(constraint[0]) for pattern in patterns.values() for constraint in pattern[2]] + [0])
+    margin = (margin + 7) // 8 * 8
+    work = _split_regions(list_scan_regions(pid))
+    arguments = [(pid, *item, patterns, margin) for item in work]
+
+    if parallel and len(work) > 1:
+        results = _get_pool().map(_scan_chunk_patterns, *zip(*arguments))
+    else:
+        results = [_scan_chunk_patterns(*item) for item in arguments]
+
+    found = {name: [] for name in patterns}
+    for result in results:
+        for name, addresses in result.items():
+            found[name].extend(addresses)
+
+    return {name: sorted(addresses) for name, addresses in found.items()}
+
+
+def locate_address(regions: List[Tuple[int, int]], address: int) -> Optional[Tuple[int, int, int]]:
+    """Describes an address relative to the region containing it, so it can be found again after the regions moved.
+
+    Args:
+        regions (List[Tuple[int, int]]): The regions, as returned by list_scan_regions.
+        address (int): The address to describe.
+
+    Returns:
+        Optional[Tuple[int, int, int]]: The index of the region, its size and the offset of the address within it.
+            None if no region contains the address.
+    """
+    for index, (start, stop) in enumerate(regions):
+        if start <= address < stop:
+            return index, stop - start, address - start
+
+    return None
+
+
+def resolve_address(regions: List[Tuple[int, int]], index: int, size: int, offset: int) -> Optional[int]:
+    """Finds the address described by locate_address in the current regions.
+    The region has to have the same index and size as when the address was located.
+
+    Returns:
+        Optional[int]: The address, or None if no matching region exists.
+    """
+    if index >= len(regions):
+        return None
+
+    start, stop = regions[index]
+    if stop - start != size:
+        return None
+
+    return start + offset
@@ -0,0 +1,192 @@
+from multiprocessing.connection import Connection
+from typing import *
+import multiprocessing
+import random
+import ctypes
+import struct
+import mmap
+import time
+
+
+# Offsets of the structs within the layout. The offsets of the values within the structs
+# are the ones described in MarketMemoryReader._calculate_memory_locations.
+BUY_OFFERS_OFFSET = 0x1000
+SELL_OFFERS_OFFSET = 0x3000
+BUY_DETAILS_OFFSET = 0x5010
+SELL_DETAILS_OFFSET = 0x5110
+ITEM_ID_OFFSETS = [0x6000, 0x6040, 0x6080]
+LAYOUT_SIZE = 0x7000
+
+OFFERS = 32
+OFFER_STRIDE = 48
+
+
+class StandInItem:
+    def __init__(self, item_id: int, buy_offers: List[Tuple[int, int, int]], sell_offers: List[Tuple[int, int, int]],
+                 buy_details: Tuple[int, int, int, int], sell_details: Tuple[int, int, int, int]):
+        """The market values of an item, as the stand-in lays them out in memory.
+
+        Args:
+            item_id (int): The id of the item.
+            buy_offers (List[Tuple[int, int, int]]): The (offer, amount, timestamp) of every buy offer.
+            sell_offers (List[Tuple[int, int, int]]): The (offer, amount, timestamp) of every sell offer.
+            buy_details (Tuple[int, int, int, int]): The transactions, total money, max and min offer of the buy side.
+            sell_details (Tuple[int, int, int, int]): The transactions, total money, max and min offer of the sell side.
+        """
+        self.item_id = item_id
+        self.buy_offers = buy_offers
+        self.sell_offers = sell_offers
+        self.buy_details = buy_details
+        self.sell_details = sell_details
+
+    @staticmethod
+    def random(item_id: int, seed: Optional[int] = None) -> "StandInItem":
+        """Creates an item with plausible random values.
+        """
+        rng = random.Random(item_id if seed is None else seed)
+        now = int(time.time())
+
+        def offers(low: int, high: int) -> List[Tuple[int, int, int]]:
+            return [(rng.randint(low, high), rng.randint(1, 1000), now + rng.randint(0, 30 * 86400)) for _ in range(OFFERS)]
+
+        def details() -> Tuple[int, int, int, int]:
+            transactions = rng.randint(1, 5000)
+            minimum = rng.randint(100, 100000)
+            maximum = minimum + rng.randint(0, 100000)
+            return transactions, transactions * (minimum + maximum) // 2, maximum, minimum
+
+        return StandInItem(item_id, offers(1000, 200000), offers(1000, 200000), details(), details())
+
+    def find_memory_arguments(self) -> Tuple[int, int, int, int, int, List[int]]:
+        """The arguments of MarketMemoryReader.find_current_memory for this item, as the client would display them.
+        """
+        buy_transactions, buy_total, buy_max, buy_min = self.buy_details
+        sell_transactions, sell_total, sell_max, sell_min = self.sell_details
+        statistics = [buy_transactions, buy_max, buy_total // buy_transactions, buy_min,
+                      sell_transactions, sell_max, sell_total // sell_transactions, sell_min]
+
+        return self.buy_offers[0][0], self.sell_offers[0][0], buy_max, sell_max, self.item_id, statistics
+
+
+def _write_item(memory: mmap.mmap, base: int, item: StandInItem):
+    for offers_offset, offers in ((BUY_OFFERS_OFFSET, item.buy_offers), (SELL_OFFERS_OFFSET, item.sell_offers)):
+        for i, (offer, amount, timestamp) in enumerate(offers):
+            offer_address = base + offers_offset + i * OFFER_STRIDE
+            struct.pack_into("<q", memory, offer_address, offer)
+            struct.pack_into("<q", memory, offer_address - 8, amount)
+            # Only the lower 32 bits of the timestamp are used, the upper ones hold unrelated data.
+            struct.pack_into("<Q", memory, offer_address - 24, (0x5A5A << 32) | timestamp)
+
+    for details_offset, (transactions, total, maximum, minimum) in ((BUY_DETAILS_OFFSET, item.buy_details), (SELL_DETAILS_OFFSET, item.sell_details)):
+        struct.pack_into("<qqqq", memory, base + details_offset - 16, transactions, total, maximum, minimum)
+
+    for offset in ITEM_ID_OFFSETS:
+        struct.pack_into("<H", memory, base + offset, item.item_id)
+
+
+def _write_decoys(memory: mmap.mmap, base: int, item: StandInItem, decoys: int, rng: random.Random):
+    """Scatters bare copies of the searched values over the arena, outside of the layout.
+    They match a scalar search, but not the struct patterns.
+    """
+    buy_offer, sell_offer, max_buy_offer, max_sell_offer, _, _ = item.find_memory_arguments()
+    slots = (len(memory) - LAYOUT_SIZE) // 8
+
+    for i in range(decoys):
+        offset = rng.randrange(slots) * 8
+        if base - 8 <= offset < base + LAYOUT_SIZE:
+            continue
+
+        struct.pack_into("<q", memory, offset, (buy_offer, sell_offer, max_buy_offer, max_sell_offer)[i % 4])
+
+
+def _serve(connection: Connection, size: int, decoys: int, seed: int):
+    """The main loop of the stand-in process. Holds the arena and applies the commands of the parent.
+    """
+    # A private anonymous mapping, like the heap allocations of the client. mmap(-1, size) alone would be a shared /dev/zero mapping.
+    memory = mmap.mmap(-1, size, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+    arena = ctypes.addressof(ctypes.c_char.from_buffer(memory))
+    rng = random.Random(seed)
+    base = 0
+    item = None
+
+    while True:
+        command, argument = connection.recv()
+
+        if command == "set_item":
+            item = argument
+            _write_item(memory, base, item)
+            _write_decoys(memory, base, item, decoys, rng)
+            connection.send(None)
+        elif command == "shift":
+            memory[base:base + LAYOUT_SIZE] = bytes(LAYOUT_SIZE)
+            base = (base + argument) % (size - LAYOUT_SIZE) // 8 * 8
+            if item:
+                _write_item(memory, base, item)
+            connection.send(None)
+        elif command == "addresses":
+            connection.send({
+                "buy_offer_reader": arena + base + BUY_OFFERS_OFFSET,
+                "sell_offer_reader": arena + base + SELL_OFFERS_OFFSET,
+                "buy_details_reader": arena + base + BUY_DETAILS_OFFSET,
+                "sell_details_reader": arena + base + SELL_DETAILS_OFFSET,
+                "item_id_reader": [arena + base + offset for offset in ITEM_ID_OFFSETS],
+            })
+        elif command == "stop":
+            connection.send(None)
+            return
+
+
+class MarketStandIn:
+    def __init__(self, size: int = 64 * 1024 * 1024, decoys: int = 256, seed: int = 0):
+        """A child process which lays out the market structs of the client in its memory, for measuring the memory path without Tibia.
+
+        Args:
+            size (int, optional): The size of the anonymous memory arena holding the structs. Defaults to 64 MiB.
+            decoys (int, optional): How many bare copies of the values are scattered over the arena per item. Defaults to 256.
+            seed (int, optional): The seed of the decoy positions. Defaults to 0.
+        """
+        self.size = size
+        self.decoys = decoys
+        self.seed = seed
+        self.process = None
+        self.connection = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def start(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child_connection, self.size, self.decoys, self.seed), daemon=True)
+        self.process.start()
+
+    def _call(self, command: str, argument: Any = None) -> Any:
+        self.connection.send((command, argument))
+        return self.connection.recv()
+
+    def set_item(self, item: StandInItem):
+        """Writes the values of the item into the structs, like the client does when an item is opened in the market.
+        """
+        self._call("set_item", item)
+
+    def shift(self, offset: int):
+        """Moves all structs by offset bytes, like the client does when it reallocates them.
+        """
+        self._call("shift", offset)
+
+    def addresses(self) -> Dict[str, Any]:
+        """The true base addresses of the structs, keyed like the readers of MarketMemoryReader.
+        """
+        return self._call("addresses")
+
+    def stop(self):
+        if self.process and self.process.is_alive():
+            self._call("stop")
+            self.process.join()
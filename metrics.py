@@ -0,0 +1,206 @@
+from contextlib import nullcontext
+from typing import *
+import bisect
+import time
+import json
+import os
+
+
+# Set TIBIA_METRICS=1 to collect crawl metrics. When disabled, every call returns right away.
+METRICS_ENABLED = os.environ.get("TIBIA_METRICS") == "1"
+METRICS_LOCATION = os.environ.get("TIBIA_METRICS_LOCATION", "metrics")
+
+# Upper bounds of the histogram buckets, in seconds.
+STAGE_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+_DISABLED_STAGE = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        """A Prometheus style histogram of durations, with the buckets of STAGE_BUCKETS.
+        """
+        self.counts = [0] * (len(STAGE_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        """Timings and counters of a scan, exported as Prometheus textfile and as JSON summary.
+
+        Args:
+            enabled (bool, optional): Whether to collect anything. Defaults to the TIBIA_METRICS environment variable.
+        """
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """Starts collecting for a new scan.
+        """
+        self.started = time.time()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, str], int] = {}
+        # Items scanned per category, and the time of the first and last one.
+        self.categories: Dict[int, List[float]] = {}
+
+    def stage(self, name: str) -> ContextManager:
+        """Times the block as one occurence of the stage, e.g. with metrics.stage("memory_read"): ...
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+
+        return _Stage(self, name)
+
+    def observe(self, name: str, seconds: float):
+        """Records a duration of the stage.
+        """
+        if not self.enabled:
+            return
+
+        if name not in self.stages:
+            self.stages[name] = Histogram()
+        self.stages[name].observe(seconds)
+
+    def increment(self, name: str, label: str = "", amount: int = 1):
+        """Increases a counter, e.g. increment("failures", "duplicate").
+        """
+        if not self.enabled:
+            return
+
+        self.counters[(name, label)] = self.counters.get((name, label), 0) + amount
+
+    def item_scanned(self, category: int):
+        """Counts an item of the category, for the items per minute of each category.
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        if category not in self.categories:
+            self.categories[category] = [0, now, now]
+
+        self.categories[category][0] += 1
+        self.categories[category][2] = now
+
+    def drain(self) -> dict:
+        """Returns the stages, counters and items collected since the last drain, and clears them.
+        Used by crawl workers in their own process, to pass their metrics on to the parent with merge.
+        """
+        collected = {"stages": self.stages, "counters": self.counters, "categories": self.categories}
+        self.stages, self.counters, self.categories = {}, {}, {}
+        return collected
+
+    def merge(self, collected: dict):
+        """Adds metrics returned by drain of another Metrics object.
+        """
+        if not self.enabled:
+            return
+
+        for name, histogram in collected["stages"].items():
+            if name not in self.stages:
+                self.stages[name] = Histogram()
+            own = self.stages[name]
+            own.counts = [a + b for a, b in zip(own.counts, histogram.counts)]
+            own.sum += histogram.sum
+            own.count += histogram.count
+
+        for key, value in collected["counters"].items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        for category, (items, first, last) in collected["categories"].items():
+            if category in self.categories:
+                own = self.categories[category]
+                self.categories[category] = [own[0] + items, min(own[1], first), max(own[2], last)]
+            else:
+                self.categories[category] = [items, first, last]
+
+    def items_per_minute(self) -> Dict[int, float]:
+        rates = {}
+        for category, (items, first, last) in self.categories.items():
+            # The first item has no duration of its own, so it isn't counted in the rate.
+            rates[category] = (items - 1) * 60 / (last - first) if last > first else 0.0
+
+        return rates
+
+    def summary(self) -> dict:
+        """The metrics of the scan as JSON serializable dictionary.
+        """
+        return {
+            "started": self.started,
+            "duration": time.time() - self.started,
+            "stages": {name: {"count": histogram.count, "sum": histogram.sum, "mean": histogram.sum / histogram.count}
+                       for name, histogram in self.stages.items()},
+            "counters": {f"{name}{'.' + label if label else ''}": value for (name, label), value in self.counters.items()},
+            "items": {str(category): items for category, (items, _, _) in self.categories.items()},
+            "items_per_minute": {str(category): rate for category, rate in self.items_per_minute().items()},
+        }
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format.
+        """
+        lines = ["# TYPE tibia_crawl_stage_seconds histogram"]
+        for name, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(STAGE_BUCKETS + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'tibia_crawl_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'tibia_crawl_stage_seconds_sum{{stage="{name}"}} {histogram.sum}')
+            lines.append(f'tibia_crawl_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+
+        names = sorted(set(name for name, _ in self.counters))
+        for name in names:
+            lines.append(f"# TYPE tibia_crawl_{name}_total counter")
+            for (counter, label), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f'tibia_crawl_{name}_total{{cause="{label}"}} {value}' if label else f"tibia_crawl_{name}_total {value}")
+
+        lines.append("# TYPE tibia_crawl_items_per_minute gauge")
+        for category, rate in sorted(self.items_per_minute().items()):
+            lines.append(f'tibia_crawl_items_per_minute{{category="{category}"}} {rate}')
+
+        lines.append("# TYPE tibia_crawl_scan_started_seconds gauge")
+        lines.append(f"tibia_crawl_scan_started_seconds {self.started}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, location: str = METRICS_LOCATION, summary: bool = False):
+        """Writes tibia_crawl.prom for the textfile collector of the node exporter, and optionally the JSON summary of the scan.
+        Both are replaced atomically, so the collector never reads a partial file.
+        """
+        if not self.enabled:
+            return
+
+        os.makedirs(location, exist_ok=True)
+        files = {"tibia_crawl.prom": self.prometheus()}
+        if summary:
+            files[f"scan_{int(self.started)}.json"] = json.dumps(self.summary(), indent=2)
+
+        for file, content in files.items():
+            path = os.path.join(location, file)
+            with open(path + ".tmp", "w") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+
+# The metrics shared by the crawler, the memory reader and the scan loop.
+metrics = Metrics()
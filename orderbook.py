@@ -0,0 +1,150 @@
+from typing import *
+import numpy as np
+import os
+
+
+BUY = 0
+SELL = 1
+
+# One visible offer of an item's market. Amounts and expiry times are 32 bit in the client.
+BOOK_DTYPE = np.dtype([
+    ("side", "u1"),
+    ("price", "<i8"),
+    ("amount", "<u4"),
+    ("expiry", "<u4"),
+])
+
+# Where the order books of every scan are saved, one file per scan.
+ORDER_BOOKS_LOCATION = "orderbooks"
+
+
+class OrderBooks:
+    def __init__(self, names: np.ndarray, offsets: np.ndarray, offers: np.ndarray, time: float = 0):
+        """The visible order books of many items, stored as one array of offers.
+        The offers of item i are offers[offsets[i]:offsets[i + 1]].
+
+        Args:
+            names (np.ndarray): The item names.
+            offsets (np.ndarray): The start of every item's offers, plus the total amount of offers at the end.
+            offers (np.ndarray): The offers of all items, as BOOK_DTYPE rows.
+            time (float, optional): The unix timestamp of the scan. Defaults to 0.
+        """
+        self.names = names
+        self.offsets = offsets
+        self.offers = offers
+        self.time = time
+        # The item index of every offer, for grouping.
+        self.items = np.repeat(np.arange(len(names)), np.diff(offsets))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def load(location: str) -> "OrderBooks":
+        with np.load(location) as data:
+            return OrderBooks(data["names"], data["offsets"], data["offers"], float(data["time"]))
+
+    def save(self, location: str):
+        os.makedirs(os.path.dirname(location) or ".", exist_ok=True)
+        np.savez_compressed(location, names=self.names, offsets=self.offsets, offers=self.offers, time=np.float64(self.time))
+
+    def book(self, name: str) -> np.ndarray:
+        """The offers of a single item.
+        """
+        index = np.flatnonzero(self.names == name)
+        if len(index) == 0:
+            raise KeyError(name)
+
+        return self.offers[self.offsets[index[0]]:self.offsets[index[0] + 1]]
+
+    def _sum(self, mask: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        return np.bincount(self.items[mask], weights=weights[mask], minlength=len(self)).astype(np.int64)
+
+    def best_buy(self) -> np.ndarray:
+        """The highest buy offer of every item, -1 if there is none.
+        """
+        best = np.full(len(self), -1, dtype=np.int64)
+        buys = self.offers["side"] == BUY
+        np.maximum.at(best, self.items[buys], self.offers["price"][buys])
+        return best
+
+    def best_sell(self) -> np.ndarray:
+        """The lowest sell offer of every item, -1 if there is none.
+        """
+        best = np.full(len(self), np.iinfo(np.int64).max, dtype=np.int64)
+        sells = self.offers["side"] == SELL
+        np.minimum.at(best, self.items[sells], self.offers["price"][sells])
+        best[best == np.iinfo(np.int64).max] = -1
+        return best
+
+    def spread(self) -> np.ndarray:
+        """The difference between the lowest sell and the highest buy offer of every item. NaN if a side has no offers.
+        """
+        buy, sell = self.best_buy(), self.best_sell()
+        return np.where((buy >= 0) & (sell >= 0), sell - buy, np.nan)
+
+    def depth_at_price(self, prices: Union[int, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """The amount of items which can be bought and sold at the price, per item.
+
+        Args:
+            prices (Union[int, np.ndarray]): One price for all items, or a price per item.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The amount offered by sellers at or below the price,
+                and the amount wanted by buyers at or above the price.
+        """
+        prices = np.broadcast_to(np.asarray(prices, dtype=np.int64), (len(self),))[self.items]
+        sells = (self.offers["side"] == SELL) & (self.offers["price"] <= prices)
+        buys = (self.offers["side"] == BUY) & (self.offers["price"] >= prices)
+        return self._sum(sells, self.offers["amount"]), self._sum(buys, self.offers["amount"])
+
+    def volume_within(self, fraction: float) -> Tuple[np.ndarray, np.ndarray]:
+        """The amount offered close to the best offers, per item.
+
+        Args:
+            fraction (float): How far from the best offer an offer may be, e.g. 0.05 for 5%.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The amount of the sell offers at most fraction above the lowest sell offer,
+                and of the buy offers at most fraction below the highest buy offer.
+        """
+        best_sell = self.best_sell()[self.items]
+        best_buy = self.best_buy()[self.items]
+        sells = (self.offers["side"] == SELL) & (self.offers["price"] <= best_sell * (1 + fraction))
+        buys = (self.offers["side"] == BUY) & (self.offers["price"] >= best_buy * (1 - fraction))
+        return self._sum(sells, self.offers["amount"]), self._sum(buys, self.offers["amount"])
+
+
+class OrderBookRecorder:
+    def __init__(self, time: float):
+        """Collects the order books of a scan, item by item.
+
+        Args:
+            time (float): The unix timestamp the scan started at.
+        """
+        self.time = time
+        self.names: List[str] = []
+        self.books: List[np.ndarray] = []
+
+    def append(self, name: str, book: Optional[np.ndarray]):
+        """Adds the book of an item. Items without a book are skipped.
+        """
+        if book is not None:
+            self.names.append(name.lower())
+            self.books.append(book)
+
+    def order_books(self) -> OrderBooks:
+        offsets = np.zeros(len(self.books) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(book) for book in self.books])
+        offers = np.concatenate(self.books) if self.books else np.zeros(0, dtype=BOOK_DTYPE)
+        return OrderBooks(np.array(self.names, dtype="U64"), offsets, offers, self.time)
+
+    def save(self, location: str = ORDER_BOOKS_LOCATION) -> str:
+        """Saves the books as <location>/<scan time>.npz.
+
+        Returns:
+            str: The saved file.
+        """
+        path = os.path.join(location, f"{int(self.time)}.npz")
+        self.order_books().save(path)
+        return path
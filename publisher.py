@@ -0,0 +1,147 @@
+from git.repo import Repo
+from git.objects import Blob
+from git.index.typ import BaseIndexEntry
+from gitdb.base import IStream
+from typing import *
+from io import BytesIO
+import threading
+import queue
+import time
+import os
+
+
+class Publisher:
+    def __init__(self, repo_location: str, remote: str = "origin", max_attempts: int = 5, backoff: float = 30):
+        """Commits and pushes changed files of the results repo in a background thread.
+        Only the staged paths are added, so publishing costs the same no matter how many files the repo has.
+        Their contents are read when publish is called, so files written afterwards can't end up half written in the commit.
+
+        Args:
+            repo_location (str): The working tree of the results repo.
+            remote (str, optional): The remote to push to. Defaults to "origin".
+            max_attempts (int, optional): How often a push is tried before giving up. Defaults to 5.
+            backoff (float, optional): The delay before the first retry in seconds, doubled after every failed attempt. Defaults to 30.
+        """
+        self.repo_location = os.path.abspath(repo_location)
+        self.remote = remote
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+        self.lock = threading.Lock()
+        self.staged: Set[str] = set()
+        self.jobs: "queue.Queue[Tuple[List[Tuple[str, Optional[bytes]]], str]]" = queue.Queue()
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def stage(self, *paths: str):
+        """Remembers that the paths were written, to add them to the next commit.
+        """
+        with self.lock:
+            for path in paths:
+                self.staged.add(os.path.relpath(os.path.abspath(path), self.repo_location))
+
+    def publish(self, message: str = "Update market data"):
+        """Snapshots the staged paths, and commits and pushes them in the background.
+        Only returns once the contents were read, the writers of the staged files have to be finished before.
+        """
+        with self.lock:
+            paths = sorted(self.staged)
+            self.staged.clear()
+
+        self.jobs.put((self._snapshot(paths), message))
+
+    def _snapshot(self, paths: List[str]) -> List[Tuple[str, Optional[bytes]]]:
+        """Reads the contents of the paths. Directories are expanded to their files.
+
+        Returns:
+            List[Tuple[str, Optional[bytes]]]: The path relative to the repo and its contents, None if it was deleted.
+        """
+        snapshot = []
+        for path in paths:
+            location = os.path.join(self.repo_location, path)
+            if os.path.isdir(location):
+                files = [os.path.join(root, file) for root, _, names in os.walk(location) for file in names]
+                snapshot.extend(self._snapshot([os.path.relpath(file, self.repo_location) for file in sorted(files)]))
+                continue
+
+            try:
+                with open(location, "rb") as f:
+                    snapshot.append((path.replace(os.sep, "/"), f.read()))
+            except FileNotFoundError:
+                snapshot.append((path.replace(os.sep, "/"), None))
+
+        return snapshot
+
+    def wait(self):
+        """Blocks until all published commits were pushed, or gave up pushing.
+        """
+        self.jobs.join()
+
+    def _work(self):
+        while True:
+            snapshot, message = self.jobs.get()
+            try:
+                repo = Repo(self.repo_location)
+                if self._commit(repo, snapshot, message):
+                    self._push(repo)
+            except Exception as e:
+                print(f"Error while publishing to git: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def _commit(self, repo: Repo, snapshot: List[Tuple[str, Optional[bytes]]], message: str) -> bool:
+        """Writes the snapshotted contents to the index and commits them. Deleted paths are removed from the index.
+
+        Returns:
+            bool: Whether something was committed.
+        """
+        entries = []
+        deleted = []
+        for path, data in snapshot:
+            if data is None:
+                deleted.append(path)
+            else:
+                blob = repo.odb.store(IStream(Blob.type, len(data), BytesIO(data)))
+                entries.append(BaseIndexEntry((Blob.file_mode, blob.binsha, 0, path)))
+
+        if entries:
+            repo.index.add(entries)
+        if deleted:
+            tracked = [path for path in deleted if (path, 0) in repo.index.entries]
+            if tracked:
+                repo.index.remove(tracked)
+
+        if repo.head.is_valid() and not repo.index.diff(repo.head.commit):
+            return False
+
+        repo.index.commit(message)
+        return True
+
+    def _push(self, repo: Repo):
+        """Pushes the current branch, retrying with exponential backoff.
+        Commits of a push that gave up are pushed along with the next one.
+        """
+        delay = self.backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                repo.remote(self.remote).push(repo.active_branch.name).raise_if_error()
+                return
+            except Exception as e:
+                print(f"Push attempt {attempt} of {self.max_attempts} failed: {e}")
+
+            if attempt < self.max_attempts:
+                time.sleep(delay)
+                delay *= 2
+
+
+_publishers: Dict[str, Publisher] = {}
+
+
+def get_publisher(repo_location: str) -> Publisher:
+    """Returns the Publisher of the repo, so that all scans of a run share one background worker.
+    """
+    location = os.path.abspath(repo_location)
+    if location not in _publishers:
+        _publishers[location] = Publisher(location)
+
+    return _publishers[location]
@@ -0,0 +1,120 @@
+from history_store import HistoryStore
+from market_values import fee_adjusted_profit
+from datetime import datetime, timedelta
+from typing import *
+import numpy as np
+
+
+# How much each property raises the priority of an item, on top of the time since its last sample.
+VOLATILITY_WEIGHT = 20.0
+PROFIT_WEIGHT = 0.5
+TRADERS_WEIGHT = 0.5
+
+# How many of the latest samples the volatility is computed from.
+VOLATILITY_WINDOW = 20
+
+# Items whose refresh failed are left out for min_refresh_interval * 2 ** failures, up to this many doublings.
+MAX_FAILURE_BACKOFF = 6
+
+
+def item_priority(rows: np.ndarray, now: float) -> float:
+    """How urgently an item should be refreshed. Grows with the time since its last sample,
+    faster for volatile items, items with a high potential profit and items with many active traders.
+
+    Args:
+        rows (np.ndarray): The history of the item, as HISTORY_DTYPE rows sorted by time.
+        now (float): The current unix timestamp.
+
+    Returns:
+        float: The priority. Items without history have priority 0, they are left to the full sweeps.
+    """
+    if len(rows) == 0:
+        return 0.0
+
+    last = rows[-1]
+    sell_offers = rows["sell_offer"][-VOLATILITY_WINDOW:].astype(np.float64)
+    sell_offers = sell_offers[sell_offers > 0]
+    volatility = float(np.std(np.diff(sell_offers) / sell_offers[:-1])) if len(sell_offers) >= 3 else 0.0
+
+    _, _, potential_profit = fee_adjusted_profit(last["sell_offer"], last["buy_offer"], last["sold"], last["bought"])
+    hours_since_sample = max(0.0, now - float(last["time"])) / 3600
+
+    return hours_since_sample * (1 + VOLATILITY_WEIGHT * volatility +
+                                 PROFIT_WEIGHT * np.log10(1 + max(int(potential_profit), 0)) +
+                                 TRADERS_WEIGHT * np.log10(1 + max(int(last["active_traders"]), 0)))
+
+
+class RescanScheduler:
+    def __init__(self, sweep_times: List[str] = ["06:00", "18:00"], sweep_margin: float = 10 * 60, min_refresh_interval: float = 60 * 60):
+        """Decides when to run full sweeps of the market, and which items to refresh in between.
+
+        Args:
+            sweep_times (List[str], optional): The times of day full sweeps start at, as HH:MM. Defaults to 06:00 and 18:00.
+            sweep_margin (float, optional): How long before a sweep refreshes stop, in seconds, so the client can be closed in time. Defaults to 10 minutes.
+            min_refresh_interval (float, optional): How long an item isn't refreshed after its last sample or refresh, in seconds. Defaults to 1 hour.
+                Items whose refresh failed wait twice as long after every failure.
+        """
+        self.sweep_times = [datetime.strptime(sweep_time, "%H:%M").time() for sweep_time in sweep_times]
+        self.sweep_margin = sweep_margin
+        self.min_refresh_interval = min_refresh_interval
+
+        self.last_sweep: Optional[datetime] = None
+        self.last_refresh: Dict[str, float] = {}
+        # The failed refreshes of each item since its last successful one.
+        self.failures: Dict[str, int] = {}
+
+    def _last_sweep_time(self, now: datetime) -> datetime:
+        """The latest scheduled sweep time which isn't after now.
+        """
+        candidates = [datetime.combine(now.date() - timedelta(days=days), sweep_time) for days in (0, 1) for sweep_time in self.sweep_times]
+        return max(candidate for candidate in candidates if candidate <= now)
+
+    def next_sweep(self, now: datetime) -> datetime:
+        """The next scheduled sweep time after now.
+        """
+        candidates = [datetime.combine(now.date() + timedelta(days=days), sweep_time) for days in (0, 1) for sweep_time in self.sweep_times]
+        return min(candidate for candidate in candidates if candidate > now)
+
+    def sweep_due(self, now: datetime) -> bool:
+        """Whether a full sweep should run now. The first check always runs one, like the previous fixed schedule did on start.
+        """
+        return self.last_sweep is None or self.last_sweep < self._last_sweep_time(now)
+
+    def sweep_done(self, now: datetime):
+        self.last_sweep = now
+
+    def refresh_deadline(self, now: datetime) -> float:
+        """The unix timestamp refreshes have to stop at, to be done before the next sweep.
+        """
+        return self.next_sweep(now).timestamp() - self.sweep_margin
+
+    def rank(self, store: HistoryStore, now: float) -> List[str]:
+        """Orders the items of the store by priority, highest first. Items sampled or refreshed recently are left out.
+        """
+        priorities = []
+        for name in store.item_names():
+            interval = self.min_refresh_interval * 2 ** min(self.failures.get(name, 0), MAX_FAILURE_BACKOFF)
+            if now - self.last_refresh.get(name, 0) < interval:
+                continue
+
+            # Refreshes aren't the only samples, right after a full sweep every item is fresh.
+            rows = store.query(name)
+            if len(rows) > 0 and now - float(rows[-1]["time"]) < self.min_refresh_interval:
+                continue
+
+            priority = item_priority(rows, now)
+            if priority > 0:
+                priorities.append((priority, name))
+
+        priorities.sort(reverse=True)
+        return [name for _, name in priorities]
+
+    def refreshed(self, name: str, time: float, succeeded: bool = True):
+        """Records a refresh attempt of the item. Failed attempts have to be recorded as well,
+        or broken items would stay at the top of the ranking and be retried over and over.
+        """
+        self.last_refresh[name] = time
+        if succeeded:
+            self.failures.pop(name, None)
+        else:
+            self.failures[name] = self.failures.get(name, 0) + 1
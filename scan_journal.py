@@ -0,0 +1,104 @@
+import json
+import time
+import os
+from typing import *
+
+
+class ScanProgress:
+    def __init__(self, category: int, index: int, item_id: int, output_offset: int, category_done: bool, started: float = 0):
+        """The last recorded progress of a scan.
+
+        Args:
+            category (int): The category of the last written item.
+            index (int): The starting_index which continues after the last written item.
+            item_id (int): The id of the last written item.
+            output_offset (int): The size of the output file after the last written row.
+            category_done (bool): Whether the whole category was scanned.
+            started (float, optional): The unix timestamp the scan started at. Defaults to 0, for journals which didn't record it.
+        """
+        self.category = category
+        self.index = index
+        self.item_id = item_id
+        self.output_offset = output_offset
+        self.category_done = category_done
+        self.started = started
+
+
+class ScanJournal:
+    def __init__(self, location: str):
+        """An append-only journal of the progress of a full scan, used to resume the scan after a crash.
+        Each line is a JSON object, written after the corresponding row was written to the output.
+
+        Args:
+            location (str): The journal file.
+        """
+        self.location = location
+        self.file = None
+        # The size of the journal up to the end of its last complete entry, found by load.
+        self.valid_size = 0
+
+    def load(self) -> Optional[ScanProgress]:
+        """Returns the last recorded progress, or None if there is no unfinished scan.
+        A partially written last line, from a crash while writing it, is ignored.
+        """
+        self.valid_size = 0
+        if not os.path.exists(self.location):
+            return None
+
+        progress = None
+        started = 0
+        with open(self.location, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+
+                if progress is None:
+                    started = entry.get("time", 0)
+                progress = ScanProgress(entry["category"], entry["index"], entry["id"], entry["offset"], entry["done"], started)
+                self.valid_size += len(line)
+
+        return progress
+
+    def start(self, output_offset: int):
+        """Starts a new journal, discarding the previous one.
+
+        Args:
+            output_offset (int): The size of the output file before any rows were written, i.e. after the header.
+        """
+        self.file = open(self.location, "w")
+        self._write(1, 0, -1, output_offset, False)
+
+    def resume(self):
+        """Continues the existing journal. The partially written line load ignored is cut off first,
+        so the next entry doesn't get appended to it.
+        """
+        self.file = open(self.location, "a")
+        self.file.truncate(self.valid_size)
+
+    def _write(self, category: int, index: int, item_id: int, output_offset: int, category_done: bool):
+        self.file.write(json.dumps({"category": category, "index": index, "id": item_id, "offset": output_offset, "done": category_done, "time": time.time()}) + "\n")
+        self.file.flush()
+
+    def record(self, category: int, index: int, item_id: int, output_offset: int):
+        """Records that the item was written to the output. The output has to be flushed before.
+        """
+        self._write(category, index, item_id, output_offset, False)
+
+    def record_category_done(self, category: int, output_offset: int):
+        """Records that the whole category was scanned.
+        """
+        self._write(category, 0, -1, output_offset, True)
+
+    def finish(self):
+        """Removes the journal after the scan finished.
+        """
+        if self.file:
+            self.file.close()
+            self.file = None
+
+        if os.path.exists(self.location):
+            os.remove(self.location)
@@ -5,6 +5,15 @@ from typing import *
 import cv2
 import numpy as np
 
+
+# Set TIBIA_DEBUG_IMAGES=1 to save selection_showcase.png and ai_image_input.png on every processed image.
+SAVE_DEBUG_IMAGES = os.environ.get("TIBIA_DEBUG_IMAGES") == "1"
+
+# Glyph templates of the market font, built with build_glyph_templates.
+GLYPH_TEMPLATES_LOCATION = "images/glyphs.npz"
+# Below this similarity of a glyph to its best template, tesseract is used instead.
+MIN_GLYPH_CONFIDENCE = 0.8
+
 def take_screenshot(left, top, width, height) -> Image.Image:
     """
     Takes a screenshot of the given screen coordinates, and returns the PIL.Image.
@@ -13,7 +22,8 @@ def take_screenshot(left, top, width, height) -> Image.Image:
 
 def process_image(image: Image.Image, relative_box: Tuple[int, int, int, int] = None, invert = True, rescale_factor: int = 1) -> Image.Image:
     """
-    Converts the image into a more AI readable format. The endresult can be seen under selection_showcase.png and ai_image_input.png.
+    Converts the image into a more AI readable format. The endresult can be seen under selection_showcase.png and ai_image_input.png,
+    if SAVE_DEBUG_IMAGES is set.
     relative_box in this format (relative_left, relative_top, relative_width, relative_height).
     """
     bbox = image.getbbox()
@@ -24,9 +34,10 @@ def process_image(image: Image.Image, relative_box: Tuple[int, int, int, int] =
     cropped_image = image.crop(crop_box)
     cropped_image = cropped_image.convert("L")
 
-    draw = ImageDraw.Draw(image)
-    draw.rectangle(crop_box, outline="black")
-    image.save("selection_showcase.png")
+    if SAVE_DEBUG_IMAGES:
+        draw = ImageDraw.Draw(image)
+        draw.rectangle(crop_box, outline="black")
+        image.save("selection_showcase.png")
 
     img = np.asarray(cropped_image, dtype="uint8")
 
@@ -41,18 +52,155 @@ def process_image(image: Image.Image, relative_box: Tuple[int, int, int, int] =
         img = cv2.threshold(img[1], 128, 255, cv2.THRESH_BINARY_INV)
 
     cropped_image = Image.fromarray(img[1])
-    cropped_image.save("ai_image_input.png")
+    if SAVE_DEBUG_IMAGES:
+        cropped_image.save("ai_image_input.png")
 
     return cropped_image
 
+def _segment_glyphs(image: Image.Image) -> List[List[np.ndarray]]:
+    """
+    Splits a processed image (black text on white) into lines, and the lines into glyph bitmaps.
+    Glyphs keep the height of their line, so dots and commas stay distinguishable from digits.
+    """
+    ink = np.asarray(image.convert("L")) < 128
+
+    def runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+        # Start and end indices of consecutive True values.
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+        return list(zip(edges[::2], edges[1::2]))
+
+    lines = []
+    for top, bottom in runs(ink.any(axis=1)):
+        line = ink[top:bottom]
+        lines.append([line[:, left:right] for left, right in runs(line.any(axis=0))])
+
+    return lines
+
+
+class GlyphRecognizer:
+    def __init__(self, labels: List[str], templates: np.ndarray):
+        """
+        Recognizes text of a fixed bitmap font by comparing each glyph to a set of templates.
+        templates has the shape (len(labels), height, width) and contains the ink coverage of each pixel.
+        """
+        self.labels = labels
+        self.templates = templates
+
+    @staticmethod
+    def load(location: str = GLYPH_TEMPLATES_LOCATION) -> Optional["GlyphRecognizer"]:
+        """
+        Loads the templates saved by build_glyph_templates, or returns None if there are none.
+        """
+        if not os.path.exists(location):
+            return None
+
+        data = np.load(location)
+        return GlyphRecognizer([str(label) for label in data["labels"]], data["templates"])
+
+    def read(self, image: Image.Image) -> Tuple[str, float]:
+        """
+        Reads the text of a processed image.
+        Returns the text and the similarity of the least certain glyph to its template, between 0 and 1.
+        """
+        height, width = self.templates.shape[1:]
+        text_lines = []
+        confidence = 1.0
+
+        for line in _segment_glyphs(image):
+            glyphs = np.zeros((len(line), height, width), dtype=np.float32)
+            for i, glyph in enumerate(line):
+                if glyph.shape[0] > height or glyph.shape[1] > width:
+                    return "", 0.0
+                glyphs[i, :glyph.shape[0], :glyph.shape[1]] = glyph
+
+            # Similarity of every glyph with every template, as intersection over union of the ink.
+            intersection = np.minimum(glyphs[:, None], self.templates[None]).sum(axis=(2, 3))
+            union = np.maximum(glyphs[:, None], self.templates[None]).sum(axis=(2, 3))
+            similarity = intersection / np.maximum(union, 1)
+
+            best = similarity.argmax(axis=1)
+            if len(best) > 0:
+                confidence = min(confidence, float(similarity[np.arange(len(best)), best].min()))
+            text_lines.append("".join(self.labels[index] for index in best))
+
+        return "\n".join(text_lines), confidence
+
+
+def build_glyph_templates(samples_location: str, rescale_factor: int = 3, location: str = GLYPH_TEMPLATES_LOCATION):
+    """
+    Builds the glyph templates from sample captures of the market.
+    Every <name>.png in samples_location needs a <name>.txt with its text. Spaces in the text are ignored.
+    The captures are processed like in Client.search_item, so rescale_factor has to match the one used there.
+    """
+    glyphs: Dict[str, List[np.ndarray]] = {}
+
+    for file in sorted(os.listdir(samples_location)):
+        if not file.endswith(".png"):
+            continue
+
+        with open(os.path.join(samples_location, file[:-len(".png")] + ".txt"), "r") as f:
+            text_lines = [line.replace(" ", "") for line in f.read().splitlines() if line.strip()]
+
+        lines = _segment_glyphs(process_image(Image.open(os.path.join(samples_location, file)), rescale_factor=rescale_factor))
+        if len(lines) != len(text_lines):
+            print(f"Skipping {file}, found {len(lines)} lines instead of {len(text_lines)}.")
+            continue
+
+        for line, text in zip(lines, text_lines):
+            if len(line) != len(text):
+                print(f"Skipping line {text} of {file}, found {len(line)} glyphs.")
+                continue
+
+            for glyph, label in zip(line, text):
+                glyphs.setdefault(label, []).append(glyph)
+
+    height = max(glyph.shape[0] for samples in glyphs.values() for glyph in samples)
+    width = max(glyph.shape[1] for samples in glyphs.values() for glyph in samples)
+
+    labels = sorted(glyphs.keys())
+    templates = np.zeros((len(labels), height, width), dtype=np.float32)
+    for i, label in enumerate(labels):
+        for glyph in glyphs[label]:
+            templates[i, :glyph.shape[0], :glyph.shape[1]] += glyph
+        templates[i] /= len(glyphs[label])
+
+    np.savez(location, labels=np.array(labels), templates=templates)
+
+
+_recognizer: Optional[GlyphRecognizer] = None
+_recognizer_loaded = False
+
+
 def read_image_text(image: Image.Image, psm: int = 3, oem: int = 3, char_white_list: str = "0123456789k") -> str:
     """
-    Feeds the image to tesseract, and returns the text it detected.
+    Reads the text of the image with the in-process glyph recognizer.
+    Falls back to tesseract if there are no glyph templates, or the recognizer isn't confident enough.
     """
+    global _recognizer, _recognizer_loaded
+
+    if not _recognizer_loaded:
+        _recognizer = GlyphRecognizer.load()
+        _recognizer_loaded = True
+
+    if _recognizer:
+        text, confidence = _recognizer.read(image)
+        if confidence >= MIN_GLYPH_CONFIDENCE:
+            return "".join(char for char in text if char in char_white_list or char == "\n")
+
     config = f"--oem {oem} --psm {psm} -c tessedit_char_whitelist={char_white_list}"
 
     try:
         return pytesseract.image_to_string(image, config=config)
     except pytesseract.TesseractNotFoundError as e:
         print(e)
-        exit(1)
\ No newline at end of file
+        exit(1)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python screenshot.py <directory with sample .png and .txt captures>")
+        exit(1)
+
+    build_glyph_templates(sys.argv[1])
@@ -0,0 +1,6 @@
+# Tests of the bot logic which don't need a Tibia client. Run with: python -m pytest tests
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,98 @@
+from crawl_orchestrator import CrawlOrchestrator
+from typing import *
+import threading
+import pytest
+
+
+# The fake market: the item names of every category, in crawl order.
+CATALOGUE = {category: [f"item {category}-{index}" for index in range(5)] for category in (1, 2, 3)}
+
+
+class FakeClient:
+    def __init__(self, calls: List[Tuple[int, int]], fail_after: Optional[Dict[int, int]] = None, always_fail: bool = False, die_after: Optional[int] = None):
+        """A client crawling CATALOGUE, with the interface the orchestrator uses.
+        Like the real client, a resumed crawl can read the item it stopped at once more.
+
+        Args:
+            calls (List[Tuple[int, int]]): Gets the (category, starting_index) of every crawl_market call.
+            fail_after (Dict[int, int], optional): Raises once after this many items of the category. Shared between clients. Defaults to None.
+            always_fail (bool, optional): Raises before the first item of every crawl. Defaults to False.
+            die_after (int, optional): Ends the worker thread without an exit message after this many items. Defaults to None.
+        """
+        self.calls = calls
+        self.fail_after = fail_after if fail_after is not None else {}
+        self.always_fail = always_fail
+        self.die_after = die_after
+        self.crawl_position = (1, 0, -1)
+        self.exited = False
+        self.lock = threading.Lock()
+
+    def crawl_market(self, category: int, starting_index: int = 0) -> Generator[str, None, None]:
+        with self.lock:
+            self.calls.append((category, starting_index))
+
+        if self.always_fail:
+            raise RuntimeError("market didn't load")
+
+        for index in range(max(starting_index - 1, 0), len(CATALOGUE[category])):
+            if self.fail_after.get(category) == index:
+                del self.fail_after[category]
+                raise RuntimeError("market didn't load")
+            if self.die_after == index:
+                # Not an Exception, so it ends the worker like a crash would.
+                raise SystemExit()
+
+            self.crawl_position = (category, index + 1, category * 100 + index)
+            yield CATALOGUE[category][index]
+
+    def exit_tibia(self):
+        self.exited = True
+
+
+def crawl(clients: List[FakeClient], categories: List[int], max_retries: int = 2) -> Tuple[CrawlOrchestrator, List[Tuple[int, str]]]:
+    orchestrator = CrawlOrchestrator([lambda client=client: client for client in clients], categories, use_processes=False,
+                                     sizes_location=None, max_retries=max_retries, start_timeout=10)
+    items = [(category, item) for category, item, book in orchestrator.run()]
+    return orchestrator, items
+
+
+def test_failed_category_resumes_after_last_item():
+    calls = []
+    client = FakeClient(calls, fail_after={1: 3})
+
+    orchestrator, items = crawl([client], [1])
+
+    # The retry starts at the index after the last read item, and the item read again isn't passed on twice.
+    assert calls == [(1, 0), (1, 3)]
+    assert items == [(1, item) for item in CATALOGUE[1]]
+    assert orchestrator.failed_categories == []
+    assert client.exited
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_category_is_crawled_by_another():
+    calls = []
+    dying = FakeClient(calls, die_after=2)
+    healthy = FakeClient(calls)
+
+    orchestrator, items = crawl([dying, healthy], [1, 2])
+
+    # The items the dead worker read stay valid, the rest of its category comes from the other worker.
+    assert sorted(items) == sorted((category, item) for category in (1, 2) for item in CATALOGUE[category])
+    assert len(items) == len(set(items))
+    assert calls.count((1, 0)) == 2
+    assert orchestrator.failed_categories == []
+    assert healthy.exited and not dying.exited
+
+
+def test_categories_are_given_up_after_max_retries():
+    calls = []
+    clients = [FakeClient(calls, always_fail=True), FakeClient(calls, always_fail=True)]
+
+    orchestrator, items = crawl(clients, [1, 2, 3], max_retries=2)
+
+    assert items == []
+    assert sorted(orchestrator.failed_categories) == [1, 2, 3]
+    # The first attempt and max_retries retries of every category.
+    assert sorted(calls) == sorted([(category, 0) for category in (1, 2, 3)] * 3)
+    assert all(client.exited for client in clients)
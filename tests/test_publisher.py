@@ -0,0 +1,91 @@
+from publisher import Publisher
+from git.repo import Repo
+from typing import *
+import pytest
+import os
+
+
+@pytest.fixture
+def repos(tmp_path) -> Tuple[Repo, Repo]:
+    """A results repo cloned from a local bare remote, with an initial commit pushed.
+    """
+    remote = Repo.init(tmp_path / "remote.git", bare=True)
+    repo = Repo.clone_from(str(tmp_path / "remote.git"), str(tmp_path / "results"))
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@localhost")
+
+    (tmp_path / "results" / "fullscan.csv").write_text("Name\n")
+    repo.index.add(["fullscan.csv"])
+    repo.index.commit("Initial commit")
+    repo.remote("origin").push(f"{repo.active_branch.name}:{repo.active_branch.name}").raise_if_error()
+    return repo, remote
+
+
+def pushed_files(remote: Repo, branch: str) -> Dict[str, bytes]:
+    tree = remote.commit(branch).tree
+    return {blob.path: blob.data_stream.read() for blob in tree.traverse() if blob.type == "blob"}
+
+
+def test_publish_pushes_staged_files(repos: Tuple[Repo, Repo]):
+    repo, remote = repos
+    location = repo.working_tree_dir
+    os.makedirs(os.path.join(location, "history_segments"))
+    with open(os.path.join(location, "history_segments", "2024-01.seg"), "wb") as f:
+        f.write(b"\x02\x05sword")
+    with open(os.path.join(location, "fullscan.csv"), "w") as f:
+        f.write("Name\nsword\n")
+    # Written, but never staged.
+    with open(os.path.join(location, "scratch.txt"), "w") as f:
+        f.write("not published")
+
+    publisher = Publisher(location, backoff=0)
+    publisher.stage(os.path.join(location, "history_segments", "2024-01.seg"), os.path.join(location, "fullscan.csv"))
+    publisher.publish("Update market data")
+    publisher.wait()
+
+    files = pushed_files(remote, repo.active_branch.name)
+    assert files == {"fullscan.csv": b"Name\nsword\n", "history_segments/2024-01.seg": b"\x02\x05sword"}
+    assert remote.commit(repo.active_branch.name).message == "Update market data"
+
+
+def test_publish_commits_the_snapshot(repos: Tuple[Repo, Repo]):
+    repo, remote = repos
+    location = repo.working_tree_dir
+    with open(os.path.join(location, "fullscan.csv"), "w") as f:
+        f.write("Name\nsword\n")
+
+    publisher = Publisher(location, backoff=0)
+    publisher.stage(os.path.join(location, "fullscan.csv"))
+    publisher.publish()
+    # Writes after publish returned belong to the next commit.
+    with open(os.path.join(location, "fullscan.csv"), "a") as f:
+        f.write("shield\n")
+    publisher.wait()
+
+    assert pushed_files(remote, repo.active_branch.name)["fullscan.csv"] == b"Name\nsword\n"
+
+
+def test_publish_removes_deleted_files(repos: Tuple[Repo, Repo]):
+    repo, remote = repos
+    location = repo.working_tree_dir
+    os.remove(os.path.join(location, "fullscan.csv"))
+
+    publisher = Publisher(location, backoff=0)
+    publisher.stage(os.path.join(location, "fullscan.csv"))
+    publisher.publish()
+    publisher.wait()
+
+    assert "fullscan.csv" not in pushed_files(remote, repo.active_branch.name)
+
+
+def test_publish_without_changes_doesnt_commit(repos: Tuple[Repo, Repo]):
+    repo, remote = repos
+    head = remote.commit(repo.active_branch.name).hexsha
+
+    publisher = Publisher(repo.working_tree_dir, backoff=0)
+    publisher.stage(os.path.join(repo.working_tree_dir, "fullscan.csv"))
+    publisher.publish()
+    publisher.wait()
+
+    assert remote.commit(repo.active_branch.name).hexsha == head
@@ -3,56 +3,32 @@ import subprocess
 import time
 from typing import *
 import screenshot
-import requests
+from http_client import HttpClient, default_client
 from datetime import datetime, timedelta
 import re
-from memory_reader import MemoryReader
-import ctypes
+from locator import Locator
+from item_index import ItemIndex
+from event_store import EventData, EventCalendarParser
+from market_values import MarketValues
+from market_memory import MarketMemoryReader, ITEM_DUPLICATE, CATEGORY_END
+from metrics import metrics
 import os
 
 
-class EventData:
-    def __init__(self, date: datetime, events: List[str]):
-        self.date = date
-        self.events = events
+# Where the found memory addresses are cached between runs.
+MEMORY_LAYOUT_LOCATION = "memory_layout.json"
+# Set TIBIA_MARKET_CAPTURE to a file to record the raw memory reads of every item, for replaying them offline.
+MARKET_CAPTURE_LOCATION = os.environ.get("TIBIA_MARKET_CAPTURE")
 
-    def __str__(self) -> str:
-        return f"{self.date.strftime('%Y.%m.%d')},{','.join(self.events)}"
 
+class Wiki:
+    def __init__(self, http: Optional[HttpClient] = None):
+        """Fetches data from the tibia fandom wiki and tibia.com, through a pooled and cached HTTP client.
 
-class MarketValues:
-    def __init__(self, name: str, time: float, sell_offer: int, buy_offer: int, month_sell_offer: int, month_buy_offer: int, sold: int, bought: int, highest_sell: int, lowest_buy: int, approx_offers: int):
-        self.buy_offer: int = max(buy_offer, lowest_buy)
-        self.sell_offer: int = max(min(sell_offer, highest_sell), self.buy_offer) if sold > 0 else sell_offer
-        self.month_sell_offer: int = month_sell_offer
-        self.month_buy_offer: int = month_buy_offer
-        self.sold: int = sold
-        self.bought: int = bought
-        self.time: float = time
-
-        self.profit: int = self.sell_offer - self.buy_offer
-        # Subtract 2% of the offer values, or a maximum of 250000gp, from the profit due to market fees.
-        self.profit -= (min(int(self.buy_offer * 0.02), 250000) + min(int(self.sell_offer * 0.02), 250000))
-        self.rel_profit: float = round(self.profit / self.buy_offer, 2) if self.buy_offer > 0 else 0
-        self.potential_profit: int = self.profit * min(sold, bought)
-        self.active_traders: int = approx_offers
-        self.name = name
-
-    def __str__(self) -> str:
-        return f"{self.name.lower()},{self.sell_offer},{self.buy_offer},{self.month_sell_offer},{self.month_buy_offer},{self.sold},{self.bought},{self.profit},{self.rel_profit},{self.potential_profit},{self.active_traders}"
-
-    def history_string(self) -> str:
-        """Returns the relevant historic values of the object as a string, separated by commas.
-        This includes the sell offer, buy offer, sold, bought and approx offers values, followed by the time of the data.
-
-        Returns:
-            str: A string containing all the values of the object, separated by commas.
+        Args:
+            http (HttpClient, optional): The client to use. Defaults to the shared default client.
         """
-        return f"{self.sell_offer},{self.buy_offer},{self.sold},{self.bought},{self.active_traders},{self.time}"
-
-class Wiki:
-    def __init__(self):
-        pass
+        self.http = http or default_client()
 
     def get_all_marketable_items(self) -> List[str]:
         """
@@ -63,7 +39,7 @@ class Wiki:
         url = "https://tibia.fandom.com/api.php?action=query&list=categorymembers&cmtitle=Category%3AMarketable+Items&format=json&cmprop=title&cmlimit=500"
         cmcontinue = ""
         while True:
-            response = requests.get(url + (f"&{cmcontinue=}" if cmcontinue else "")).json()
+            response = self.http.get(url + (f"&{cmcontinue=}" if cmcontinue else ""), ttl=24 * 60 * 60).json()
             items.extend([member["title"] for member in response["query"]["categorymembers"]])
 
             if "continue" in response:
@@ -78,17 +54,15 @@ class Wiki:
         Scrapes the event calendar from tibia.com and returns a list of EventData objects.
         """
         event_data: List[EventData] = []
-        response = requests.get("https://www.tibia.com/news/?subtopic=eventcalendar").text
-        events = response.split("\"eventscheduletable\"")[-1].split("</table>")[0].split("<td style")[1:]
-        events = [event.split("</td>")[0] for event in events]
+        parser = EventCalendarParser()
+        parser.feed(self.http.get("https://www.tibia.com/news/?subtopic=eventcalendar", ttl=60 * 60).text)
+        parser.close()
 
         today = datetime.today()
         month_modifier = -1
         today_reached = False
-        for event in events:
+        for day, event_names in parser.days:
             try:
-                day = int(re.search(">([0-9]{1,2}) </span", event).group(1))
-
                 # Event table can wrap to month before or next month, handle these cases.
                 if day <= today.day and not today_reached:
                     month_modifier = 0
@@ -106,8 +80,6 @@ class Wiki:
                 elif month == 1 and month_modifier == 1:
                     year += 1
 
-                event_names = [event_name for event_name in [text.split(">")[-1] for text in event.split("</div>")[:-1]] if len(event_name) > 0]
-
                 data_datetime = datetime(year, month, day)
                 data = EventData(data_datetime, event_names)
                 
@@ -115,17 +87,24 @@ class Wiki:
                     event_data.append(data)
 
             except Exception as e:
-                print(f"Parsing event info failed for {event}: {e}")
+                print(f"Parsing event info failed for {day}: {e}")
         
         return event_data
 
-    def get_item_ids(self) -> Tuple[Dict[int, str], Dict[str, int]]:
+    def get_item_ids_revision(self) -> int:
+        """Fetches the current revision id of https://tibia.fandom.com/wiki/Item_IDs, which changes whenever the page is edited.
+        """
+        response = self.http.get("https://tibia.fandom.com/api.php?action=query&prop=revisions&titles=Item_IDs&rvprop=ids&format=json", ttl=0).json()
+        page = next(iter(response["query"]["pages"].values()))
+        return page["revisions"][0]["revid"]
+
+    def get_item_ids(self) -> Tuple[Dict[int, str], Dict[str, List[int]]]:
         """Fetches the items and their ids from https://tibia.fandom.com/wiki/Item_IDs
 
         Returns:
-            Tuple[Dict[int, str], Dict[str, int]]: A tuple containing a dictionary mapping item ids to item names, and a dictionary mapping item names to item ids.
+            Tuple[Dict[int, str], Dict[str, List[int]]]: A tuple containing a dictionary mapping item ids to item names, and a dictionary mapping item names to all their item ids.
         """
-        response = requests.get("https://tibia.fandom.com/api.php?action=parse&page=Item_IDs&format=json").json()
+        response = self.http.get("https://tibia.fandom.com/api.php?action=parse&page=Item_IDs&format=json", ttl=0).json()
         response = response["parse"]["text"]["*"]
         
         # Get all the item names and ids from the table.
@@ -133,207 +112,87 @@ class Wiki:
 
         # Convert the ids to ints and add them to the dictionary.
         id_to_item: Dict[int, str] = {}
-        item_to_id: Dict[str, int] = {}
+        item_to_id: Dict[str, List[int]] = {}
         for item in items:
             for id in item[1].replace(" ", ",").split(","):
                 if len(id) > 0:
                     id_value = int(id.strip())
 
                     id_to_item[id_value] = item[0]
-                    item_to_id[item[0]] =  id_value
+                    item_to_id.setdefault(item[0], []).append(id_value)
 
         return id_to_item, item_to_id
 
 
-class MarketMemoryReader:
-    def __init__(self):
-        self.buy_details_reader: MemoryReader = MemoryReader(p_name="client")
-        self.sell_details_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
-        self.buy_offer_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
-        self.sell_offer_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
-        self.item_id_reader: MemoryReader = MemoryReader(process=self.buy_details_reader.process)
-        self.past_offers = 32
-        
-        # Values to determine if current memory belongs to the current item.
-        self.last_sell_times = [(0, 0) for i in range(self.past_offers)]
-        self.last_buy_times = [(0, 0) for i in range(self.past_offers)]
-        self.last_expression = ""
-        self.last_id = 0
-        
-        self.has_finished_filtering = False
-
-    def find_current_memory(self, buy_offer: int, sell_offer: int, max_buy_offer: int, max_sell_offer: int, item_id: int):
-        """Filters the readers with the current values. If all readers only have 1 value left, returns True.
+class CrawlPacer:
+    def __init__(self, market_reader: MarketMemoryReader, min_delay: float = 0.05, max_delay: float = 2.0, timeout: float = 1.5):
+        """Paces the crawler by waiting until the values of a newly selected item have landed in memory,
+        instead of sleeping for a fixed time.
 
         Args:
-            buy_offer (int): The current 1st buy offer.
-            sell_offer (int): The current 1st sell offer.
-            avg_buy_offer (int): The current maximum buy offer.
-            avg_sell_offer (int): The current maximum sell offer.
-            item_id (int): The current item id.
-        """
-        if len(self.buy_offer_reader.addresses) != 1 and buy_offer >= 100:
-            self.buy_offer_reader.filter_value(0, ctypes.c_long(buy_offer))
-        if len(self.sell_offer_reader.addresses) != 1 and sell_offer >= 100:
-            self.sell_offer_reader.filter_value(0, ctypes.c_long(sell_offer))
-        if len(self.buy_details_reader.addresses) != 1 and max_buy_offer >= 100:
-            self.buy_details_reader.filter_value(0, ctypes.c_long(max_buy_offer))
-        if len(self.sell_details_reader.addresses) != 1 and max_sell_offer >= 100:
-            self.sell_details_reader.filter_value(0, ctypes.c_long(max_sell_offer))
-        if len(self.item_id_reader.addresses) != 1 and item_id >= 100:
-            self.item_id_reader.filter_value(0, ctypes.c_uint16(item_id))
-
-        if len(self.buy_offer_reader.addresses) == 1 and len(self.sell_offer_reader.addresses) == 1 and\
-            len(self.buy_details_reader.addresses) == 1 and len(self.sell_details_reader.addresses) == 1:
-            self._calculate_memory_locations()
-            self.has_finished_filtering = True
-
-    def _calculate_memory_locations(self):
-        """Calculates the rest of the memory locations which depend on the already found ones.
-        
-        Memory addresses are predictable, but the bases need to be found first. Example:
-
-        Base: 0x155064b0 buy transactions (same arithmetic for sell)
-        +8 between transaction and total
-        0x155064b8 total money this month (divide by transactions for average)
-        +8 between total and max
-        0x155064c0 max buy
-        +8 between max and min
-        0x155064c8 min buy
-
-        It seems sell offers are NOT always on the same address!
-        At some point they switch to someplace else.
-        
-        Base: 0x19d88868 buy offer 1 (same arithmetic for sell)
-        -8 between offer and amount
-        0x19d88860 amount 1
-        -24 between offer and unix timestamp
-        0x19d88850 unix timestamp 1
-        +48 between offer 1 and 2
-        0x19d88898 buy offer 2
-        """
-        buy_offer_base = self.buy_offer_reader.addresses[0]
-        self.buy_offer_reader.addresses.append(buy_offer_base - 8) # Amount bought.
-        self.buy_offer_reader.addresses.append(buy_offer_base - 24) # Timestamp.
-        
-        sell_offer_base = self.sell_offer_reader.addresses[0]
-        self.sell_offer_reader.addresses.append(sell_offer_base - 8) # Amount sold.
-        self.sell_offer_reader.addresses.append(sell_offer_base - 24) # Timestamp.
-        
-        # Add more than 1st offers to memory reader.
-        for i in range(1, self.past_offers):
-            ith_buy_offer = [x + 48 * i for x in self.buy_offer_reader.addresses[:3]]
-            ith_sell_offer = [x + 48 * i for x in self.sell_offer_reader.addresses[:3]]
-            self.buy_offer_reader.addresses.extend(ith_buy_offer)
-            self.sell_offer_reader.addresses.extend(ith_sell_offer)
-            
-        buy_details_base = self.buy_details_reader.addresses[0] # Max buy offer.
-        self.buy_details_reader.addresses.append(buy_details_base + 8) # Min buy offer.
-        self.buy_details_reader.addresses.append(buy_details_base - 8) # Total money.
-        self.buy_details_reader.addresses.append(buy_details_base - 16) # Total bought.
-        
-        sell_details_base = self.sell_details_reader.addresses[0] # Max sell offer.
-        self.sell_details_reader.addresses.append(sell_details_base + 8) # Min sell offer.
-        self.sell_details_reader.addresses.append(sell_details_base - 8) # Total money.
-        self.sell_details_reader.addresses.append(sell_details_base - 16) # Total sold.
-        
-    def get_current_market_values(self, name: str, throw_on_duplicate: bool = False) -> MarketValues:
-        """Reads the current market data from memory and creates a MarketValues object with it.
+            market_reader (MarketMemoryReader): The reader to poll. Its addresses have to be found already.
+            min_delay (float, optional): The lowest delay before polling starts. Defaults to 0.05.
+            max_delay (float, optional): The highest delay before polling starts, when rate limited. Defaults to 2.0.
+            timeout (float, optional): How long to wait for the values to change, after the delay. Defaults to 1.5.
+        """
+        self.market_reader = market_reader
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.delay = min_delay
+        self.poll_interval = 0.02
+        # How many polls in a row the new values have to be the same, to know they are fully written.
+        self.stable_polls = 2
+
+    def fingerprint(self) -> Optional[tuple]:
+        try:
+            return self.market_reader.read_fingerprint()
+        except Exception:
+            return None
+
+    def wait_for_item(self, previous: Optional[tuple], timeout: Optional[float] = None) -> bool:
+        """Waits until the details and offers differ from previous, and then stay the same for a few polls.
+        The item id alone isn't enough, it changes locally as soon as an item is selected, before the server sent its values.
 
         Args:
-            name (str): The name of the current item. Used to fill MarketValues name.
+            previous (Optional[tuple]): The fingerprint from before the new item was selected.
+            timeout (Optional[float], optional): Overrides the default timeout. Defaults to None.
 
         Returns:
-            MarketValues: The MarketValues for the current item.
+            bool: Whether new values landed. False if the memory didn't change in time, e.g. at the end of a category.
         """
-        max_bought, min_bought, total_bought_gold, amount_bought = self.buy_details_reader.read_values()
-        average_bought = (total_bought_gold // amount_bought) if amount_bought > 0 else 0
-        max_sold, min_sold, total_sold_gold, amount_sold = self.sell_details_reader.read_values()
-        average_sold = (total_sold_gold // amount_sold) if amount_sold > 0 else 0
-        item_ids = self.item_id_reader.read_values()[-3:]
-        print(item_ids)
-
-        # Get the most commonly occuring id in item_ids.
-        item_id = max(set(item_ids), key=item_ids.count)
-
-        was_duplicate = False
-        
-        current_expression = f"{max_bought},{min_bought},{total_bought_gold},{amount_bought},{average_bought}" +\
-                             f"{max_sold},{min_sold},{total_sold_gold},{amount_sold},{average_sold}" +\
-                             ",".join([str(x) for x in self.buy_offer_reader.read_values()]) +\
-                             ",".join([str(x) for x in self.sell_offer_reader.read_values()])
-        
-        # Check if this memory is a duplicate of the last item. If so, probably nonexistent item.
-        if current_expression == self.last_expression:
-            if throw_on_duplicate:
-                raise Exception("The current memory is a duplicate of the previous item.")
+        time.sleep(self.delay)
+        deadline = time.time() + (timeout if timeout is not None else self.timeout)
+
+        last = self.fingerprint()
+        stable = 0
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            current = self.fingerprint()
+
+            # Compare the details and offer blocks, without the item id.
+            landed = current is not None and (previous is None or (current[1] != previous[1] and current[2] != previous[2]))
+            if landed and last is not None and current[1:] == last[1:]:
+                stable += 1
+                if stable >= self.stable_polls:
+                    return True
             else:
-                print("The current memory is a duplicate of the previous item.")
-                was_duplicate = True
-        
-        self.last_expression = current_expression
-        
-        buy_offer_values = self.buy_offer_reader.read_values()
-        sell_offer_values = self.sell_offer_reader.read_values()
-        
-        now_timestamp = (datetime.now() + timedelta(30)).timestamp()
-        current_timestamp = datetime.now().timestamp()
-        
-        buy_offer, buy_amount, buy_timestamp = buy_offer_values[:3]
-        sell_offer, sell_amount, sell_timestamp = sell_offer_values[:3]
+                stable = 0
 
-        # Timestamps are read as 64 bit, but only the last 32 bits are used.
-        sell_timestamp = sell_timestamp & 0xFFFFFFFF
-        buy_timestamp = buy_timestamp & 0xFFFFFFFF
-        
-        if not name.lower() == "golden helmet" and\
-             sell_offer <= 0 or sell_offer > 8000000000 or \
-             buy_offer <= 0 or buy_offer > 8000000000 or \
-                (not was_duplicate and self.last_id == item_id) or \
-            len(set(item_ids)) > 2:
-            #buy_timestamp > now_timestamp or sell_timestamp > now_timestamp or \
-            #buy_timestamp < current_timestamp or sell_timestamp < current_timestamp:
-            # Probably the address changed.
-            self.sell_offer_reader.reset_filter()
-            self.buy_offer_reader.reset_filter()
-            self.sell_details_reader.reset_filter()
-            self.buy_details_reader.reset_filter()
-            self.item_id_reader.reset_filter()
-            self.has_finished_filtering = False
-            self.last_id = 0
-            self.last_expression = ""
-            raise Exception(f"The memory address might have changed: {item_id=},{buy_offer=},{sell_offer=},{buy_timestamp=},{sell_timestamp=}")
-
-        # If the item id is not the same as the last one, but the timestamp is the same as the last one, then the values aren't theirs.
-        if buy_timestamp == self.last_buy_times[0][0] and item_id != self.last_buy_times[0][1]:
-            buy_offer = buy_amount = buy_timestamp = -1
-        if sell_timestamp == self.last_sell_times[0][0] and item_id != self.last_sell_times[0][1]:
-            sell_offer = sell_amount = sell_timestamp = -1
-            
-        offers_within_24h = [0, 0]
-        
-        for i in range(self.past_offers):
-            b_, b__, buy_timestamp = buy_offer_values[i * 3 : (i + 1) * 3]
-            s_, s__, sell_timestamp = sell_offer_values[i * 3 : (i + 1) * 3]
+            last = current
 
-            # timestamp is read as a long, but it is a 32 bit int. So we need to trim it.
-            sell_timestamp = sell_timestamp & 0xFFFFFFFF
-            buy_timestamp = buy_timestamp & 0xFFFFFFFF
-            
-            if buy_timestamp != self.last_buy_times[i][0] or item_id == self.last_buy_times[i][1]:
-                self.last_buy_times[i] = (buy_timestamp, item_id)
-                if now_timestamp > buy_timestamp and (now_timestamp - buy_timestamp) < 86400:
-                    offers_within_24h[0] += 1
+        return False
 
-            if sell_timestamp != self.last_sell_times[i][0] or item_id == self.last_sell_times[i][1]:
-                self.last_sell_times[i] = (sell_timestamp, item_id)
-                if now_timestamp > sell_timestamp and (now_timestamp - sell_timestamp) < 86400:
-                    offers_within_24h[1] += 1
+    def on_success(self):
+        """Slowly lowers the delay again after an item was read successfully.
+        """
+        self.delay = max(self.min_delay, self.delay * 0.9)
 
-        self.last_id = item_id
+    def on_failure(self):
+        """Backs off after a failed read, which usually means the server is rate limiting the market requests.
+        """
+        self.delay = min(self.max_delay, self.delay * 2)
 
-        print(f"Finished reading memory: {item_id=}, {buy_offer=}, {sell_offer=}, {average_bought=}, {average_sold=}, {amount_bought=}, {amount_sold=}, {max_bought=}, {min_sold=}, {offers_within_24h=}")
-        return MarketValues(name, time.time(), sell_offer, buy_offer, average_sold, average_bought, amount_sold, amount_bought, max_sold, min_bought, max(offers_within_24h)), item_id, was_duplicate
 
 class Client:
     def __init__(self):
@@ -346,30 +205,14 @@ class Client:
         self.position_cache = {}
         self.market_tab = "offers"
         self.market_reader: MarketMemoryReader = None
+        # Kept across market reopens, so the learned delay isn't lost.
+        self.pacer: Optional[CrawlPacer] = None
+        self.locator = Locator()
+        self.crawl_position: Tuple[int, int, int] = (1, 0, -1)
 
-        # Load item ids from wiki, or from items.csv if wiki is down.
-        try: 
-            self.id_to_name, self.name_to_id = Wiki().get_item_ids()
-
-            # Save the item ids to items.csv.
-            with open("items.csv", "w+") as f:
-                for key, value in self.name_to_id.items():
-                    f.write(f"{key},{value}\n")
-        except Exception as e:
-            print(f"Failed to get item ids from wiki. {e}")
-            
-            # Load self.id_to_name and self.name_to_id from items.csv instead
-            self.id_to_name = {}
-            self.name_to_id = {}
-            with open("items.csv", "r") as f:
-                for line in f.readlines():
-                    if len(line) >= 3:
-                        values = line.split(",")
-                        id = values[-1]
-                        name = ",".join(values[:-1])
-
-                        self.id_to_name[int(id)] = name
-                        self.name_to_id[name] = int(id)
+        # Load item ids from the local index, refreshed from the wiki if it changed, or from items.csv if the wiki is down.
+        self.id_to_name = ItemIndex()
+        self.id_to_name.refresh(Wiki())
 
     def start_game(self, location: str):
         """Starts Tibia in the given location.
@@ -386,14 +229,51 @@ class Client:
         time.sleep(5)
         self._update_tibia()
 
+    def _find_client_pid(self) -> Optional[int]:
+        """Finds the "client" process started by this Client, so multiple clients can run side by side.
+
+        Returns:
+            Optional[int]: The process id, or None to look the client up by name if Tibia wasn't started by this Client.
+
+        Raises:
+            RuntimeError: If Tibia was started by this Client, but its client process wasn't found. Looking it up by name
+                could attach to the client of another shard instead.
+        """
+        if not self.tibia:
+            return None
+
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+
+            try:
+                with open(f"/proc/{entry}/comm", "r") as f:
+                    if f.read().strip() != "client":
+                        continue
+
+                # Walk up the parents, the client may have been started by the launcher.
+                pid = int(entry)
+                while pid > 1:
+                    if pid == self.tibia.pid:
+                        return int(entry)
+                    with open(f"/proc/{pid}/stat", "r") as f:
+                        pid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError):
+                continue
+
+        raise RuntimeError(f"No client process was found below the started Tibia process {self.tibia.pid}.")
+
     def _update_tibia(self):
         """
         Checks if the update button exists, and if so, updates and starts Tibia.
         """
-        self._wait_until_find("images/Update.png", click=True, timeout=10, cache=False)
+        image, position = self._wait_until_find_any(["images/Update.png", "images/PlayButton.png"])
+        if image:
+            pyautogui.leftClick(position)
 
         # Wait until update is done, and click play button.
-        self._wait_until_find("images/PlayButton.png", click=True, cache=False)
+        if image != "images/PlayButton.png":
+            self._wait_until_find("images/PlayButton.png", click=True, cache=False)
         time.sleep(5)
 
     def login_to_game(self, email: str, password: str):
@@ -431,7 +311,9 @@ class Client:
         print("Opening market")
 
         if not self.market_reader:
-            self.market_reader = MarketMemoryReader()
+            self.market_reader = MarketMemoryReader(p_id=self._find_client_pid())
+            if MARKET_CAPTURE_LOCATION:
+                self.market_reader.start_recording(MARKET_CAPTURE_LOCATION)
             
         def try_open_market() -> bool:
             x, y = self._wait_until_find("images/SuccessDepotTile.png", timeout=5, cache=False, exact=True)
@@ -448,13 +330,22 @@ class Client:
             
             return False
 
-        if pyautogui.locateCenterOnScreen("images/SuccessDepotTile.png") and try_open_market():
+        capture = self.locator.capture()
+        if self.locator.locate("images/SuccessDepotTile.png", capture, exact=True) and try_open_market():
             return True
 
-        for i in range(len(list(pyautogui.locateAllOnScreen("images/DepotTile.png")))):
+        depots = self.locator.locate_all("images/DepotTile.png", capture, exact=True)
+        for i in range(len(depots)):
             print(f"Trying depot {i}...")
-            depot_position = list(pyautogui.locateAllOnScreen("images/DepotTile.png"))[i]
-            pyautogui.leftClick(depot_position)
+
+            # The character moves when trying a depot, so the depots have to be located again.
+            if i > 0:
+                depots = self.locator.locate_all("images/DepotTile.png", self.locator.capture(), exact=True)
+                if i >= len(depots):
+                    break
+
+            depot = depots[i]
+            pyautogui.leftClick(depot.left + depot.width // 2, depot.top + depot.height // 2)
             if try_open_market():
                 return True
 
@@ -463,8 +354,25 @@ class Client:
         
     def _find_memory_addresses(self):
         """Walks through a few highly sold items to find necessary memory addresses.
+        Tries the memory layout cached by a previous run first, which avoids OCR entirely.
         """
         pyautogui.PAUSE = 0.1
+
+        if self.market_reader.load_layout(MEMORY_LAYOUT_LOCATION):
+            # Open a known item without reading it, and check whether the cached addresses hold its values.
+            pyautogui.hotkey("ctrl", "z")
+            pyautogui.typewrite("tibia coins")
+            pyautogui.press("down")
+            time.sleep(0.45)
+
+            if self.market_reader.verify_layout(22118):
+                print("Using cached memory addresses.")
+                self.search_item("tibia coins")
+                return
+
+            print("Cached memory addresses are outdated.")
+            self.market_reader.reset_filters()
+
         print("Finding relevant memory addresses with OCR.")
         
         while not self.market_reader.has_finished_filtering:
@@ -480,27 +388,21 @@ class Client:
                 print(len(self.market_reader.item_id_reader.addresses))
                 print(values)
 
+        self.market_reader.save_layout(MEMORY_LAYOUT_LOCATION)
+
         # Fill memory with timestamps to know if an offer in memory still belongs to the current item.
         self.search_item("tibia coins")
 
-    def crawl_market(self, category_index: int, starting_index: int = 0) -> List[MarketValues]:
-        """
-        Crawls the market for all items by iterating through the categories.
+    def _open_category(self, category_index: int, starting_index: int) -> CrawlPacer:
+        """Reopens the market, finds the memory addresses if needed, and selects the item at starting_index of the category.
 
-        Args:
-            category_index: The index of the category to start at.
-            starting_index: The index of the item to start at.
         Returns:
-            A list of MarketValues objects.
+            CrawlPacer: The pacer of the client, to wait for newly selected items with.
         """
-        results = []
-
         # Reopen the market to avoid being kicked out.
         self.close_market()
         self.wiggle()
-        next_wiggle = time.time() + 60 * 13
         self.open_market()
-        fail_count = 0
 
         # Find memory addresses if they haven't been found yet.
         if not self.market_reader.has_finished_filtering:
@@ -513,54 +415,90 @@ class Client:
 
         # Tab to the item list. This number might have to be changed if the market is updated.
         pyautogui.press("tab", presses=10)
-        
+
+        if self.pacer is None or self.pacer.market_reader is not self.market_reader:
+            self.pacer = CrawlPacer(self.market_reader)
+        pacer = self.pacer
+
         # Go through the items quickly, except for the last one.
         # This is to make sure the item's value is fully loaded and we aren't rate limited.
         if starting_index > 1:
+            previous = pacer.fingerprint()
             pyautogui.press("down", presses=starting_index)
-            time.sleep(8)
+            pacer.wait_for_item(previous, timeout=8)
 
-        last_item_id = -1
+        return pacer
+
+    def crawl_market(self, category_index: int, starting_index: int = 0) -> Generator[MarketValues, None, None]:
+        """
+        Crawls the market for all items by iterating through the categories.
+        Each item is yielded as soon as it is read. The market is reopened at the current item whenever needed,
+        e.g. to wiggle, after too many failures or when the memory addresses changed.
+
+        Args:
+            category_index: The index of the category to start at.
+            starting_index: The index of the item to start at.
+        Returns:
+            A generator of MarketValues objects.
+        """
         while True:
-            if self.market_reader.has_finished_filtering:
+            with metrics.stage("reopen"):
+                pacer = self._open_category(category_index, starting_index)
+            next_wiggle = time.time() + 60 * 13
+            fail_count = 0
+            last_item_id = -1
+
+            while self.market_reader.has_finished_filtering:
                 # If fetching results failed 10 times in a row, restart.
                 if fail_count >= 10:
                     print("Restarting...")
-                    return results + self.crawl_market(category_index, starting_index)
+                    metrics.increment("restarts")
+                    break
                 
                 # If the last result failed, reload the item.
                 if fail_count > 0:
-                    pyautogui.press("up")
-                    time.sleep(0.5)
-
-                # Go to next item. Wait a bit to make sure we aren't rate limited.
-                pyautogui.press("down")
-                time.sleep(0.5)
+                    previous = pacer.fingerprint()
+                    with metrics.stage("key_press"):
+                        pyautogui.press("up")
+                    with metrics.stage("load_wait"):
+                        if not pacer.wait_for_item(previous):
+                            metrics.increment("load_timeouts")
+
+                # Go to next item, and wait until its values are loaded.
+                previous = pacer.fingerprint()
+                with metrics.stage("key_press"):
+                    pyautogui.press("down")
+                with metrics.stage("load_wait"):
+                    if not pacer.wait_for_item(previous):
+                        metrics.increment("load_timeouts")
 
                 pyautogui.PAUSE = 0.01
 
                 try:
-                    values, id, was_duplicate = self.market_reader.get_current_market_values("Unknown")
+                    with metrics.stage("memory_read"):
+                        values, id, status = self.market_reader.read_crawled_item(last_item_id)
                 except Exception as e:
                     print(f"category: {category_index}, index: {starting_index}, Error: {e}")
+                    metrics.increment("failures", "read_error")
                     fail_count += 1
+                    pacer.on_failure()
                     continue
 
-                # If the id is the same as the last one, we have reached the end of the category.
-                if id == last_item_id:
-                    break
+                if status == CATEGORY_END:
+                    return
                 
-                # If we have failed 10 times in a row, we should probably restart.
-                if was_duplicate and id != last_item_id and\
-                    (values.month_sell_offer + values.month_buy_offer != 0) and\
-                        id != 22118:
+                if status == ITEM_DUPLICATE:
+                    metrics.increment("failures", "duplicate")
                     fail_count += 1
+                    pacer.on_failure()
                     continue
 
                 fail_count = 0
+                pacer.on_success()
                 starting_index += 1
 
                 if id not in self.id_to_name:
+                    metrics.increment("unknown_items")
                     print("Unknown item id: " + str(id) + ", category: " + str(category_index) + ", index: " + str(starting_index))
                 else:
                     values.name = self.id_to_name[id]
@@ -568,17 +506,35 @@ class Client:
                 print(values)
 
                 if values.name != "Unknown":
-                    results.append(values)
+                    metrics.item_scanned(category_index)
+                    # The position to pass to crawl_market to continue after this item.
+                    self.crawl_position = (category_index, starting_index, id)
+                    yield values
 
                 last_item_id = id
 
                 # Wiggle every once in a while to avoid being kicked out.
                 if time.time() > next_wiggle:
-                    return results + self.crawl_market(category_index, starting_index)
-            else:
-                return results + self.crawl_market(category_index, starting_index)
+                    metrics.increment("wiggles")
+                    break
+
+    def refresh_items(self, names: Iterable[str]) -> Generator[MarketValues, None, None]:
+        """Searches the items one by one, and yields their current values.
+        Items whose search didn't open the item itself, e.g. because another item's name contains it, are skipped.
+
+        Args:
+            names (Iterable[str]): The names of the items, in the order to refresh them. Consumed lazily.
+        """
+        if not self.market_reader.has_finished_filtering:
+            self._find_memory_addresses()
 
-        return results
+        for name in names:
+            values = self.search_item(name)
+            if values.name.lower() != name.lower() or (values.buy_offer == -1 and values.sell_offer == -1):
+                print(f"Refreshing {name} failed, got {values.name}.")
+                continue
+
+            yield values
 
     def search_item(self, name: str, id: Optional[int] = None) -> MarketValues:
         """
@@ -597,7 +553,7 @@ class Client:
             
             def scan_details():
                 if "images/Statistics.png" not in self.position_cache:
-                    self.position_cache["images/Statistics.png"] = pyautogui.locateOnScreen("images/Statistics.png", grayscale=True, confidence=0.9)
+                    self.position_cache["images/Statistics.png"] = self.locator.locate("images/Statistics.png", self.locator.capture())
 
                 statistics = self.position_cache["images/Statistics.png"]
                 interpreted_statistics = screenshot.read_image_text(screenshot.process_image(screenshot.take_screenshot(statistics.left, statistics.top, 300, 140), rescale_factor=3))\
@@ -608,7 +564,7 @@ class Client:
 
             def scan_offers():
                 if "images/Offers.png" not in self.position_cache:
-                    self.position_cache["images/Offers.png"] = list(pyautogui.locateAllOnScreen("images/Offers.png", grayscale=True, confidence=0.9))
+                    self.position_cache["images/Offers.png"] = self.locator.locate_all("images/Offers.png", self.locator.capture())
                 offers = self.position_cache["images/Offers.png"]
                 sell_offers = offers[0]
                 buy_offers = offers[1]
@@ -652,7 +608,8 @@ class Client:
                 self.market_tab = "offers"
 
             values = MarketValues(name, time.time(), sell_offer, buy_offer, int(interpreted_statistics[6]), int(interpreted_statistics[2]), int(interpreted_statistics[4]), int(interpreted_statistics[0]), int(interpreted_statistics[5]), int(interpreted_statistics[3]), approx_offers)
-            self.market_reader.find_current_memory(buy_offer, sell_offer, int(interpreted_statistics[1]), int(interpreted_statistics[5]), id)
+            self.market_reader.find_current_memory(buy_offer, sell_offer, int(interpreted_statistics[1]), int(interpreted_statistics[5]), id,
+                                                   [int(stat) if stat.isnumeric() else None for stat in interpreted_statistics[:8]])
             
             return values
         except pyautogui.FailSafeException as e:
@@ -702,10 +659,7 @@ class Client:
             else:
                 print(f"Looking for {image}...")
                 pyautogui.moveTo(20, 20)
-                if not exact:
-                    position = pyautogui.locateCenterOnScreen(image, grayscale=True, confidence=0.9)
-                else:
-                    position = pyautogui.locateCenterOnScreen(image)
+                position = self.locator.locate_center(image, self.locator.capture(), exact=exact)
                 if position:
                     self.position_cache[image] = position
 
@@ -719,4 +673,26 @@ class Client:
         
         print(f"Finding {image} failed.")
         return (-1, -1)
+
+    def _wait_until_find_any(self, images: List[str], timeout: int = 60) -> Tuple[Optional[str], Tuple[int, int]]:
+        """Waits until any of the images is on the screen. All images are matched against the same screenshot.
+
+        Returns:
+            Tuple[Optional[str], Tuple[int, int]]: The first image found and its position, or (None, (-1, -1)) on timeout.
+        """
+        start_time = time.time()
+
+        while time.time() - start_time < timeout:
+            pyautogui.moveTo(20, 20)
+            found = self.locator.locate_any(images, self.locator.capture())
+
+            for image in images:
+                if image in found:
+                    self.position_cache[image] = found[image]
+                    return image, found[image]
+
+            time.sleep(0.2)
+
+        print(f"Finding any of {images} failed.")
+        return None, (-1, -1)
     